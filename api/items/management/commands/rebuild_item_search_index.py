@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.utils.search import search_index_available
+from items.models import Item
+
+SEARCH_INDEX = "items_item_fts"
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index from the existing items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default", help="Database alias to index"
+        )
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        if not search_index_available(alias, SEARCH_INDEX):
+            raise CommandError(
+                f"{SEARCH_INDEX} does not exist, run migrate on an SQLite database"
+            )
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}) VALUES ('rebuild')"
+            )
+            cursor.execute(
+                f"INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}) VALUES ('optimize')"
+            )
+        total = Item.objects.using(alias).count()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} items"))
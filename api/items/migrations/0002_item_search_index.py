@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# External content FTS5 index over items_item(name, description). Triggers keep
+# it in sync with every INSERT/UPDATE/DELETE, including queryset and bulk
+# writes that bypass model signals.
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE items_item_fts USING fts5(
+        name,
+        description,
+        content='items_item',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER items_item_fts_insert AFTER INSERT ON items_item BEGIN
+        INSERT INTO items_item_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER items_item_fts_delete AFTER DELETE ON items_item BEGIN
+        INSERT INTO items_item_fts(items_item_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER items_item_fts_update AFTER UPDATE OF name, description
+    ON items_item BEGIN
+        INSERT INTO items_item_fts(items_item_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO items_item_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO items_item_fts(items_item_fts) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS items_item_fts_insert",
+    "DROP TRIGGER IF EXISTS items_item_fts_delete",
+    "DROP TRIGGER IF EXISTS items_item_fts_update",
+    "DROP TABLE IF EXISTS items_item_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # other backends keep using the plain SearchFilter
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in CREATE_INDEX:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_INDEX:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("items", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
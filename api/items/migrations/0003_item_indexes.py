@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("items", "0002_item_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["name", "id"], name="item_name_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["price", "id"], name="item_price_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["created_at", "id"], name="item_created_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["updated_at", "id"], name="item_updated_at_id_idx"
+            ),
+        ),
+    ]
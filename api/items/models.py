@@ -1,8 +1,77 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import connections, models, router
+from django.utils import timezone
 
 # Create your models here.
 
 
+def supports_update_returning(connection):
+    """UPDATE ... RETURNING is available on PostgreSQL and SQLite 3.35+"""
+    if connection.vendor == "postgresql":
+        return True
+    # same SQLite version gate as INSERT ... RETURNING
+    return (
+        connection.vendor == "sqlite"
+        and connection.features.can_return_columns_from_insert
+    )
+
+
+class ItemQuerySet(models.QuerySet):
+    def update_returning(self, pk, **values):
+        """Updates one row and returns the persisted instance, or None when no
+        row matches. auto_now fields are refreshed as well.
+
+        Runs a single UPDATE ... RETURNING where the backend supports it and
+        falls back to an UPDATE followed by a SELECT elsewhere.
+        """
+        meta = self.model._meta
+        now = timezone.now()
+        for field in meta.concrete_fields:
+            if getattr(field, "auto_now", False):
+                values.setdefault(field.name, now)
+        # self.db is the read database of a plain queryset
+        db = self._db or router.db_for_write(self.model, **self._hints)
+        connection = connections[db]
+        queryset = self.using(db)
+        if not supports_update_returning(connection):
+            if not queryset.filter(pk=pk).update(**values):
+                return None
+            return queryset.filter(pk=pk).first()
+
+        quote = connection.ops.quote_name
+        fields = [meta.get_field(name) for name in values]
+        assignments = ", ".join(f"{quote(field.column)} = %s" for field in fields)
+        columns = ", ".join(quote(field.column) for field in meta.concrete_fields)
+        params = [
+            field.get_db_prep_save(values[field.name], connection) for field in fields
+        ]
+        params.append(meta.pk.get_db_prep_value(pk, connection))
+        sql = (
+            f"UPDATE {quote(meta.db_table)} SET {assignments} "
+            f"WHERE {quote(meta.pk.column)} = %s RETURNING {columns}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        if not rows:
+            return None
+        # the conversions a SELECT of the columns would apply
+        row = []
+        for field, value in zip(meta.concrete_fields, rows[0]):
+            column = field.get_col(meta.db_table)
+            for converter in connection.ops.get_db_converters(
+                column
+            ) + column.get_db_converters(connection):
+                value = converter(value, column, connection)
+            row.append(value)
+        return self.model.from_db(
+            db, [field.attname for field in meta.concrete_fields], row
+        )
+
+    async def aupdate_returning(self, pk, **values):
+        return await sync_to_async(self.update_returning)(pk, **values)
+
+
 class Item(models.Model):
     name = models.CharField(max_length=225, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
@@ -10,8 +79,17 @@ class Item(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ItemQuerySet.as_manager()
+
     def __str__(self) -> str:
         return f"{self.id} - {self.name}"
 
-    # class Meta:
-    #     app_label = 'items'
+    class Meta:
+        # one index per filter/ordering column used by ItemViewSet; id is the
+        # tie-breaker of cursor pagination and of the default -pk ordering
+        indexes = [
+            models.Index(fields=["name", "id"], name="item_name_id_idx"),
+            models.Index(fields=["price", "id"], name="item_price_id_idx"),
+            models.Index(fields=["created_at", "id"], name="item_created_at_id_idx"),
+            models.Index(fields=["updated_at", "id"], name="item_updated_at_id_idx"),
+        ]
@@ -1,6 +1,8 @@
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
 
 from .models import Item
+from .signals import invalidate_item_caches
 
 
 class ItemSerializer(serializers.ModelSerializer):
@@ -29,8 +31,19 @@ class ItemFormSerializer(serializers.Serializer):
         return instance
 
     def update(self, instance, validated_date):
-        _ = Item.objects.filter(id=instance.id).update(**validated_date)
-        return instance
+        """Applies the change and returns the freshly persisted item"""
+        updated = Item.objects.update_returning(instance.pk, **validated_date)
+        if updated is None:
+            raise Item.DoesNotExist("No Item matches the given query.")
+        invalidate_item_caches(updated.pk)
+        return updated
+
+    async def aupdate(self, instance, validated_data):
+        updated = await Item.objects.aupdate_returning(instance.pk, **validated_data)
+        if updated is None:
+            raise Item.DoesNotExist("No Item matches the given query.")
+        await sync_to_async(invalidate_item_caches)(updated.pk)
+        return updated
 
     def validate(self, attrs):
         if attrs.get("price", None) is not None and attrs["price"] < 0:
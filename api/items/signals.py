@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.utils.cache import count_cache, response_cache
+
+from .models import Item
+
+
+def invalidate_item_caches(*pks):
+    """Drops cached totals and list responses, plus the cached detail
+    responses of the given item ids.
+
+    Queryset ``update()``/``bulk_*`` writes do not send model signals, so
+    those code paths call this directly.
+    """
+    count_cache.invalidate(Item)
+    response_cache.invalidate(Item, [str(pk) for pk in pks])
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def item_changed(sender, instance, **kwargs):
+    invalidate_item_caches(instance.pk)
@@ -1,10 +1,44 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from items.management.commands.seed_items import parse_rows
 from items.models import Item
 from items.serializers import ItemFormSerializer, ItemSerializer
+from items.views import ItemViewSet
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from api.utils.cache import normalize_params, response_cache
+from api.utils.fastjson import EncodedJSON, FastJSONRenderer, RowEncoder
+from api.utils.metrics import MetricsRegistry, RequestState, registry
+from api.utils.profiling import StackSampler
+from api.utils.search import FullTextSearchFilter, search_index_available
+from api.utils.slow_queries import SlowQueryLog, slow_query_log
+from api.utils.sql import execute_wrappers, install_execute_wrappers, normalize_sql
+from api.utils.testing import QueryBudgetMixin, QueryRecorder
+from api.utils.timing import RequestTimings, span
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
 
 class ItemModelTest(TestCase):
     def setUp(self):
@@ -127,3 +161,1221 @@ class ItemViewSetTest(TestCase):
         response = self.client.delete(f"/api/v1/items/{item.id}/")  # Update the URL
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Item.objects.count(), 0)
+
+
+class ItemCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/v1/items/"
+        prices = [10.0, None, 5.0, 10.0, None, 7.5, 1.0]
+        self.items = [
+            Item.objects.create(name=f"item {index}", price=price)
+            for index, price in enumerate(prices)
+        ]
+
+    def walk(self, params, direction="next"):
+        """Follows the cursors until exhausted and returns the visited ids"""
+        ids, pages = [], 0
+        response = self.client.get(self.url, params).json()["data"]
+        while True:
+            pages += 1
+            ids.extend(row["id"] for row in response["results"])
+            cursor = response[direction]
+            if not cursor or pages > len(self.items):
+                return ids, response
+            response = self.client.get(self.url, {**params, "cursor": cursor}).json()[
+                "data"
+            ]
+
+    def test_cursor_pages_follow_default_ordering(self):
+        ids, last_page = self.walk({"pagination": "cursor", "limit": 2})
+        expected = list(Item.objects.order_by("-pk").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertIsNone(last_page["next"])
+        self.assertNotIn("total", last_page)
+
+    def test_cursor_pages_ordered_by_nullable_price(self):
+        for ordering in ("price", "-price"):
+            ids, _ = self.walk(
+                {"pagination": "cursor", "limit": 2, "ordering": ordering}
+            )
+            self.assertEqual(len(ids), len(self.items))
+            self.assertEqual(len(set(ids)), len(self.items))
+            prices = [Item.objects.get(id=pk).price for pk in ids]
+            non_null = [price for price in prices if price is not None]
+            expected = sorted(non_null, reverse=ordering.startswith("-"))
+            self.assertEqual(non_null, expected)
+
+    def test_previous_cursor_walks_back(self):
+        params = {"pagination": "cursor", "limit": 3, "ordering": "created_at"}
+        forward, last_page = self.walk(params)
+        backward_ids = [row["id"] for row in last_page["results"]]
+        cursor = last_page["previous"]
+        while cursor:
+            page = self.client.get(self.url, {**params, "cursor": cursor}).json()
+            backward_ids = [row["id"] for row in page["data"]["results"]] + backward_ids
+            cursor = page["data"]["previous"]
+        self.assertEqual(backward_ids, forward)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"}).json()
+        self.assertEqual(response["data"]["status"], status.HTTP_400_BAD_REQUEST)
+
+
+class ItemCountModeTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.url = "/api/v1/items/"
+        for index in range(5):
+            Item.objects.create(name=f"item {index}", price=index)
+
+    def test_exact_total_is_cached_and_invalidated(self):
+        params = {"limit": 2, "price_from": 0, "price_to": 3}
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, params).json()["data"]
+        self.assertEqual(response["total"], 4)
+        # the same filter signature in a different order reuses the count
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, {"price_to": 3, "price_from": 0, "limit": 2, "page": 2}
+            ).json()["data"]
+        self.assertEqual(response["total"], 4)
+        Item.objects.create(name="new item", price=1)
+        response = self.client.get(self.url, params).json()["data"]
+        self.assertEqual(response["total"], 5)
+
+    def test_repeated_params_are_counted_as_filtered(self):
+        # the view filters on the last value of a repeated param
+        response = self.client.get(
+            f"{self.url}?price_from=0&price_from=2&price_to=3"
+        ).json()["data"]
+        self.assertEqual(response["total"], 2)
+        self.assertEqual(len(response["results"]), 2)
+        response = self.client.get(
+            f"{self.url}?price_from=2&price_from=0&price_to=3"
+        ).json()["data"]
+        self.assertEqual(response["total"], 4)
+        self.assertEqual(len(response["results"]), 4)
+
+    def test_normalize_params(self):
+        self.assertEqual(
+            normalize_params(QueryDict("price_from=1&price_from=50&price_to=100")),
+            normalize_params(QueryDict("price_to=100.0&price_from=50")),
+        )
+        self.assertNotEqual(
+            normalize_params(QueryDict("name=a&name=b")),
+            normalize_params(QueryDict("name=b&name=a")),
+        )
+        self.assertEqual(
+            normalize_params(QueryDict("name=a&page=2&price_from=x&price_to=1")),
+            normalize_params(QueryDict("name=a")),
+        )
+
+    def test_count_cache_invalidated_by_update(self):
+        item = Item.objects.first()
+        self.client.get(self.url, {"price_from": 0, "price_to": 3})
+        self.client.put(f"{self.url}{item.id}/", {"price": 100}, format="json")
+        response = self.client.get(self.url, {"price_from": 0, "price_to": 3})
+        self.assertEqual(response.json()["data"]["total"], 3)
+
+    def test_count_none_skips_counting(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"count": "none", "limit": 2})
+        data = response.json()["data"]
+        self.assertIsNone(data["total"])
+        self.assertTrue(data["has_next"])
+        self.assertEqual(len(data["results"]), 2)
+        data = self.client.get(
+            self.url, {"count": "none", "limit": 2, "page": 3}
+        ).json()["data"]
+        self.assertFalse(data["has_next"])
+        self.assertEqual(len(data["results"]), 1)
+
+    def test_count_estimate(self):
+        data = self.client.get(self.url, {"count": "estimate", "limit": 2}).json()
+        self.assertEqual(data["data"]["total"], 5)
+        self.assertEqual(data["data"]["total_pages"], 3)
+
+    def test_invalid_count_mode(self):
+        data = self.client.get(self.url, {"count": "sometimes"}).json()
+        self.assertEqual(data["data"]["status"], status.HTTP_400_BAD_REQUEST)
+
+    def test_unpaged_listing_does_not_count(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url, {"is_paging": "false"}).json()
+        self.assertEqual(data["data"]["total"], 5)
+
+
+class ItemExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/v1/items/"
+        for index in range(3):
+            Item.objects.create(
+                name=f"item, {index}", description="a\nb", price=index * 10
+            )
+
+    def test_ndjson_export_matches_serializer(self):
+        response = self.client.get(self.url, {"export": "ndjson"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        expected = ItemSerializer(Item.objects.order_by("-pk"), many=True).data
+        self.assertEqual(rows, json.loads(json.dumps(expected)))
+
+    def test_csv_export_honours_filters(self):
+        response = self.client.get(
+            self.url, {"export": "csv", "price_from": 5, "price_to": 30}
+        )
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], list(ItemSerializer.Meta.fields))
+        self.assertEqual([row[1] for row in rows[1:]], ["item, 2", "item, 1"])
+        self.assertEqual(rows[1][2], "a\nb")
+
+    def test_unknown_export_format(self):
+        response = self.client.get(self.url, {"export": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ItemBulkTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.url = "/api/v1/items/bulk/"
+
+    def bulk_create(self, count):
+        items = [{"name": f"item {index}", "price": index} for index in range(count)]
+        return self.client.post(self.url, items, format="json")
+
+    def test_bulk_create(self):
+        response = self.client.post(
+            self.url,
+            {"items": [{"name": "TV", "price": 10}, {"name": "Radio"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Item.objects.count(), 2)
+        self.assertEqual(
+            [row["name"] for row in response.data["data"]], ["TV", "Radio"]
+        )
+        self.assertTrue(all(row["id"] for row in response.data["data"]))
+
+    def test_bulk_create_query_count_does_not_grow_with_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self.bulk_create(10)
+        with CaptureQueriesContext(connection) as large:
+            self.bulk_create(150)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Item.objects.count(), 160)
+
+    def test_bulk_create_reports_errors_per_element(self):
+        response = self.client.post(
+            self.url,
+            [{"name": "ok"}, {"name": ""}, {"name": "ok", "price": -1}, "item"],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [error["index"] for error in response.data["errors"]], [1, 2, 3]
+        )
+        self.assertIn("name", response.data["errors"][0]["errors"])
+        self.assertEqual(Item.objects.count(), 0)
+
+    def test_bulk_update(self):
+        first = Item.objects.create(name="first", price=1)
+        second = Item.objects.create(name="second", price=2)
+        response = self.client.put(
+            self.url,
+            [{"id": first.id, "price": 10}, {"id": second.id, "name": "renamed"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.name, first.price), ("first", 10))
+        self.assertEqual((second.name, second.price), ("renamed", 2))
+        self.assertGreater(second.updated_at, second.created_at)
+
+    def test_bulk_update_unknown_id(self):
+        item = Item.objects.create(name="first", price=1)
+        response = self.client.put(
+            self.url,
+            [{"id": item.id, "price": 5}, {"id": item.id + 100, "price": 3}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["errors"][0]["index"], 1)
+        item.refresh_from_db()
+        self.assertEqual(item.price, 1)
+
+    def test_bulk_delete(self):
+        ids = [Item.objects.create(name=f"item {index}").id for index in range(3)]
+        response = self.client.delete(self.url, {"ids": ids[:2]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["deleted"], 2)
+        self.assertEqual(list(Item.objects.values_list("id", flat=True)), ids[2:])
+
+    def test_bulk_delete_unknown_id(self):
+        item = Item.objects.create(name="item")
+        response = self.client.delete(
+            self.url, [item.id, item.id + 100, "x"], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1, 2])
+        self.assertEqual(Item.objects.count(), 1)
+
+
+class ItemResponseCacheTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.url = "/api/v1/items/"
+        self.first = Item.objects.create(name="first", price=1)
+        self.second = Item.objects.create(name="second", price=2)
+
+    def test_list_is_served_from_cache(self):
+        first = self.client.get(self.url, {"limit": 1, "page": 1})
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {"page": 1, "limit": 1})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+
+    def test_write_invalidates_only_affected_detail(self):
+        first_url = f"{self.url}{self.first.id}/"
+        second_url = f"{self.url}{self.second.id}/"
+        for url in (first_url, second_url, self.url):
+            self.client.get(url)
+        self.client.put(first_url, {"name": "renamed"}, format="json")
+        response = self.client.get(first_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["data"]["name"], "renamed")
+        self.assertEqual(self.client.get(second_url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+
+    def test_delete_and_create_invalidate_list(self):
+        self.client.get(self.url)
+        self.client.delete(f"{self.url}{self.first.id}/")
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["data"]["total"], 1)
+        self.client.post(self.url, {"name": "third"}, format="json")
+        self.assertEqual(self.client.get(self.url).json()["data"]["total"], 2)
+
+    def test_hit_and_miss_counters(self):
+        before = response_cache.stats()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        after = response_cache.stats()
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+
+
+class ItemFullTextSearchTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.url = "/api/v1/items/"
+        self.laptop = Item.objects.create(
+            name="MacBook Pro", description="A laptop for developers", price=2999
+        )
+        self.phone = Item.objects.create(
+            name="Phone case", description="Fits the macbook charger", price=19
+        )
+        self.mouse = Item.objects.create(
+            name="Mouse", description="Wireless laptop mouse, laptop bag", price=49
+        )
+
+    def search(self, term, **params):
+        response = self.client.get(self.url, {"search": term, **params})
+        return [row["name"] for row in response.json()["data"]["results"]]
+
+    def test_prefix_search_over_name_and_description(self):
+        self.assertEqual(set(self.search("macb")), {"MacBook Pro", "Phone case"})
+        self.assertEqual(self.search("wirel"), ["Mouse"])
+        self.assertEqual(self.search("laptop mouse"), ["Mouse"])
+        self.assertEqual(self.search("television"), [])
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search("laptop"), ["Mouse", "MacBook Pro"])
+        self.assertEqual(
+            self.search("laptop", ordering="-price"), ["MacBook Pro", "Mouse"]
+        )
+
+    def test_numeric_terms_match_id_and_price(self):
+        self.assertEqual(self.search(str(self.phone.id)), ["Phone case"])
+        self.assertEqual(self.search("49"), ["Mouse"])
+
+    def test_text_matches_rank_ahead_of_price_matches(self):
+        Item.objects.create(name="Cable 19 pack", description="USB", price=5)
+        Item.objects.create(name="Laptop stand 49", description="Steel", price=30)
+        # the phone case matches 19 through its price only, so has no rank
+        self.assertEqual(self.search("19"), ["Cable 19 pack", "Phone case"])
+        # text terms rank every match, whichever way the number matched
+        queryset = FullTextSearchFilter().filter_queryset(
+            mock.Mock(query_params={"search": "laptop 49"}),
+            Item.objects.all(),
+            ItemViewSet(),
+        )
+        ranks = dict(queryset.values_list("name", "search_rank"))
+        self.assertEqual(set(ranks), {"Mouse", "Laptop stand 49"})
+        self.assertNotIn(None, ranks.values())
+
+    def test_search_syntax_is_escaped(self):
+        self.assertEqual(self.search('"mouse" OR NOT*'), [])
+        self.assertEqual(self.search('mou"se'), [])
+
+    def test_index_follows_writes(self):
+        self.client.put(
+            f"{self.url}{self.phone.id}/", {"name": "Keyboard"}, format="json"
+        )
+        self.assertEqual(self.search("keyb"), ["Keyboard"])
+        self.mouse.delete()
+        self.assertEqual(self.search("wireless"), [])
+
+    def test_rebuild_command_backfills_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO items_item_fts(items_item_fts) VALUES ('delete-all')"
+            )
+        self.assertEqual(self.search("mouse"), [])
+        out = io.StringIO()
+        call_command("rebuild_item_search_index", stdout=out)
+        self.assertIn("Indexed 3 items", out.getvalue())
+        clear_caches()
+        self.assertEqual(self.search("mouse"), ["Mouse"])
+
+
+class ItemQueryPlanTest(TestCase):
+    """Every supported list query shape must be answered from an index"""
+
+    # query params -> index the listing queries are expected to use
+    QUERY_SHAPES = [
+        ({"price_from": 10, "price_to": 20}, "item_price_id_idx"),
+        ({"name": "item 7"}, "item_name_id_idx"),
+        ({"price": 7}, "item_price_id_idx"),
+        ({"ordering": "created_at"}, "item_created_at_id_idx"),
+        ({"ordering": "-created_at"}, "item_created_at_id_idx"),
+        ({"ordering": "updated_at"}, "item_updated_at_id_idx"),
+        ({"ordering": "-updated_at"}, "item_updated_at_id_idx"),
+        ({"ordering": "price"}, "item_price_id_idx"),
+        ({"ordering": "-price"}, "item_price_id_idx"),
+        ({"pagination": "cursor", "ordering": "created_at"}, "item_created_at_id_idx"),
+        ({"pagination": "cursor", "ordering": "-price"}, "item_price_id_idx"),
+        ({"search": "item"}, "items_item_fts"),
+    ]
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.url = "/api/v1/items/"
+        Item.objects.bulk_create(
+            Item(name=f"item {index}", price=index % 40) for index in range(200)
+        )
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def capture_item_queries(self, params):
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.url, {**params, "limit": 10}).json()["data"]
+            if data.get("next"):
+                self.client.get(
+                    self.url, {**params, "limit": 10, "cursor": data["next"]}
+                )
+        return [
+            query["sql"]
+            for query in queries.captured_queries
+            if '"items_item"' in query["sql"] and query["sql"].startswith("SELECT")
+        ]
+
+    def test_list_queries_use_indexes(self):
+        for params, index in self.QUERY_SHAPES:
+            with self.subTest(params=params):
+                statements = self.capture_item_queries(params)
+                self.assertTrue(statements)
+                plans = [self.explain(sql) for sql in statements]
+                for sql, plan in zip(statements, plans):
+                    self.assertNotIn("SCAN items_item", plan, f"{sql}\n{plan}")
+                self.assertTrue(
+                    any(index in detail for plan in plans for detail in plan),
+                    plans,
+                )
+
+    def test_cursor_pages_seek_into_the_index(self):
+        statements = self.capture_item_queries(
+            {"pagination": "cursor", "ordering": "-created_at"}
+        )
+        plan = self.explain(statements[-1])
+        self.assertEqual(
+            plan,
+            ["SEARCH items_item USING INDEX item_created_at_id_idx (created_at<?)"],
+        )
+
+    def test_search_rank_scans_the_matches_once(self):
+        statements = self.capture_item_queries({"search": "item"})
+        plan = self.explain(statements[-1])
+        # the ranked matches are built once, not rescanned per matching row
+        self.assertTrue(
+            any(detail.startswith(("CO-ROUTINE", "MATERIALIZE")) for detail in plan),
+            plan,
+        )
+
+
+class ItemUpdateReturningTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.item = Item.objects.create(name="Test Item", price=29.99)
+        self.url = f"/api/v1/items/{self.item.id}/"
+
+    def test_put_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.put(
+                self.url, {"name": "Updated", "price": 39.99}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()["data"]
+        self.item.refresh_from_db()
+        self.assertEqual(data, json.loads(json.dumps(ItemSerializer(self.item).data)))
+        self.assertEqual((self.item.name, self.item.price), ("Updated", 39.99))
+        self.assertGreater(self.item.updated_at, self.item.created_at)
+
+    def test_patch_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.patch(self.url, {"price": 10}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["name"], "Test Item")
+        self.assertEqual(response.json()["data"]["price"], 10)
+
+    def test_update_missing_item(self):
+        with self.assertNumQueries(1):
+            response = self.client.put(
+                f"/api/v1/items/{self.item.id + 1}/", {"name": "x"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["message"], "No Item matches the given query.")
+
+    @override_settings(DATABASE_ROUTERS=["items.tests.ReplicaRouter"])
+    def test_update_goes_to_the_write_database(self):
+        for supported in (True, False):
+            with mock.patch(
+                "items.models.supports_update_returning", return_value=supported
+            ):
+                item = Item.objects.update_returning(self.item.pk, price=5.5)
+            self.assertEqual(item._state.db, "default")
+            self.assertEqual((item.name, item.price), ("Test Item", 5.5))
+            self.assertIsInstance(item.updated_at, type(self.item.updated_at))
+            self.assertIsNotNone(item.updated_at.tzinfo)
+
+    def test_fallback_without_returning_support(self):
+        with mock.patch("items.models.supports_update_returning", return_value=False):
+            with self.assertNumQueries(2):
+                response = self.client.put(
+                    self.url, {"name": "Fallback"}, format="json"
+                )
+        self.assertEqual(response.json()["data"]["name"], "Fallback")
+        self.item.refresh_from_db()
+        self.assertGreater(self.item.updated_at, self.item.created_at)
+
+
+class ReplicaRouter:
+    """Reads from a database that does not exist, so reading is an error"""
+
+    def db_for_read(self, model, **hints):
+        return "replica"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+
+class ItemFastJSONTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        for name, description, price in [
+            ('quote " back \\ slash', None, 0.1),
+            ("line\u2028sep\u2029para", "tab\tnew\nline", 1e16),
+            ("caf\u00e9 \U0001f600", "</script>", None),
+            (None, "", -0.0),
+            ("plain", "plain", 12345678901234.5),
+        ]:
+            Item.objects.create(name=name, description=description, price=price)
+
+    def assertSameBody(self, url):
+        fast = self.client.get(url)
+        clear_caches()
+        with override_settings(FAST_JSON_ENABLED=False):
+            slow = self.client.get(url)
+        clear_caches()
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_paged_list_is_byte_identical(self):
+        self.assertSameBody("/api/v1/items/")
+        self.assertSameBody("/api/v1/items/?limit=2&page=2&ordering=price")
+
+    def test_count_modes_are_byte_identical(self):
+        self.assertSameBody("/api/v1/items/?count=estimate&limit=2")
+        self.assertSameBody("/api/v1/items/?count=none")
+        self.assertSameBody("/api/v1/items/?is_paging=false")
+
+    def test_cursor_pages_are_byte_identical(self):
+        response = self.assertSameBody("/api/v1/items/?pagination=cursor&limit=2")
+        cursor = response.json()["data"]["next"]
+        self.assertSameBody(f"/api/v1/items/?cursor={cursor}&limit=2")
+        self.assertSameBody(
+            "/api/v1/items/?pagination=cursor&ordering=-created_at&limit=3"
+        )
+
+    def test_browsable_api_still_renders(self):
+        response = self.client.get("/api/v1/items/", HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b"caf", response.content)
+
+    def test_rows_are_not_built_as_instances(self):
+        with mock.patch.object(
+            ItemSerializer, "to_representation", side_effect=AssertionError
+        ):
+            response = self.client.get("/api/v1/items/")
+        self.assertEqual(len(response.json()["data"]["results"]), 5)
+
+    def test_renderer_splices_fragments(self):
+        encoder = RowEncoder.for_serializer(ItemSerializer)
+        rows = Item.objects.order_by("pk").values_list(*encoder.columns)
+        encoded = encoder.encode_rows(rows)
+        self.assertIsInstance(encoded, EncodedJSON)
+        self.assertEqual(len(encoded), 5)
+        expected = ItemSerializer(Item.objects.order_by("pk"), many=True).data
+        self.assertEqual(
+            FastJSONRenderer().render({"data": {"results": encoded}}),
+            FastJSONRenderer().render({"data": {"results": expected}}),
+        )
+
+    def test_unsupported_serializer_falls_back(self):
+        class DecoratedSerializer(ItemSerializer):
+            def to_representation(self, instance):
+                return {"id": instance.id}
+
+        self.assertIsNone(RowEncoder.for_serializer(DecoratedSerializer))
+
+
+class ItemAsyncViewTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        for index in range(30):
+            Item.objects.create(
+                name=f"async item {index}", description="served", price=index * 1.5
+            )
+        self.item = Item.objects.order_by("pk").first()
+
+    async def test_list_matches_sync_endpoint(self):
+        for query in (
+            "",
+            "?limit=5&page=2",
+            "?count=estimate&limit=7",
+            "?count=none&ordering=price",
+            "?is_paging=false&price_from=3&price_to=9",
+            "?search=item&limit=4",
+            "?pagination=cursor&ordering=-price&limit=4",
+        ):
+            response = await self.async_client.get(f"/api/v1/async/items/{query}")
+            expected = await sync_to_async(self.client.get)(f"/api/v1/items/{query}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content, query)
+
+    async def test_cursor_pages_walk_forward(self):
+        response = await self.async_client.get(
+            "/api/v1/async/items/?pagination=cursor&limit=20"
+        )
+        first = response.json()["data"]
+        response = await self.async_client.get(
+            f"/api/v1/async/items/?cursor={first['next']}&limit=20"
+        )
+        second = response.json()["data"]
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(len(ids), 30)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertIsNone(second["next"])
+
+    async def test_invalid_count_mode(self):
+        response = await self.async_client.get("/api/v1/async/items/?count=maybe")
+        self.assertEqual(response.json()["data"]["status"], 400)
+
+    async def test_retrieve(self):
+        url = f"/api/v1/async/items/{self.item.id}/"
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["name"], "async item 0")
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = await self.async_client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    async def test_retrieve_missing(self):
+        response = await self.async_client.get("/api/v1/async/items/999999/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["message"], "No Item matches the given query.")
+
+    async def test_create(self):
+        response = await self.async_client.post(
+            "/api/v1/async/items/",
+            {"name": "new", "price": 3.5},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["data"]["name"], "new")
+        self.assertEqual(await Item.objects.acount(), 31)
+
+    async def test_create_invalid(self):
+        response = await self.async_client.post(
+            "/api/v1/async/items/",
+            {"price": "cheap"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price", response.json()["errors"])
+
+    async def test_update_invalidates_cached_retrieve(self):
+        url = f"/api/v1/async/items/{self.item.id}/"
+        await self.async_client.get(url)
+        response = await self.async_client.put(
+            url, {"name": "renamed"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["name"], "renamed")
+        response = await self.async_client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["data"]["name"], "renamed")
+
+    async def test_partial_update(self):
+        response = await self.async_client.patch(
+            f"/api/v1/async/items/{self.item.id}/",
+            {"price": 10},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["data"]["price"], 10)
+        self.assertEqual(response.json()["data"]["name"], "async item 0")
+
+    async def test_delete(self):
+        response = await self.async_client.delete(
+            f"/api/v1/async/items/{self.item.id}/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(await Item.objects.filter(pk=self.item.pk).aexists())
+
+
+class ItemSeedCommandTest(TestCase):
+    def test_parse_rows(self):
+        self.assertEqual(parse_rows("10k"), 10000)
+        self.assertEqual(parse_rows("1M"), 1000000)
+        self.assertEqual(parse_rows("250"), 250)
+        with self.assertRaises(ValueError):
+            parse_rows("ten")
+
+    def test_seeds_rows_and_search_index(self):
+        call_command("seed_items", rows="120", batch_size=50, stdout=io.StringIO())
+        self.assertEqual(Item.objects.count(), 120)
+        self.assertEqual(Item.objects.filter(name__endswith=" 119").count(), 1)
+        response = APIClient().get("/api/v1/items/", {"search": "119"})
+        names = [row["name"] for row in response.json()["data"]["results"]]
+        self.assertTrue(any(name.endswith(" 119") for name in names), names)
+
+    def test_search_triggers_are_restored(self):
+        call_command("seed_items", rows="10", stdout=io.StringIO())
+        Item.objects.create(name="zeppelin", price=1)
+        response = APIClient().get("/api/v1/items/", {"search": "zeppelin"})
+        self.assertEqual(response.json()["data"]["total"], 1)
+
+    def test_clear(self):
+        Item.objects.create(name="existing", price=1)
+        call_command("seed_items", rows="5", clear=True, stdout=io.StringIO())
+        self.assertEqual(Item.objects.count(), 5)
+        self.assertFalse(Item.objects.filter(name="existing").exists())
+
+    def test_invalid_rows(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_items", rows="lots", stdout=io.StringIO())
+
+
+class QueryRecorderTest(TestCase):
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql(
+                'SELECT "id" FROM "items_item" WHERE "id" IN (%s, %s, %s)\n'
+                "AND name = 'it''s' AND price > 2.5 LIMIT 21 OFFSET 40"
+            ),
+            'SELECT "id" FROM "items_item" WHERE "id" IN (?, ...) '
+            "AND name = ? AND price > ? LIMIT ? OFFSET ?",
+        )
+        self.assertEqual(
+            normalize_sql("SELECT bm25(t) FROM t"), "SELECT bm25(t) FROM t"
+        )
+
+    def test_records_n_plus_one(self):
+        Item.objects.bulk_create(Item(name=f"item {index}") for index in range(5))
+        with QueryRecorder() as recorder:
+            for item in Item.objects.all():
+                Item.objects.get(pk=item.pk)
+        self.assertEqual(len(recorder), 6)
+        self.assertEqual(list(recorder.repeated_selects().values()), [5])
+
+    def test_transaction_statements_are_not_queries(self):
+        with QueryRecorder() as recorder:
+            with transaction.atomic():
+                Item.objects.create(name="in a transaction")
+        self.assertEqual(len(recorder), 1)
+        self.assertTrue(recorder.transaction_statements)
+
+
+class ItemQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Queries per ItemViewSet action, independent of the page size"""
+
+    # (action, method, path, payload, query budget)
+    QUERY_BUDGETS = [
+        ("list", "get", "/api/v1/items/", None, 2),
+        ("list large page", "get", "/api/v1/items/?limit=200", None, 2),
+        ("list deep page", "get", "/api/v1/items/?page=3&limit=20", None, 2),
+        ("list estimate", "get", "/api/v1/items/?count=estimate", None, 2),
+        ("list no count", "get", "/api/v1/items/?count=none", None, 1),
+        ("list unpaged", "get", "/api/v1/items/?is_paging=false", None, 1),
+        ("list cursor", "get", "/api/v1/items/?pagination=cursor", None, 1),
+        ("search", "get", "/api/v1/items/?search=item", None, 2),
+        (
+            "filter",
+            "get",
+            "/api/v1/items/?price_from=1&price_to=30&ordering=-price",
+            None,
+            2,
+        ),
+        ("export", "get", "/api/v1/items/?export=ndjson", None, 1),
+        ("retrieve", "get", "/api/v1/items/{pk}/", None, 1),
+        ("create", "post", "/api/v1/items/", {"name": "new", "price": 1}, 1),
+        ("update", "put", "/api/v1/items/{pk}/", {"name": "renamed"}, 1),
+        ("partial_update", "patch", "/api/v1/items/{pk}/", {"price": 2}, 1),
+        ("destroy", "delete", "/api/v1/items/{pk}/", None, 2),
+        (
+            "bulk_create",
+            "post",
+            "/api/v1/items/bulk/",
+            [{"name": f"bulk {index}"} for index in range(20)],
+            1,
+        ),
+        (
+            "bulk_update",
+            "put",
+            "/api/v1/items/bulk/",
+            [{"id": "{pk}", "price": 3}],
+            2,
+        ),
+        ("bulk_destroy", "delete", "/api/v1/items/bulk/", ["{pk}"], 3),
+    ]
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        Item.objects.bulk_create(
+            Item(name=f"item {index}", price=index % 40) for index in range(120)
+        )
+        # introspected once per process, not part of any request's budget
+        search_index_available(connection.alias, ItemViewSet.search_index)
+
+    @staticmethod
+    def with_pk(value, pk):
+        if isinstance(value, str):
+            return int(pk) if value == "{pk}" else value.replace("{pk}", str(pk))
+        if isinstance(value, list):
+            return [ItemQueryBudgetTest.with_pk(element, pk) for element in value]
+        if isinstance(value, dict):
+            return {
+                key: ItemQueryBudgetTest.with_pk(element, pk)
+                for key, element in value.items()
+            }
+        return value
+
+    def test_actions_stay_within_query_budgets(self):
+        for action, method, path, payload, budget in self.QUERY_BUDGETS:
+            with self.subTest(action=action):
+                clear_caches()
+                pk = Item.objects.create(name="target", price=5).pk
+                request = getattr(self.client, method)
+                with self.assertQueryBudget(budget):
+                    response = request(
+                        self.with_pk(path, pk),
+                        self.with_pk(payload, pk),
+                        format="json",
+                    )
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertLess(response.status_code, 400)
+
+    def test_cached_list_runs_no_queries(self):
+        self.client.get("/api/v1/items/")
+        with self.assertQueryBudget(0):
+            response = self.client.get("/api/v1/items/")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_budget_catches_n_plus_one(self):
+        with self.assertRaisesMessage(AssertionError, "N+1"):
+            with self.assertQueryBudget(100):
+                for item in Item.objects.all()[:3]:
+                    Item.objects.filter(pk=item.pk).exists()
+
+
+class ItemWallTimeBudgetTest(QueryBudgetMixin, TestCase):
+    """Uncached latency on a seeded dataset, with ~10x headroom over a
+    typical run; scale with WALL_TIME_BUDGET_SCALE on slow machines"""
+
+    # (path, median milliseconds)
+    WALL_TIME_BUDGETS = [
+        ("/api/v1/items/", 50),
+        ("/api/v1/items/?page=90&limit=50", 50),
+        ("/api/v1/items/?count=estimate&page=90", 50),
+        ("/api/v1/items/?pagination=cursor&ordering=-price", 50),
+        ("/api/v1/items/?ordering=created_at&limit=200", 100),
+        ("/api/v1/items/?price_from=100&price_to=900", 50),
+        ("/api/v1/items/?search=lamp", 100),
+        ("/api/v1/items/{pk}/", 25),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("seed_items", rows="5000", stdout=io.StringIO())
+        cls.pk = Item.objects.order_by("pk").values_list("pk", flat=True)[2500]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_requests_stay_within_wall_time_budgets(self):
+        for path, budget in self.WALL_TIME_BUDGETS:
+            path = path.replace("{pk}", str(self.pk))
+            with self.subTest(path=path):
+                self.assertWallTimeBudget(lambda: self.client.get(path), budget)
+
+
+class ItemMetricsTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        registry.reset()
+        self.client = APIClient()
+        for index in range(5):
+            Item.objects.create(name=f"metered {index}", price=index)
+
+    @staticmethod
+    def observed(values, histogram):
+        """(count, sum) of one histogram in a series"""
+        end = histogram.offset + histogram.width - 1
+        return sum(values[histogram.offset : end]), values[end]
+
+    def series(self, view, action, method="GET", status_code=200):
+        return registry.collect().get((view, action, method, status_code))
+
+    def test_viewset_requests_are_labelled_by_action(self):
+        self.client.get("/api/v1/items/")
+        self.client.get("/api/v1/items/")
+        self.client.post("/api/v1/items/", {"name": "new"}, format="json")
+        values = self.series("items-api-list", "list")
+        self.assertEqual(self.observed(values, registry.latency)[0], 2)
+        values = self.series("items-api-list", "create", "POST", 201)
+        self.assertEqual(self.observed(values, registry.latency)[0], 1)
+
+    def test_db_and_serializer_time_are_recorded(self):
+        response = self.client.get("/api/v1/items/?count=none")
+        values = self.series("items-api-list", "list")
+        self.assertEqual(self.observed(values, registry.db_queries), (1, 1))
+        self.assertGreater(self.observed(values, registry.db_time)[1], 0)
+        self.assertGreater(self.observed(values, registry.serializer)[1], 0)
+        self.assertEqual(
+            self.observed(values, registry.size), (1, len(response.content))
+        )
+
+    def test_db_wrapper_outlives_execute_wrapper_blocks(self):
+        with QueryRecorder() as recorder:
+            # a connection opened inside the block gets the shared wrapper
+            connection.execute_wrappers.remove(execute_wrappers)
+            install_execute_wrappers(connection)
+        self.assertIs(connection.execute_wrappers[0], execute_wrappers)
+        self.assertEqual(connection.execute_wrappers.count(execute_wrappers), 1)
+        self.assertNotIn(recorder, connection.execute_wrappers)
+        self.client.get("/api/v1/items/?count=none")
+        values = self.series("items-api-list", "list")
+        self.assertEqual(self.observed(values, registry.db_queries), (1, 1))
+
+    async def test_async_views_are_recorded(self):
+        await self.async_client.get("/api/v1/async/items/")
+        values = self.series("async-items-list", "get")
+        requests, queries = self.observed(values, registry.db_queries)
+        self.assertEqual(requests, 1)
+        self.assertGreaterEqual(queries, 1)
+
+    def test_exposition_format(self):
+        hits = response_cache.stats()["hits"]
+        self.client.get("/api/v1/items/")
+        self.client.get("/api/v1/items/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        labels = 'view="items-api-list",action="list",method="GET",status="200"'
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', body
+        )
+        self.assertIn(f"http_request_duration_seconds_count{{{labels}}} 2", body)
+        self.assertIn(f"response_cache_hits_total {hits + 1}", body)
+
+    def test_shards_of_finished_threads_are_retired(self):
+        metrics = MetricsRegistry()
+        key = ("view", "list", "GET", 200)
+
+        def record():
+            metrics.record(key, 0.01, RequestState(), 100)
+
+        threads = [threading.Thread(target=record) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        record()
+        values = metrics.collect()[key]
+        self.assertEqual(self.observed(values, metrics.latency)[0], 11)
+        # le="0.01" is inclusive
+        self.assertEqual(values[metrics.latency.offset + 1], 11)
+        self.assertEqual(len(metrics._shards), 1)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.client.get("/api/v1/items/")
+        self.assertEqual(registry.collect(), {})
+
+
+class ItemServerTimingTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        for index in range(5):
+            Item.objects.create(name=f"timed {index}", price=index)
+
+    @staticmethod
+    def phases(response):
+        return [entry.split(";")[0] for entry in response["Server-Timing"].split(", ")]
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_list_phases(self):
+        response = self.client.get("/api/v1/items/?price_from=1&price_to=3")
+        self.assertEqual(
+            self.phases(response),
+            [
+                "cache",
+                "get_queryset",
+                "filter",
+                "count",
+                "fetch",
+                "serialize",
+                "view",
+                "render",
+                "total",
+            ],
+        )
+        for entry in response["Server-Timing"].split(", "):
+            self.assertRegex(entry, r"^\w+;dur=\d+\.\d{2}$")
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_cached_response_is_timed(self):
+        self.client.get("/api/v1/items/")
+        response = self.client.get("/api/v1/items/")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(self.phases(response), ["cache", "view", "total"])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    async def test_async_view_phases(self):
+        response = await self.async_client.get("/api/v1/async/items/?count=estimate")
+        self.assertEqual(
+            self.phases(response)[:-1],
+            [
+                "cache",
+                "get_queryset",
+                "filter",
+                "fetch",
+                "count",
+                "serialize",
+                "render",
+            ],
+        )
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_not_sampled(self):
+        response = self.client.get("/api/v1/items/")
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertIsNone(span("fetch").__enter__())
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0, SERVER_TIMING_LOG=True)
+    def test_log_line(self):
+        pk = Item.objects.first().pk
+        with self.assertLogs("items.timing", "INFO") as logs:
+            self.client.get(f"/api/v1/items/{pk}/")
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["view"], "items-api-detail")
+        self.assertEqual(line["status"], 200)
+        self.assertIn("fetch", line["timings"])
+
+    def test_repeated_phases_accumulate(self):
+        timings = RequestTimings()
+        timings.add("fetch", 0.001)
+        timings.add("fetch", 0.002)
+        self.assertEqual(timings.header(), "fetch;dur=3.00")
+
+
+class ItemProfilingTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        for index in range(5):
+            Item.objects.create(name=f"profiled {index}", price=index)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.settings_override = override_settings(
+            PROFILES_DIR=self.directory, PROFILING_TOKEN="secret"
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def profile_files(self, response):
+        profile_id = response["X-Profile-Id"]
+        return sorted(
+            name[len(profile_id) :]
+            for name in os.listdir(self.directory)
+            if name.startswith(profile_id)
+        )
+
+    def test_trusted_header_profiles_with_cprofile(self):
+        response = self.client.get("/api/v1/items/", HTTP_X_PROFILE="secret")
+        self.assertEqual(self.profile_files(response), [".alloc.txt", ".prof"])
+        path = os.path.join(self.directory, response["X-Profile-Id"] + ".prof")
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn("generate_response", functions)
+
+    def test_query_flag_with_sampler(self):
+        response = self.client.get("/api/v1/items/?profile=secret&profile_mode=sample")
+        self.assertEqual(self.profile_files(response), [".alloc.txt", ".collapsed"])
+        with open(
+            os.path.join(self.directory, response["X-Profile-Id"] + ".alloc.txt")
+        ) as output:
+            self.assertTrue(output.readline().startswith("GET /api/v1/items/"))
+
+    async def test_async_requests_are_sampled(self):
+        response = await self.async_client.get(
+            "/api/v1/async/items/", headers={"X-Profile": "secret"}
+        )
+        self.assertEqual(self.profile_files(response), [".alloc.txt", ".collapsed"])
+
+    def test_untrusted_requests_are_not_profiled(self):
+        for headers in ({}, {"HTTP_X_PROFILE": "guess"}):
+            response = self.client.get("/api/v1/items/", **headers)
+            self.assertFalse(response.has_header("X-Profile-Id"))
+        with override_settings(PROFILING_TOKEN=None):
+            response = self.client.get("/api/v1/items/", HTTP_X_PROFILE="")
+        self.assertFalse(response.has_header("X-Profile-Id"))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sample_rate(self):
+        response = self.client.get("/api/v1/items/")
+        self.assertEqual(self.profile_files(response), [".alloc.txt", ".prof"])
+
+    def test_sampler_collapses_stacks(self):
+        sampler = StackSampler({threading.get_ident()}, interval=0.0005)
+        sampler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        stack, count = sampler.collapsed().splitlines()[0].rsplit(" ", 1)
+        self.assertIn("test_sampler_collapses_stacks (tests.py:", stack)
+        self.assertGreater(int(count), 0)
+
+
+class ItemSlowQueryTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        for index in range(5):
+            Item.objects.create(name=f"slow {index}", price=index)
+        slow_query_log.clear()
+        self.addCleanup(slow_query_log.clear)
+        # every query is slow, from here until the test's cleanup
+        threshold = override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+        threshold.enable()
+        self.addCleanup(threshold.disable)
+
+    def test_slow_queries_are_logged_with_their_plan(self):
+        with self.assertLogs("items.slow_queries", "WARNING") as logs:
+            self.client.get("/api/v1/items/?price_from=1&price_to=3&count=none")
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line["view"], line["action"]), ("items-api-list", "list"))
+        self.assertIn('"price" BETWEEN', line["sql"])
+        self.assertEqual(line["params"], ["1.0", "3.0"])
+        self.assertIn("items_item", line["plan"])
+
+    def test_top_table_groups_query_shapes(self):
+        with self.assertLogs("items.slow_queries", "WARNING"):
+            self.client.get("/api/v1/items/?count=none&price_from=1&price_to=2")
+            self.client.get("/api/v1/items/?count=none&price_from=2&price_to=4")
+        entries = [
+            entry for entry in slow_query_log.top() if entry["view"] == "items-api-list"
+        ]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["count"], 2)
+        self.assertIn('"price" BETWEEN ? AND ?', entries[0]["sql"])
+
+    @override_settings(SLOW_QUERY_TOP_N=2)
+    def test_top_table_is_bounded(self):
+        log = SlowQueryLog()
+        log.add("SELECT 1", (), 0.3, None, None, None)
+        log.add("SELECT a FROM t", (), 0.1, None, None, None)
+        log.add("SELECT b FROM t", (), 0.2, None, None, None)
+        log.add("SELECT c FROM t", (), 0.05, None, None, None)
+        self.assertEqual(
+            [entry["sql"] for entry in log.top()], ["SELECT ?", "SELECT b FROM t"]
+        )
+
+    def test_one_shared_wrapper_per_connection(self):
+        self.assertEqual(connection.execute_wrappers, [execute_wrappers])
+        with self.assertLogs("items.slow_queries", "WARNING"):
+            with QueryRecorder() as recorder:
+                Item.objects.count()
+        self.assertEqual(len(recorder), 1)
+        self.assertEqual(connection.execute_wrappers, [execute_wrappers])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=None)
+    def test_disabled(self):
+        self.client.get("/api/v1/items/")
+        self.assertEqual(slow_query_log.top(), [])
+
+    def test_endpoint_is_admin_only(self):
+        with self.assertLogs("items.slow_queries", "WARNING"):
+            self.client.get("/api/v1/items/")
+            response = self.client.get("/api/v1/slow-queries/")
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            admin = User.objects.create_user("admin", password="secret", is_staff=True)
+            self.client.force_authenticate(admin)
+            response = self.client.get("/api/v1/slow-queries/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()["data"])
+        self.assertEqual(
+            self.client.delete("/api/v1/slow-queries/").status_code,
+            status.HTTP_204_NO_CONTENT,
+        )
+        self.assertEqual(slow_query_log.top(), [])
@@ -1,10 +1,18 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import ItemViewSet
+from .views import AsyncItemDetailView, AsyncItemListView, ItemViewSet
 
 router = DefaultRouter()
 
 router.register(r"items", ItemViewSet, basename="items-api")
 
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path("async/items/", AsyncItemListView.as_view(), name="async-items-list"),
+    path(
+        "async/items/<int:pk>/",
+        AsyncItemDetailView.as_view(),
+        name="async-items-detail",
+    ),
+]
@@ -1,26 +1,36 @@
 import logging
 
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from api.utils.base import BaseViewSet
+from api.utils.base import BULK_BATCH_SIZE, AsyncBaseView, BaseViewSet
+from api.utils.cache import cache_response
+from api.utils.timing import timed
 
 from .models import Item
 from .serializers import ItemFormSerializer, ItemSerializer
+from .signals import invalidate_item_caches
 
 logger = logging.getLogger("items")
 
 
-class ItemViewSet(BaseViewSet):
+class ItemViewMixin:
     serializer_class = ItemSerializer
     queryset = Item.objects.all()
     serializer_form_class = ItemFormSerializer
     filter_fields = ["id", "name", "price"]
+    filterset_fields = filter_fields
     search_fields = ["id", "name", "price"]
+    # FTS5 index over name/description, see migration 0002_item_search_index
+    search_index = "items_item_fts"
 
+    @timed("get_queryset")
     def get_queryset(self):
         self.queryset = self.price_filtering(
             self.request.GET.get("price_from"),
@@ -29,6 +39,9 @@ class ItemViewSet(BaseViewSet):
         )
         return self.queryset.order_by("-pk")
 
+
+class ItemViewSet(ItemViewMixin, BaseViewSet):
+    @timed("fetch")
     def get_object(self):
         return get_object_or_404(Item, id=self.kwargs.get("pk"))
 
@@ -70,13 +83,31 @@ class ItemViewSet(BaseViewSet):
                 required=False,
                 description="Item price",
             ),
+            openapi.Parameter(
+                "export",
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=False,
+                enum=["ndjson", "csv"],
+                description="Stream every matching item instead of a page",
+            ),
         ],
     )
 
+    @cache_response()
     def list(self, request, *args, **kwargs):
         context = {"status": status.HTTP_200_OK}
 
         try:
+            export_format = request.GET.get("export")
+            if export_format:
+                logger.info(f"Exporting items as {export_format}")
+                return self.get_export_response(
+                    queryset=self.get_list(self.get_queryset()),
+                    serializer_class=self.serializer_class,
+                    export_format=export_format,
+                    filename="items",
+                )
             logger.info(f"Fetching all items")
             paginate = self.get_paginated_data(
                 queryset=self.get_list(self.get_queryset()),
@@ -92,6 +123,7 @@ class ItemViewSet(BaseViewSet):
         operation_description="Retrieve item details",
         operation_summary="Retrieve item details",
     )
+    @cache_response(detail=True)
     def retrieve(self, requests, *args, **kwargs):
         context = {"status": status.HTTP_200_OK}
         try:
@@ -150,13 +182,15 @@ class ItemViewSet(BaseViewSet):
         context = {"status": status.HTTP_200_OK}
         try:
             data = self.get_data(request)
-            instance = self.get_object()
-            serializer = self.serializer_form_class(data=data, instance=instance)
+            serializer = self.serializer_form_class(data=data)
             if serializer.is_valid():
-                _ = serializer.update(instance, serializer.validated_data)
+                # one UPDATE ... RETURNING instead of fetch, update and re-fetch
+                instance = serializer.update(
+                    Item(pk=self.kwargs.get("pk")), serializer.validated_data
+                )
                 context.update(
                     {
-                        "data": self.serializer_class(self.get_object()).data,
+                        "data": self.serializer_class(instance).data,
                         "status": status.HTTP_200_OK,
                     }
                 )
@@ -170,3 +204,218 @@ class ItemViewSet(BaseViewSet):
         except Exception as ex:
             context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
         return Response(context, status=context["status"])
+
+    @swagger_auto_schema(
+        operation_summary="Partially update item", request_body=ItemFormSerializer
+    )
+    def partial_update(self, request, *args, **kwargs):
+        """
+        Every ItemFormSerializer field is optional, so PATCH behaves like PUT
+        """
+        return self.update(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Add items in bulk",
+        request_body=ItemFormSerializer(many=True),
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request, *args, **kwargs):
+        """
+        This method handles creating many items in one transaction
+        """
+        context = {"status": status.HTTP_201_CREATED}
+        try:
+            elements = self.get_bulk_data(request, "items")
+            validated, errors = self.validate_many(self.serializer_form_class, elements)
+            if errors:
+                context.update(
+                    {"errors": errors, "status": status.HTTP_400_BAD_REQUEST}
+                )
+            else:
+                with transaction.atomic():
+                    instances = Item.objects.bulk_create(
+                        [Item(**data) for data in validated], batch_size=BULK_BATCH_SIZE
+                    )
+                invalidate_item_caches()
+                logger.info(f"Created {len(instances)} items in bulk")
+                context.update(
+                    {"data": self.serializer_class(instances, many=True).data}
+                )
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return Response(context, status=context["status"])
+
+    @swagger_auto_schema(
+        operation_summary="Update items in bulk",
+        request_body=ItemFormSerializer(many=True),
+    )
+    @bulk_create.mapping.put
+    def bulk_update(self, request, *args, **kwargs):
+        """
+        This method handles updating many items, each element carrying its id
+        """
+        context = {"status": status.HTTP_200_OK}
+        try:
+            elements = self.get_bulk_data(request, "items")
+            validated, errors = self.validate_many(
+                self.serializer_form_class, elements, require_id=True
+            )
+            ids = [pk for pk, _ in validated]
+            instances = Item.objects.in_bulk(ids) if not errors else {}
+            seen = set()
+            # without validation errors every element index maps to validated
+            for index, pk in enumerate(ids if not errors else []):
+                if pk not in instances:
+                    errors.append({"index": index, "errors": {"id": "Item not found"}})
+                elif pk in seen:
+                    errors.append(
+                        {"index": index, "errors": {"id": "Duplicate item id"}}
+                    )
+                seen.add(pk)
+            if errors:
+                context.update(
+                    {"errors": errors, "status": status.HTTP_400_BAD_REQUEST}
+                )
+            else:
+                now, fields = timezone.now(), {"updated_at"}
+                for pk, data in validated:
+                    instance = instances[pk]
+                    for field, value in data.items():
+                        setattr(instance, field, value)
+                    # bulk_update skips auto_now, set it explicitly
+                    instance.updated_at = now
+                    fields.update(data)
+                updated = [instances[pk] for pk in ids]
+                with transaction.atomic():
+                    Item.objects.bulk_update(
+                        updated, sorted(fields), batch_size=BULK_BATCH_SIZE
+                    )
+                invalidate_item_caches(*ids)
+                logger.info(f"Updated {len(updated)} items in bulk")
+                context.update({"data": self.serializer_class(updated, many=True).data})
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return Response(context, status=context["status"])
+
+    @swagger_auto_schema(operation_summary="Delete items in bulk")
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request, *args, **kwargs):
+        """
+        This method handles deleting many items by id in one transaction
+        """
+        context = {"status": status.HTTP_200_OK}
+        try:
+            elements = self.get_bulk_data(request, "ids")
+            errors, ids = [], []
+            for index, element in enumerate(elements):
+                try:
+                    ids.append(int(element))
+                except (TypeError, ValueError):
+                    errors.append({"index": index, "errors": {"id": "Invalid id"}})
+                    ids.append(None)
+            existing = set(Item.objects.filter(id__in=ids).values_list("id", flat=True))
+            for index, pk in enumerate(ids):
+                if pk is not None and pk not in existing:
+                    errors.append({"index": index, "errors": {"id": "Item not found"}})
+            if errors:
+                errors.sort(key=lambda error: error["index"])
+                context.update(
+                    {"errors": errors, "status": status.HTTP_400_BAD_REQUEST}
+                )
+            else:
+                with transaction.atomic():
+                    deleted, _ = Item.objects.filter(id__in=existing).delete()
+                logger.info(f"Deleted {deleted} items in bulk")
+                context.update(
+                    {"deleted": deleted, "message": "Items deleted successfully"}
+                )
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return Response(context, status=context["status"])
+
+
+class AsyncItemListView(ItemViewMixin, AsyncBaseView):
+    """Async list and create, see ItemViewSet"""
+
+    @cache_response()
+    async def get(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_200_OK}
+        try:
+            logger.info(f"Fetching all items")
+            paginate = await self.aget_paginated_data(
+                queryset=await self.aget_list(self.get_queryset()),
+                serializer_class=self.serializer_class,
+            )
+            context.update({"status": status.HTTP_200_OK, "data": paginate})
+        except Exception as ex:
+            logger.error(f"Error fetching all items due to {str(ex)}")
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return self.render_response(context)
+
+    async def post(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_201_CREATED}
+        try:
+            data = self.get_data(request)
+            serializer = self.serializer_form_class(data=data)
+            if serializer.is_valid():
+                instance = await Item.objects.acreate(**serializer.validated_data)
+                context.update({"data": self.serializer_class(instance).data})
+            else:
+                context.update(
+                    {
+                        "errors": self.error_message_formatter(serializer.errors),
+                        "status": status.HTTP_400_BAD_REQUEST,
+                    }
+                )
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return self.render_response(context)
+
+
+class AsyncItemDetailView(ItemViewMixin, AsyncBaseView):
+    """Async retrieve, update and destroy, see ItemViewSet"""
+
+    @cache_response(detail=True)
+    async def get(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_200_OK}
+        try:
+            context.update(
+                {"data": self.serializer_class(await self.aget_object()).data}
+            )
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return self.render_response(context)
+
+    async def put(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_200_OK}
+        try:
+            data = self.get_data(request)
+            serializer = self.serializer_form_class(data=data)
+            if serializer.is_valid():
+                instance = await serializer.aupdate(
+                    Item(pk=self.kwargs.get("pk")), serializer.validated_data
+                )
+                context.update({"data": self.serializer_class(instance).data})
+            else:
+                context.update(
+                    {
+                        "errors": self.error_message_formatter(serializer.errors),
+                        "status": status.HTTP_400_BAD_REQUEST,
+                    }
+                )
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return self.render_response(context)
+
+    async def patch(self, request, *args, **kwargs):
+        return await self.put(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_204_NO_CONTENT}
+        try:
+            instance = await self.aget_object()
+            await instance.adelete()
+            context.update({"message": "Item deleted successfully"})
+        except Exception as ex:
+            context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
+        return self.render_response(context)
@@ -1,8 +1,26 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request
 from rest_framework.viewsets import ViewSet
 
+from .export import QuerysetExporter
+from .fastjson import FastJSONRenderer
 from .pagination import CustomPaginator
+from .search import FullTextSearchFilter, search_index_available
+from .timing import span, timed
+
+logger = logging.getLogger("items")
+
+BULK_MAX_ITEMS = 10000
+BULK_BATCH_SIZE = 500
 
 
 class CustomFilter(DjangoFilterBackend):
@@ -18,7 +36,7 @@ class CustomFilter(DjangoFilterBackend):
 
 class AbstractBaseViewSet:
     custom_filter_class = CustomFilter()
-    search_backends = SearchFilter()
+    search_backends = FullTextSearchFilter()
     order_backend = OrderingFilter()
     filter_backends = [SearchFilter, DjangoFilterBackend]
     paginator_class = CustomPaginator()
@@ -44,13 +62,12 @@ class AbstractBaseViewSet:
                 logger.error(f"error filtering price due to {str(ex)}")
         return queryset
 
-
-class BaseViewSet(ViewSet, AbstractBaseViewSet):
     @staticmethod
     def get_data(request) -> dict:
         """Returns a dictionary from the request"""
         return request.data if isinstance(request.data, dict) else request.data.dict()
 
+    @timed("filter")
     def get_list(self, queryset):
         if "search" in self.request.query_params:
             query_set = self.search_backends.filter_queryset(
@@ -64,14 +81,139 @@ class BaseViewSet(ViewSet, AbstractBaseViewSet):
             query_set = queryset
         if "ordering" in self.request.query_params:
             query_set = self.order_backend.filter_queryset(
-                request=self.request, queryset=queryset, view=self
+                request=self.request, queryset=query_set, view=self
             )
+        elif self.search_backends.rank_annotation in query_set.query.annotations:
+            # best full-text matches first
+            rank = F(self.search_backends.rank_annotation)
+            query_set = query_set.order_by(rank.asc(nulls_last=True), "-pk")
         else:
             query_set = query_set.order_by("-pk")  # was originally 'pk'
         return query_set
 
+
+class BaseViewSet(ViewSet, AbstractBaseViewSet):
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def dispatch(self, request, *args, **kwargs):
+        # the action itself, rendering runs later and is timed on its own
+        with span("view"):
+            return super().dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def get_bulk_data(request, key) -> list:
+        """Returns the list payload of a bulk request, sent either as a bare
+        array or wrapped as {key: [...]}"""
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get(key)
+        if not isinstance(data, list) or not data:
+            raise ValueError(f"Expected a non-empty list of {key}")
+        if len(data) > BULK_MAX_ITEMS:
+            raise ValueError(f"A bulk request accepts at most {BULK_MAX_ITEMS} {key}")
+        return data
+
+    def validate_many(self, serializer_class, elements, require_id=False):
+        """Validates every element of a bulk payload in a single pass.
+
+        Returns the validated data of each element (paired with its id when
+        ``require_id``) and a list of per-element errors keyed by index.
+        """
+        validated, errors = [], []
+        for index, element in enumerate(elements):
+            if not isinstance(element, dict):
+                errors.append(
+                    {"index": index, "errors": {"item": "Expected an object"}}
+                )
+                continue
+            element_errors = {}
+            pk = None
+            if require_id:
+                try:
+                    pk = int(element.get("id"))
+                except (TypeError, ValueError):
+                    element_errors["id"] = "A valid item id is required"
+            serializer = serializer_class(data=element)
+            try:
+                if not serializer.is_valid():
+                    element_errors.update(
+                        self.error_message_formatter(serializer.errors)
+                    )
+            except ValueError as ex:
+                element_errors["item"] = str(ex)
+            if element_errors:
+                errors.append({"index": index, "errors": element_errors})
+            elif require_id:
+                validated.append((pk, serializer.validated_data))
+            else:
+                validated.append(serializer.validated_data)
+        return validated, errors
+
     def get_paginated_data(self, queryset, serializer_class):
         paginated_data = self.paginator_class.generate_response(
             queryset, serializer_class, self.request
         )
         return paginated_data
+
+    def get_export_response(self, queryset, serializer_class, export_format, filename):
+        """Streams the whole queryset as NDJSON or CSV"""
+        return QuerysetExporter(serializer_class).get_response(
+            queryset, export_format, filename=filename
+        )
+
+
+class AsyncBaseView(View, AbstractBaseViewSet):
+    """Async counterpart of BaseViewSet.
+
+    DRF 3.14 cannot dispatch to coroutines, so this is a Django async view:
+    the request is wrapped in a DRF Request for parsing and query params,
+    every query goes through the async ORM API and the response is rendered
+    with the same renderer as the sync endpoints. JSON only.
+    """
+
+    renderer_class = FastJSONRenderer
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # like APIView, authentication is not session based
+        view.csrf_exempt = True
+        return view
+
+    def setup(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        request.accepted_renderer = self.renderer_class()
+        request.accepted_media_type = request.accepted_renderer.media_type
+        super().setup(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(self.request, *args, **kwargs)
+
+    def render_response(self, context):
+        renderer = self.request.accepted_renderer
+        return HttpResponse(
+            renderer.render(context, renderer.media_type),
+            status=context["status"],
+            content_type=renderer.media_type,
+        )
+
+    async def aget_object(self):
+        model = self.queryset.model
+        try:
+            return await model._default_manager.aget(pk=self.kwargs.get("pk"))
+        except model.DoesNotExist:
+            raise Http404(f"No {model._meta.object_name} matches the given query.")
+
+    async def aget_list(self, queryset):
+        """Async get_list; filtering and ordering only build the query, but
+        the first search introspects the database for the FTS5 index"""
+        table = getattr(self, "search_index", None)
+        if table and "search" in self.request.query_params:
+            await sync_to_async(search_index_available)(queryset.db, table)
+        return self.get_list(queryset)
+
+    async def aget_paginated_data(self, queryset, serializer_class):
+        return await self.paginator_class.agenerate_response(
+            queryset, serializer_class, self.request
+        )
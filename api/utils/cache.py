@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max, Min
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from .timing import span, timed
+
+# request parameters that change the page but never the number of matching rows
+NON_FILTER_PARAMS = {
+    "page",
+    "limit",
+    "page_size",
+    "cursor",
+    "pagination",
+    "ordering",
+    "count",
+    "is_paging",
+    "format",
+}
+ESTIMATE_COUNT_CAP = 10000
+
+
+def get_cache():
+    return caches[getattr(settings, "COUNT_CACHE_ALIAS", "default")]
+
+
+def generation_key(model):
+    return f"generation:{model._meta.label_lower}"
+
+
+def get_generation(model, cache=None):
+    """Returns the current write generation of a model.
+
+    Every cached entry derived from a model embeds its generation in the key,
+    so bumping the generation invalidates all of them at once. The counter is
+    seeded from the clock so an evicted counter never revives stale entries.
+    """
+    cache = cache or get_cache()
+    return cache.get_or_set(generation_key(model), time.time_ns, None)
+
+
+def bump_generation(model, cache=None):
+    cache = cache or get_cache()
+    try:
+        cache.incr(generation_key(model))
+    except ValueError:
+        cache.set(generation_key(model), time.time_ns(), None)
+
+
+def normalize_params(query_params, exclude=NON_FILTER_PARAMS):
+    """Returns a canonical signature of the filter params, independent of
+    their order. Repeated values are kept as given: the filters read the
+    last one, so their order changes the query."""
+    params = {
+        key: query_params.getlist(key)
+        for key in query_params.keys()
+        if key not in exclude
+    }
+    # price_filtering reads each bound with GET.get(), its last value, and
+    # applies the range only when both bounds parse
+    price_from, price_to = params.pop("price_from", None), params.pop("price_to", None)
+    if price_from and price_to and price_from[-1] and price_to[-1]:
+        try:
+            params["price_range"] = [float(price_from[-1]), float(price_to[-1])]
+        except ValueError:
+            pass
+    return repr(sorted(params.items()))
+
+
+class CountCache:
+    """Caches COUNT(*) results per view path and normalized filter signature.
+
+    Entries are invalidated through the model generation, which the Item
+    save/delete signals and the bulk write paths bump.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, "COUNT_CACHE_TIMEOUT", 300)
+
+    def make_key(self, query_set, request, cache=None):
+        signature = f"{request.path}|{normalize_params(request.GET)}"
+        digest = hashlib.sha1(signature.encode("utf-8")).hexdigest()
+        generation = get_generation(query_set.model, cache)
+        return f"count:{query_set.model._meta.label_lower}:{generation}:{digest}"
+
+    def get(self, query_set, request):
+        cache = get_cache()
+        return cache.get(self.make_key(query_set, request, cache))
+
+    @timed("count")
+    def count(self, query_set, request):
+        """Returns the exact count, from cache when possible"""
+        cache = get_cache()
+        key = self.make_key(query_set, request, cache)
+        total = cache.get(key)
+        if total is None:
+            total = query_set.count()
+            cache.set(key, total, self.get_timeout())
+        return total
+
+    @timed("count")
+    def estimate(self, query_set, request):
+        """Returns a cheap approximation of the count.
+
+        A cached exact count is used when present. Otherwise an unfiltered
+        queryset is estimated from the primary key bounds (two index lookups)
+        and a filtered one is counted up to ESTIMATE_COUNT_CAP rows.
+        """
+        total = self.get(query_set, request)
+        if total is not None:
+            return total
+        if not query_set.query.where:
+            bounds = query_set.order_by().aggregate(low=Min("pk"), high=Max("pk"))
+            if bounds["high"] is None:
+                return 0
+            return bounds["high"] - bounds["low"] + 1
+        return query_set.order_by()[:ESTIMATE_COUNT_CAP].count()
+
+    @timed("count")
+    async def acount(self, query_set, request):
+        """Async count(), the COUNT(*) goes through the async ORM"""
+        cache = get_cache()
+        key = await sync_to_async(self.make_key)(query_set, request, cache)
+        total = await cache.aget(key)
+        if total is None:
+            total = await query_set.acount()
+            await cache.aset(key, total, self.get_timeout())
+        return total
+
+    @timed("count")
+    async def aestimate(self, query_set, request):
+        """Async estimate()"""
+        total = await sync_to_async(self.get)(query_set, request)
+        if total is not None:
+            return total
+        if not query_set.query.where:
+            bounds = await query_set.order_by().aaggregate(
+                low=Min("pk"), high=Max("pk")
+            )
+            if bounds["high"] is None:
+                return 0
+            return bounds["high"] - bounds["low"] + 1
+        return await query_set.order_by()[:ESTIMATE_COUNT_CAP].acount()
+
+    @staticmethod
+    def invalidate(model):
+        bump_generation(model)
+
+
+count_cache = CountCache()
+
+
+class ResponseCache:
+    """Read-through cache of rendered JSON responses.
+
+    Entries are keyed by path, renderer format and the normalized query
+    params. List entries embed the model generation and detail entries a
+    per-object version, so a write to one item only drops that item's detail
+    entries plus the list pages. The backend is the ``RESPONSE_CACHE_ALIAS``
+    cache: in-process LRU/TTL (locmem) by default, or a shared file cache.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_cache():
+        return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+    @staticmethod
+    def version_key(model, pk):
+        return f"version:{model._meta.label_lower}:{pk}"
+
+    @staticmethod
+    def is_cacheable(request):
+        renderer = getattr(request, "accepted_renderer", None)
+        return (
+            getattr(settings, "RESPONSE_CACHE_ENABLED", True)
+            and request.method in ("GET", "HEAD")
+            and renderer is not None
+            and renderer.format == "json"
+        )
+
+    def make_key(self, request, model, pk=None):
+        cache = self.get_cache()
+        signature = "|".join(
+            (
+                request.path,
+                request.accepted_renderer.format,
+                normalize_params(request.GET, exclude=()),
+            )
+        )
+        digest = hashlib.sha1(signature.encode("utf-8")).hexdigest()
+        label = model._meta.label_lower
+        if pk is None:
+            return f"response:{label}:list:{get_generation(model, cache)}:{digest}"
+        version = cache.get_or_set(self.version_key(model, pk), time.time_ns, None)
+        return f"response:{label}:detail:{pk}:{version}:{digest}"
+
+    def get(self, request, model, pk=None):
+        entry = self.get_cache().get(self.make_key(request, model, pk))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        status_code, content, content_type = entry
+        response = HttpResponse(content, status=status_code, content_type=content_type)
+        response["X-Cache"] = "HIT"
+        return response
+
+    def set(self, request, response, model, pk=None):
+        """Stores the response once it has been rendered.
+
+        DRF responses are stored from a post-render callback, the already
+        rendered responses of the async views straight away.
+        """
+        if response.streaming or response.status_code != 200:
+            return
+        key = self.make_key(request, model, pk)
+        timeout = getattr(settings, "RESPONSE_CACHE_TIMEOUT", 60)
+
+        def store(rendered):
+            entry = (rendered.status_code, rendered.content, rendered["Content-Type"])
+            self.get_cache().set(key, entry, timeout)
+
+        response["X-Cache"] = "MISS"
+        if isinstance(response, Response):
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+
+    def invalidate(self, model, pks=()):
+        """Drops the list entries of a model and the detail entries of pks"""
+        cache = self.get_cache()
+        bump_generation(model, cache)
+        if pks:
+            version = time.time_ns()
+            cache.set_many(
+                {self.version_key(model, pk): version for pk in pks}, timeout=None
+            )
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def cache_response(detail=False):
+    """Serves a viewset action from the response cache, keyed on the
+    view's queryset model and, for detail actions, the ``pk`` url kwarg"""
+
+    def decorator(view_method):
+        if asyncio.iscoroutinefunction(view_method):
+            return async_cache_response(view_method, detail)
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not response_cache.is_cacheable(request):
+                return view_method(self, request, *args, **kwargs)
+            model = self.queryset.model
+            pk = str(kwargs.get("pk")) if detail else None
+            with span("cache"):
+                cached = response_cache.get(request, model, pk)
+            if cached is not None:
+                return cached
+            response = view_method(self, request, *args, **kwargs)
+            response_cache.set(request, response, model, pk)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def async_cache_response(view_method, detail=False):
+    """cache_response for the handlers of async views"""
+
+    @wraps(view_method)
+    async def wrapper(self, request, *args, **kwargs):
+        if not response_cache.is_cacheable(request):
+            return await view_method(self, request, *args, **kwargs)
+        model = self.queryset.model
+        pk = str(kwargs.get("pk")) if detail else None
+        with span("cache"):
+            cached = await sync_to_async(response_cache.get)(request, model, pk)
+        if cached is not None:
+            return cached
+        response = await view_method(self, request, *args, **kwargs)
+        await sync_to_async(response_cache.set)(request, response, model, pk)
+        return response
+
+    return wrapper
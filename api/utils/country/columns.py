@@ -0,0 +1,378 @@
+# coding=utf-8
+"""Columnar copy of the scalar country fields, for analytic queries.
+
+Each field is packed into one array when the table is built: numbers into
+array('d') with NaN for a missing value, strings into array('H') codes
+over the field's distinct (interned) values. A CountryQuery narrows an
+ordered selection of row numbers with passes over those arrays, so
+filtering and sorting allocate no per-country dict; records, namedtuples
+of the selected fields, are built only when iterated.
+
+The first lookup on the whole table reads an index built with the column
+(the sorted values of a number column, the rows of each distinct string),
+later ones scan only the rows still selected.
+
+    get_country_table().filter(region="Africa", population__gt=50000000)
+        .order_by("-area").values("name", "area")[:3]
+
+Lookups follow the ORM's: exact (the default), in, gt, gte, lt, lte and
+isnull. Missing values match only isnull (or exact=None) and sort last.
+"""
+
+import math
+import operator
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+from .registry import get_registry
+
+COMPARISONS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+
+def table_orders(present, sort_keys, nulls):
+    """Every row sorted ascending and descending, missing values last"""
+    return {
+        descending: sorted(present, key=sort_keys.__getitem__, reverse=descending)
+        + list(nulls)
+        for descending in (False, True)
+    }
+
+
+class NumberColumn:
+    def __init__(self, values, kind=float):
+        """
+        :param values: iterable of numbers or None
+        :param kind: type
+            of the values handed back, float or int
+        """
+        self.data = array(
+            "d", (math.nan if value is None else value for value in values)
+        )
+        self.kind = kind
+        self.nulls = tuple(row for row, value in enumerate(self.data) if value != value)
+        # rows by ascending value, missing ones left out, for range lookups
+        self.order = sorted(
+            (row for row, value in enumerate(self.data) if value == value),
+            key=self.data.__getitem__,
+        )
+        self.sorted_values = [self.data[row] for row in self.order]
+        self.sort_keys = self.data
+        self.orders = table_orders(self.order, self.data, self.nulls)
+
+    def take(self, rows):
+        """The values of ``rows``, None where missing"""
+        data = self.data
+        if self.kind is float:
+            return [None if data[row] != data[row] else data[row] for row in rows]
+        kind = self.kind
+        return [None if data[row] != data[row] else kind(data[row]) for row in rows]
+
+    def select(self, lookup, value):
+        """Every row matching ``lookup``, in table order"""
+        if lookup == "isnull" or (lookup == "exact" and value is None):
+            if lookup == "exact" or value:
+                return self.nulls
+            return sorted(self.order)
+        if lookup == "in":
+            return sorted(
+                {
+                    row
+                    for each in set(value)
+                    if each is not None
+                    for row in self.select("exact", each)
+                }
+            )
+        values = self.sorted_values
+        if lookup == "exact":
+            rows = self.order[bisect_left(values, value) : bisect_right(values, value)]
+        elif lookup == "gt":
+            rows = self.order[bisect_right(values, value) :]
+        elif lookup == "gte":
+            rows = self.order[bisect_left(values, value) :]
+        elif lookup == "lt":
+            rows = self.order[: bisect_left(values, value)]
+        else:
+            rows = self.order[: bisect_right(values, value)]
+        return sorted(rows)
+
+    def scan(self, rows, lookup, value):
+        """The ``rows`` matching ``lookup``, read from the column"""
+        data = self.data
+        if lookup == "isnull" or (lookup == "exact" and value is None):
+            if lookup == "exact" or value:
+                return [row for row in rows if data[row] != data[row]]
+            return [row for row in rows if data[row] == data[row]]
+        if lookup == "in":
+            accepted = {float(each) for each in value if each is not None}
+            return [row for row in rows if data[row] in accepted]
+        # comparing floats to floats, not to ints, is what keeps this cheap
+        value = float(value)
+        if lookup == "exact":
+            return [row for row in rows if data[row] == value]
+        if lookup == "gt":
+            return [row for row in rows if data[row] > value]
+        if lookup == "gte":
+            return [row for row in rows if data[row] >= value]
+        if lookup == "lt":
+            return [row for row in rows if data[row] < value]
+        return [row for row in rows if data[row] <= value]
+
+
+class CategoryColumn:
+    def __init__(self, values):
+        """
+        :param values: iterable of str or None
+        """
+        self.categories, self.codes = [], {}
+        self.data = array("H")
+        for value in values:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.categories)
+                self.categories.append(value)
+            self.data.append(code)
+        # the rows of each distinct value, in table order
+        self.rows = [[] for _ in self.categories]
+        for row, code in enumerate(self.data):
+            self.rows[code].append(row)
+        self.nulls = tuple(self.rows[self.codes[None]]) if None in self.codes else ()
+        # the rank of each row's value among the distinct values, so that
+        # sorting compares small ints instead of strings
+        ranks = {
+            code: rank
+            for rank, code in enumerate(
+                sorted(
+                    (
+                        code
+                        for code, value in enumerate(self.categories)
+                        if value is not None
+                    ),
+                    key=self.categories.__getitem__,
+                )
+            )
+        }
+        self.sort_keys = array("H", (ranks.get(code, 0) for code in self.data))
+        present = [row for row in range(len(self.data)) if row not in self.nulls]
+        self.orders = table_orders(present, self.sort_keys, self.nulls)
+
+    def take(self, rows):
+        return list(map(self.categories.__getitem__, map(self.data.__getitem__, rows)))
+
+    def matching(self, lookup, value):
+        """Codes of the distinct values matching ``lookup``"""
+        if lookup == "exact":
+            code = self.codes.get(value)
+            return () if code is None else (code,)
+        if lookup == "isnull":
+            return [
+                code
+                for code, category in enumerate(self.categories)
+                if (category is None) == bool(value)
+            ]
+        if lookup == "in":
+            accepted = set(value)
+            return [
+                code
+                for code, category in enumerate(self.categories)
+                if category in accepted
+            ]
+        compare = COMPARISONS[lookup]
+        return [
+            code
+            for code, category in enumerate(self.categories)
+            if category is not None and compare(category, value)
+        ]
+
+    def select(self, lookup, value):
+        codes = self.matching(lookup, value)
+        if len(codes) == 1:
+            return self.rows[codes[0]]
+        return sorted(row for code in codes for row in self.rows[code])
+
+    def scan(self, rows, lookup, value):
+        # decided once per distinct value, rows only test their code
+        data, codes = self.data, self.matching(lookup, value)
+        if len(codes) == 1:
+            (code,) = codes
+            return [row for row in rows if data[row] == code]
+        codes = frozenset(codes)
+        return [row for row in rows if data[row] in codes]
+
+
+LOOKUPS = ("exact", "in", "isnull", *COMPARISONS)
+
+
+class CountryTable:
+    """The scalar fields of every country, one column each"""
+
+    # field -> (value of a country info, column type)
+    FIELDS = {
+        "name": (lambda info: info.get("name"), CategoryColumn),
+        "alpha2": (lambda info: info.get("ISO", {}).get("alpha2"), CategoryColumn),
+        "alpha3": (lambda info: info.get("ISO", {}).get("alpha3"), CategoryColumn),
+        "region": (lambda info: info.get("region"), CategoryColumn),
+        "subregion": (lambda info: info.get("subregion"), CategoryColumn),
+        "population": (
+            lambda info: info.get("population"),
+            lambda values: NumberColumn(values, int),
+        ),
+        "area": (lambda info: info.get("area"), NumberColumn),
+        "lat": (lambda info: (info.get("latlng") or [None, None])[0], NumberColumn),
+        "lng": (lambda info: (info.get("latlng") or [None, None])[1], NumberColumn),
+    }
+
+    def __init__(self, keys, columns):
+        """
+        :param keys: list
+            registry key of each row
+        :param columns: dict
+            field -> NumberColumn or CategoryColumn
+        """
+        self.keys = keys
+        self.columns = {"key": CategoryColumn(keys), **columns}
+
+    @classmethod
+    def from_countries(cls, countries):
+        keys = list(countries)
+        infos = [countries[key] for key in keys]
+        return cls(
+            keys,
+            {
+                field: column([value(info) for info in infos])
+                for field, (value, column) in cls.FIELDS.items()
+            },
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    def column(self, field):
+        try:
+            return self.columns[field]
+        except KeyError:
+            raise ValueError(f"unknown country field {field!r}") from None
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def record_type(fields):
+        return namedtuple("CountryRecord", fields)
+
+    def all(self):
+        return CountryQuery(self, range(len(self)))
+
+    def filter(self, **lookups):
+        return self.all().filter(**lookups)
+
+    def order_by(self, *fields):
+        return self.all().order_by(*fields)
+
+    def values(self, *fields):
+        return self.all().values(*fields)
+
+
+class CountryQuery:
+    """An ordered selection of table rows. Like a QuerySet every method
+    returns a new query, but the work is done right away."""
+
+    def __init__(self, table, rows, fields=None):
+        self.table = table
+        self.rows = rows
+        self.fields = fields or tuple(table.columns)
+
+    def _clone(self, rows=None, fields=None):
+        return CountryQuery(
+            self.table, self.rows if rows is None else rows, fields or self.fields
+        )
+
+    def filter(self, **lookups):
+        """Rows matching every ``field__lookup=value``"""
+        rows = self.rows
+        for key, value in lookups.items():
+            field, _, lookup = key.partition("__")
+            lookup = lookup or "exact"
+            if lookup not in LOOKUPS:
+                raise ValueError(f"unsupported lookup {key!r}")
+            column = self.table.column(field)
+            if rows == range(len(self.table)):
+                # the whole table: read the column's index
+                rows = list(column.select(lookup, value))
+            else:
+                # a narrowed selection: scan its values
+                rows = column.scan(rows, lookup, value)
+        return self._clone(rows=rows)
+
+    def order_by(self, *fields):
+        """Sorted on the fields, '-field' descending; stable"""
+        rows = self.rows
+        # a stable sort per field, the least significant first
+        for field in reversed(fields):
+            descending = field.startswith("-")
+            column = self.table.column(field.lstrip("-"))
+            if rows == range(len(self.table)):
+                # the whole table, in table order: sorted when built
+                rows = list(column.orders[descending])
+                continue
+            missing = []
+            if column.nulls:
+                nulls = frozenset(column.nulls)
+                missing = [row for row in rows if row in nulls]
+                rows = [row for row in rows if row not in nulls]
+            else:
+                rows = list(rows)
+            rows.sort(key=column.sort_keys.__getitem__, reverse=descending)
+            rows += missing
+        return self._clone(rows=rows)
+
+    def values(self, *fields):
+        """Projects the records on ``fields``, all of them by default"""
+        for field in fields:
+            self.table.column(field)
+        return self._clone(fields=fields or tuple(self.table.columns))
+
+    def column(self, field):
+        """One field of every row, as a list"""
+        return self.table.column(field).take(self.rows)
+
+    def keys(self):
+        """The registry keys of the rows, to fetch their info dicts"""
+        return self.column("key")
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self._clone(rows=self.rows[item])
+        return next(iter(self._clone(rows=[self.rows[item]])))
+
+    def __iter__(self):
+        columns = [self.column(field) for field in self.fields]
+        return map(self.table.record_type(self.fields)._make, zip(*columns))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def count(self):
+        return len(self.rows)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_country_table():
+    """The process-wide table, built from the registry on first use"""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = CountryTable.from_countries(get_registry())
+    return _table
@@ -1,7 +1,8 @@
 # coding=utf-8
-import json
-from glob import glob
-from os.path import dirname, isfile, realpath
+from .nearby import get_centroid_index
+from .registry import get_registry
+from .search import get_name_index
+from .spatial import get_spatial_index
 
 
 class Countries:
@@ -19,17 +20,21 @@ class Countries:
             pass country name
         """
         self.__country_name = country_name.lower() if country_name else ""
-        # get the files path
-        __file_dir_path = dirname(realpath(__file__))
-        __country_files = __file_dir_path + "/data/"
-        __files_path = [files for files in glob(__country_files + "*.json")]
-        self.__countries = {}
-        for file_path in __files_path:
-            if isfile(file_path):
-                country_info = json.load(open(file_path, encoding="utf-8"))
-                # pprint(country_info)
-                if country_info.get("name", None):
-                    self.__countries[country_info["name"].lower()] = country_info
+        # shared by every instance, compiled from data/*.json once per process
+        self.__countries = get_registry()
+        # this instance's own copies, as when it loaded the JSON files
+        self.__values = {}
+        self.__info = None
+        self.__all = None
+
+    def __value(self, field):
+        """This instance's copy of a field of its country"""
+        try:
+            return self.__values[field]
+        except KeyError:
+            value = self.__countries[self.__country_name].copy(field)
+            self.__values[field] = value
+            return value
 
     def info(self):
         """Returns all available information for a specified country.
@@ -37,7 +42,11 @@ class Countries:
         :return: dict
         """
         if self.__country_name:
-            _all = self.__countries[self.__country_name]
+            if self.__info is None:
+                # made of the same copies the field accessors return
+                record = self.__countries[self.__country_name]
+                self.__info = {field: self.__value(field) for field in record}
+            _all = self.__info
             # pprint(_all)
 
             return _all
@@ -48,7 +57,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _provinces = self.__countries[self.__country_name]["provinces"]
+            _provinces = self.__value("provinces")
             # pprint(_provinces)
 
             return _provinces
@@ -62,7 +71,7 @@ class Countries:
             based on param
         """
         if self.__country_name:
-            _iso = self.__countries[self.__country_name]["ISO"]
+            _iso = self.__value("ISO")
             # pprint(_iso)
 
             if alpha == 2:
@@ -78,7 +87,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _alt_spellings = self.__countries[self.__country_name]["altSpellings"]
+            _alt_spellings = self.__value("altSpellings")
             # pprint(_alt_spellings)
 
             return _alt_spellings
@@ -89,7 +98,7 @@ class Countries:
         :return: int
         """
         if self.__country_name:
-            _area = self.__countries[self.__country_name]["area"]
+            _area = self.__value("area")
             # pprint(_area)
 
             return _area
@@ -100,7 +109,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _borders = self.__countries[self.__country_name]["borders"]
+            _borders = self.__value("borders")
             # pprint(_borders)
 
             return _borders
@@ -111,7 +120,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _calling_codes = self.__countries[self.__country_name]["callingCodes"]
+            _calling_codes = self.__value("callingCodes")
             # pprint(_calling_codes)
 
             return _calling_codes
@@ -122,7 +131,7 @@ class Countries:
         :return: str
         """
         if self.__country_name:
-            _capital = self.__countries[self.__country_name]["capital"]
+            _capital = self.__value("capital")
             # pprint(_capital)
 
             return _capital
@@ -133,7 +142,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _currencies = self.__countries[self.__country_name]["currencies"]
+            _currencies = self.__value("currencies")
             # pprint(_currencies)
 
             return _currencies
@@ -144,7 +153,7 @@ class Countries:
         :return: str
         """
         if self.__country_name:
-            _demonym = self.__countries[self.__country_name]["demonym"]
+            _demonym = self.__value("demonym")
             # pprint(_demonym)
 
             return _demonym
@@ -156,7 +165,7 @@ class Countries:
             it will return an URL if available
         """
         if self.__country_name:
-            _flag = self.__countries[self.__country_name]["flag"]
+            _flag = self.__value("flag")
             # pprint(_flag)
 
             return _flag
@@ -167,7 +176,7 @@ class Countries:
         :return: dict
         """
         if self.__country_name:
-            _geo_json = self.__countries[self.__country_name]["geoJSON"]
+            _geo_json = self.__value("geoJSON")
             # pprint(_geo_json)
 
             return _geo_json
@@ -178,7 +187,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _languages = self.__countries[self.__country_name]["languages"]
+            _languages = self.__value("languages")
             # pprint(_languages)
 
             return _languages
@@ -189,7 +198,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _latlng = self.__countries[self.__country_name]["latlng"]
+            _latlng = self.__value("latlng")
             # pprint(_latlng)
 
             return _latlng
@@ -200,7 +209,7 @@ class Countries:
         :return: str
         """
         if self.__country_name:
-            _native_name = self.__countries[self.__country_name]["nativeName"]
+            _native_name = self.__value("nativeName")
             # pprint(_native_name)
 
             return _native_name
@@ -211,7 +220,7 @@ class Countries:
         :return: int
         """
         if self.__country_name:
-            _population = self.__countries[self.__country_name]["population"]
+            _population = self.__value("population")
             # pprint(_population)
 
             return _population
@@ -222,7 +231,7 @@ class Countries:
         :return: str
         """
         if self.__country_name:
-            _region = self.__countries[self.__country_name]["region"]
+            _region = self.__value("region")
             # pprint(_region)
 
             return _region
@@ -233,7 +242,7 @@ class Countries:
         :return: str
         """
         if self.__country_name:
-            _subregion = self.__countries[self.__country_name]["subregion"]
+            _subregion = self.__value("subregion")
             # pprint(_subregion)
 
             return _subregion
@@ -244,7 +253,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _timezones = self.__countries[self.__country_name]["timezones"]
+            _timezones = self.__value("timezones")
             # pprint(_timezones)
 
             return _timezones
@@ -255,7 +264,7 @@ class Countries:
         :return: list
         """
         if self.__country_name:
-            _tld = self.__countries[self.__country_name]["tld"]
+            _tld = self.__value("tld")
             # pprint(_tld)
 
             return _tld
@@ -266,7 +275,7 @@ class Countries:
         :return: dict
         """
         if self.__country_name:
-            _translations = self.__countries[self.__country_name]["translations"]
+            _translations = self.__value("translations")
             # pprint(_translations)
 
             return _translations
@@ -278,17 +287,153 @@ class Countries:
             return wiki url if available
         """
         if self.__country_name:
-            _wiki = self.__countries[self.__country_name]["wiki"]
+            _wiki = self.__value("wiki")
             # pprint(_wiki)
 
             return _wiki
 
+    def __find(self, field, value):
+        return [record.to_dict() for record in self.__countries.find(field, value)]
+
+    def by_alpha2(self, code):
+        """Returns the countries with an ISO 3166-1 alpha-2 code, any case.
+
+        Like every by_* lookup this reads a prebuilt reverse index and
+        returns the info() dicts, sorted by name; keys can be shared.
+
+        :param code: str
+
+        :return: list
+        """
+        return self.__find("alpha2", code)
+
+    def by_alpha3(self, code):
+        """Returns the countries with an ISO 3166-1 alpha-3 code, any case
+
+        :param code: str
+
+        :return: list
+        """
+        return self.__find("alpha3", code)
+
+    def by_calling_code(self, code):
+        """Returns the countries with an international calling code,
+        e.g. '234', '+1' or '1-684'
+
+        :param code: str
+
+        :return: list
+        """
+        return self.__find("calling_code", code)
+
+    def by_tld(self, tld):
+        """Returns the countries with a top level domain, with or without
+        the dot
+
+        :param tld: str
+
+        :return: list
+        """
+        return self.__find("tld", tld)
+
+    def by_currency(self, currency):
+        """Returns the countries with an official currency (ISO 4217)
+
+        :param currency: str
+
+        :return: list
+        """
+        return self.__find("currency", currency)
+
+    def by_alt_spelling(self, spelling):
+        """Returns the countries with an alternate spelling, any case
+
+        :param spelling: str
+
+        :return: list
+        """
+        return self.__find("alt_spelling", spelling)
+
+    def by_native_name(self, name):
+        """Returns the countries with a name in their native tongue,
+        any case
+
+        :param name: str
+
+        :return: list
+        """
+        return self.__find("native_name", name)
+
+    def by_location(self, lat, lng):
+        """Returns the countries whose geoJSON contains a point, usually
+        one, none at sea
+
+        :param lat: float
+        :param lng: float
+
+        :return: list
+        """
+        return [
+            self.__countries[name].to_dict()
+            for name in get_spatial_index().locate(lat, lng)
+        ]
+
+    def nearest(self, lat, lng, n=1):
+        """Returns the n countries whose centroid (latlng) is closest to a
+        point, closest first
+
+        :param lat: float
+        :param lng: float
+        :param n: int
+
+        :return: list
+            (info, distance in km) pairs
+        """
+        return [
+            (self.__countries[match.country].to_dict(), match.distance_km)
+            for match in get_centroid_index().nearest(lat, lng, n)
+        ]
+
+    def within(self, lat, lng, radius_km):
+        """Returns the countries whose centroid (latlng) is at most
+        radius_km from a point, closest first
+
+        :param lat: float
+        :param lng: float
+        :param radius_km: float
+
+        :return: list
+            (info, distance in km) pairs
+        """
+        return [
+            (self.__countries[match.country].to_dict(), match.distance_km)
+            for match in get_centroid_index().within(lat, lng, radius_km)
+        ]
+
+    def search(self, query, limit=5):
+        """Returns the countries best matching free text: English, native
+        or translated names and alternate spellings, typos tolerated
+
+        :param query: str
+        :param limit: int
+
+        :return: list
+            (info, score) pairs, best first; scores run from 0.3 to 1.0
+        """
+        return [
+            (self.__countries[match.country].to_dict(), match.score)
+            for match in get_name_index().search(query, limit)
+        ]
+
     def all(self):
         """return all of the countries information
 
         :return: dict
         """
-        _all = self.__countries
+        if self.__all is None:
+            # this instance's own copy, as when it loaded the JSON files
+            self.__all = self.__countries.as_dict()
+        _all = self.__all
         # pprint(_all)
 
         return _all
@@ -554,6 +699,11 @@ country_codes: tuple = (
 )
 
 
+# built once; like dict(country_codes), a repeated code keeps its last label
+_country_names = dict(country_codes)
+
+
 # Country name function: This function returns a given country name based on the inputted code.
+# For full phone numbers use api.utils.country.phone.resolve_phone_number.
 def country_name(code="234"):
-    return dict(country_codes).get(code)
+    return _country_names.get(code)
@@ -0,0 +1,212 @@
+# coding=utf-8
+"""Nearest-country and radius queries over the country centroids (latlng).
+
+Centroids are held as unit vectors in a 3-d k-d tree. The straight-line
+(chord) distance between two points of the sphere grows with their
+great-circle distance, so the tree is searched with plain Euclidean
+distances and only the results are converted to kilometres; there is no
+wrap-around at the antimeridian or the poles to handle.
+"""
+
+import heapq
+import math
+import threading
+from collections import namedtuple
+
+from .registry import get_registry
+
+EARTH_RADIUS_KM = 6371.0088
+
+# country is a registry key
+Nearby = namedtuple("Nearby", "country distance_km")
+
+
+def to_vector(lat, lng):
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (
+        math.cos(lat) * math.cos(lng),
+        math.cos(lat) * math.sin(lng),
+        math.sin(lat),
+    )
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def km_to_chord(distance_km):
+    if distance_km >= math.pi * EARTH_RADIUS_KM:
+        return 2.0
+    return 2 * math.sin(distance_km / (2 * EARTH_RADIUS_KM))
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
+
+
+class CentroidIndex:
+    def __init__(self, centroids):
+        """
+        :param centroids: dict
+            country -> (lat, lng)
+        """
+        self.centroids = centroids
+        # nodes hold the rank of the name, so that equidistant countries
+        # are ordered by name
+        self.names = sorted(centroids)
+        points = [
+            (to_vector(*centroids[name]), rank) for rank, name in enumerate(self.names)
+        ]
+        self.root = self._build(points, 0)
+
+    @classmethod
+    def from_countries(cls, countries):
+        """Indexes the latlng of a mapping of country name -> info; the
+        countries without one are left out"""
+        centroids = {}
+        for name in countries:
+            latlng = countries[name].get("latlng")
+            if latlng and len(latlng) == 2:
+                centroids[name] = tuple(latlng)
+        return cls(centroids)
+
+    @classmethod
+    def _build(cls, points, axis):
+        """Nodes are (vector, rank, axis, left, right)"""
+        if not points:
+            return None
+        points = sorted(points, key=lambda point: point[0][axis])
+        middle = len(points) // 2
+        vector, rank = points[middle]
+        following = (axis + 1) % 3
+        return (
+            vector,
+            rank,
+            axis,
+            cls._build(points[:middle], following),
+            cls._build(points[middle + 1 :], following),
+        )
+
+    def _nearest(self, target, n):
+        # the n closest so far, farthest on top: (-squared chord, -rank)
+        best = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            vector, rank, axis, left, right = node
+            squared = (
+                (vector[0] - target[0]) ** 2
+                + (vector[1] - target[1]) ** 2
+                + (vector[2] - target[2]) ** 2
+            )
+            if len(best) < n:
+                heapq.heappush(best, (-squared, -rank))
+            elif (-squared, -rank) > best[0]:
+                heapq.heapreplace(best, (-squared, -rank))
+            offset = target[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # popped last, so the near side is searched first
+            if len(best) < n or offset * offset <= -best[0][0]:
+                stack.append(far)
+            stack.append(near)
+        names = self.names
+        return [
+            Nearby(names[-rank], chord_to_km(math.sqrt(-squared)))
+            for squared, rank in sorted(best, reverse=True)
+        ]
+
+    def _within(self, target, chord):
+        limit = chord * chord
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            vector, rank, axis, left, right = node
+            squared = (
+                (vector[0] - target[0]) ** 2
+                + (vector[1] - target[1]) ** 2
+                + (vector[2] - target[2]) ** 2
+            )
+            if squared <= limit:
+                found.append((squared, rank))
+            offset = target[axis] - vector[axis]
+            if offset <= chord:
+                stack.append(left)
+            if offset >= -chord:
+                stack.append(right)
+        names = self.names
+        return [
+            Nearby(names[rank], chord_to_km(math.sqrt(squared)))
+            for squared, rank in sorted(found)
+        ]
+
+    def nearest(self, lat, lng, n=1):
+        """
+        :param lat: float
+        :param lng: float
+        :param n: int
+            number of countries
+
+        :return: list
+            Nearby(country, distance_km) of the n closest centroids,
+            closest first
+        """
+        if n < 1:
+            return []
+        return self._nearest(to_vector(float(lat), float(lng)), n)
+
+    def within(self, lat, lng, radius_km):
+        """
+        :return: list
+            Nearby(country, distance_km) of every centroid at most
+            ``radius_km`` away, closest first
+        """
+        if radius_km < 0:
+            return []
+        return self._within(to_vector(float(lat), float(lng)), km_to_chord(radius_km))
+
+    def nearest_many(self, points, n=1):
+        """nearest() over an iterable of (lat, lng) pairs"""
+        if n < 1:
+            return [[] for _ in points]
+        nearest = self._nearest
+        return [nearest(to_vector(float(lat), float(lng)), n) for lat, lng in points]
+
+    def within_many(self, points, radius_km):
+        """within() over an iterable of (lat, lng) pairs"""
+        if radius_km < 0:
+            return [[] for _ in points]
+        within, chord = self._within, km_to_chord(radius_km)
+        return [within(to_vector(float(lat), float(lng)), chord) for lat, lng in points]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_centroid_index():
+    """The process-wide index, built from the registry on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CentroidIndex.from_countries(get_registry())
+    return _index
+
+
+def nearest_countries(lat, lng, n=1):
+    return get_centroid_index().nearest(lat, lng, n)
+
+
+def countries_within(lat, lng, radius_km):
+    return get_centroid_index().within(lat, lng, radius_km)
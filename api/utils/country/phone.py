@@ -0,0 +1,150 @@
+# coding=utf-8
+"""Phone number to country resolution by longest calling-code prefix.
+
+Prefixes come from every country's ``callingCodes`` plus the
+``country_codes`` tuple, which adds finer ones such as 44-1481 (Guernsey).
+They are held in a dict per prefix, probed from the longest prefix length
+down, so a number costs at most one probe per distinct prefix length.
+"""
+
+import re
+import threading
+from collections import namedtuple
+
+from .countries import country_codes
+from .registry import get_registry, normalize_calling_code, normalize_key
+
+# countries are registry keys, several when the prefix is shared
+PhoneMatch = namedtuple("PhoneMatch", "prefix countries")
+
+_SEPARATORS = str.maketrans("", "", " \t-()./")
+_MISSING = object()
+
+
+def normalize_number(number):
+    """Digits of an international number, without the + or 00 prefix.
+
+    :return: str, or None for national numbers (leading 0) and anything
+        that is not a phone number
+    """
+    digits = str(number).translate(_SEPARATORS)
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    if not digits or digits[0] == "0" or not (digits.isascii() and digits.isdigit()):
+        return None
+    return digits
+
+
+def label_country(label, registry, prefix):
+    """Registry key of a ``country_codes`` label such as 'Nevis (1-869)'"""
+    name = normalize_key(re.sub(r"\(.*\)", "", label))
+    if name in registry:
+        return (name,)
+    for field in ("alt_spelling", "native_name"):
+        names = registry.lookup(field, name)
+        if names:
+            return names
+    # 'Nevis' is the registry's 'saint kitts and nevis'
+    names = tuple(
+        country
+        for country in registry.lookup("calling_code", prefix)
+        if name in country
+    )
+    return names or (name,)
+
+
+class PhonePrefixResolver:
+    def __init__(self, prefixes):
+        """
+        :param prefixes: dict
+            calling code prefix (digits) -> tuple of countries
+        """
+        self.prefixes = {
+            prefix: PhoneMatch(prefix, countries)
+            for prefix, countries in prefixes.items()
+        }
+        self.lengths = sorted({len(prefix) for prefix in prefixes}, reverse=True)
+        self.longest = self.lengths[0] if self.lengths else 0
+
+    @classmethod
+    def from_registry(cls, registry=None, codes=country_codes):
+        registry = registry or get_registry()
+        prefixes = {}
+        for prefix, countries in registry.lookups("calling_code").items():
+            prefixes.setdefault(prefix, set()).update(countries)
+        for code, label in codes:
+            prefix = normalize_calling_code(code)
+            prefixes.setdefault(prefix, set()).update(
+                label_country(label, registry, prefix)
+            )
+        return cls(
+            {prefix: tuple(sorted(countries)) for prefix, countries in prefixes.items()}
+        )
+
+    def match(self, digits):
+        """Longest prefix match of normalized digits"""
+        prefixes = self.prefixes
+        for length in self.lengths:
+            match = prefixes.get(digits[:length])
+            if match is not None:
+                return match
+        return None
+
+    def resolve(self, number):
+        """
+        :param number: str or int
+            E.164 ('+2348031234567'), MSISDN ('2348031234567') or with an
+            00 exit code, separators allowed
+
+        :return: PhoneMatch or None
+        """
+        digits = normalize_number(number)
+        return None if digits is None else self.match(digits)
+
+    def resolve_many(self, numbers):
+        """resolve() over any iterable of numbers (list, generator, array).
+
+        Matches are memoized on the leading digits for the batch, so large
+        batches cost one dict probe per number once their prefixes are seen.
+
+        :return: list
+            a PhoneMatch or None per number, shared between equal prefixes
+        """
+        memo, longest, match = {}, self.longest, self.match
+        results = []
+        append = results.append
+        for number in numbers:
+            digits = normalize_number(number)
+            if digits is None:
+                append(None)
+                continue
+            head = digits[:longest]
+            result = memo.get(head, _MISSING)
+            if result is _MISSING:
+                result = memo[head] = match(head)
+            append(result)
+        return results
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_phone_resolver():
+    """The process-wide resolver, built from the registry on first use"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = PhonePrefixResolver.from_registry()
+    return _resolver
+
+
+def resolve_phone_number(number):
+    return get_phone_resolver().resolve(number)
+
+
+def resolve_phone_numbers(numbers):
+    return get_phone_resolver().resolve_many(numbers)
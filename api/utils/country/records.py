@@ -0,0 +1,146 @@
+# coding=utf-8
+"""Compact country records.
+
+A record holds each field of the fixed schema (FIELDS) in its own slot,
+with the strings interned so values repeated across countries ("Africa",
+"EUR", "alpha2") are stored once. HEAVY_FIELDS are kept out of the record
+and decoded from the memory-mapped artifact the first time they are read.
+"""
+
+import marshal
+import sys
+from collections.abc import Mapping
+
+# every field of the JSON sources, in their order
+FIELDS = (
+    "name",
+    "altSpellings",
+    "area",
+    "borders",
+    "callingCodes",
+    "capital",
+    "currencies",
+    "demonym",
+    "flag",
+    "geoJSON",
+    "ISO",
+    "languages",
+    "latlng",
+    "nativeName",
+    "population",
+    "provinces",
+    "region",
+    "subregion",
+    "timezones",
+    "tld",
+    "translations",
+    "wiki",
+)
+# nine tenths of the dataset, read by few lookups
+HEAVY_FIELDS = frozenset(("geoJSON", "provinces", "translations"))
+_FIELD_SET = frozenset(FIELDS)
+
+
+def intern_strings(value):
+    """A copy of a decoded JSON value with every string interned"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+    if isinstance(value, dict):
+        return {sys.intern(key): intern_strings(item) for key, item in value.items()}
+    return value
+
+
+class CountryRecord(Mapping):
+    """Read-only country info, equal to the dict of its JSON source.
+
+    Fields outside FIELDS, which the sources do not have today, are kept
+    in a plain dict so that nothing is lost. Records are shared by the
+    whole process; the Countries accessors hand out to_dict() copies.
+    """
+
+    __slots__ = (*FIELDS, "_extra", "_heavy", "_buffer", "_base")
+
+    def __init__(self, fields, heavy=None, buffer=None, base=0):
+        """
+        :param fields: dict
+            the decoded fields
+        :param heavy: dict
+            field -> (offset, length) in ``buffer``, after ``base``, of the
+            fields left encoded
+        """
+        extra = {}
+        for field, value in fields.items():
+            if field in _FIELD_SET:
+                setattr(self, field, value)
+            else:
+                extra[field] = value
+        self._extra = extra or None
+        self._heavy = heavy or None
+        self._buffer = buffer
+        self._base = base
+
+    def __getitem__(self, field):
+        if field not in _FIELD_SET:
+            if self._extra and field in self._extra:
+                return self._extra[field]
+            raise KeyError(field)
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            pass
+        if not self._heavy or field not in self._heavy:
+            raise KeyError(field)
+        value = self._decode(field)
+        setattr(self, field, value)
+        return value
+
+    def _decode(self, field):
+        offset, length = self._heavy[field]
+        start = self._base + offset
+        return marshal.loads(self._buffer[start : start + length])
+
+    def _has(self, field):
+        return hasattr(self, field) or bool(self._heavy and field in self._heavy)
+
+    def __contains__(self, field):
+        if field in _FIELD_SET:
+            return self._has(field)
+        return bool(self._extra and field in self._extra)
+
+    def __iter__(self):
+        for field in FIELDS:
+            if self._has(field):
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self, field):
+        """A deep copy of one field's value, see to_dict()"""
+        if field in _FIELD_SET and not hasattr(self, field):
+            if not self._heavy or field not in self._heavy:
+                raise KeyError(field)
+            return self._decode(field)
+        return marshal.loads(marshal.dumps(self[field]))
+
+    def to_dict(self):
+        """A plain dict copy, nested lists and dicts included, that callers
+        may change and json.dumps(); heavy fields not read yet are decoded
+        for it without being kept by the record"""
+        values = {
+            field: getattr(self, field) for field in FIELDS if hasattr(self, field)
+        }
+        values.update(self._extra or ())
+        # marshal copies JSON values faster than copy.deepcopy
+        copied = marshal.loads(marshal.dumps(values))
+        return {
+            field: copied[field] if field in copied else self._decode(field)
+            for field in self
+        }
+
+    def __repr__(self):
+        return f"<CountryRecord {self.get('name')!r}>"
@@ -0,0 +1,305 @@
+# coding=utf-8
+"""Process-wide registry of the country dataset.
+
+The JSON files in ``data/`` are compiled into a single indexed artifact,
+``countries.bin``, which is memory-mapped once per process:
+
+    MAGIC | header length | header | record blobs
+
+The header (marshal) holds the artifact version, the fingerprint of the
+JSON sources it was built from, the offset and length of each record and
+the reverse lookup indexes (see LOOKUPS). A record is the marshalled dict
+of a country's light fields, decoded into a CountryRecord on first
+access, followed by one blob per heavy field (see records.py), decoded
+only when read. When the sources change the fingerprint no longer
+matches and the artifact is rebuilt; if it cannot be written the
+registry is served from the JSON files directly.
+
+Compile ahead of deployment with ``python -m api.utils.country.registry``.
+"""
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import unicodedata
+from collections.abc import Mapping
+from glob import glob
+from os.path import dirname, join, realpath
+from types import MappingProxyType
+
+from .records import HEAVY_FIELDS, CountryRecord, intern_strings
+
+ARTIFACT_MAGIC = b"CTRY"
+ARTIFACT_VERSION = 3
+PREAMBLE = struct.Struct("<4sI")
+COUNTRY_DIR = dirname(realpath(__file__))
+DATA_DIR = join(COUNTRY_DIR, "data")
+ARTIFACT_PATH = join(COUNTRY_DIR, "countries.bin")
+
+
+def normalize_key(value):
+    return unicodedata.normalize("NFC", str(value)).casefold().strip()
+
+
+def normalize_calling_code(value):
+    """'+1-684' and '1684' are the same calling code"""
+    return "".join(character for character in str(value) if character.isdigit())
+
+
+def normalize_tld(value):
+    # the data writes some internationalized TLDs with a trailing dot
+    return normalize_key(value).strip(".")
+
+
+# lookup field -> (values of a country info, key normalizer)
+LOOKUPS = {
+    "alpha2": (lambda info: [info.get("ISO", {}).get("alpha2")], normalize_key),
+    "alpha3": (lambda info: [info.get("ISO", {}).get("alpha3")], normalize_key),
+    "calling_code": (lambda info: info.get("callingCodes", []), normalize_calling_code),
+    "tld": (lambda info: info.get("tld", []), normalize_tld),
+    "currency": (lambda info: info.get("currencies", []), normalize_key),
+    "alt_spelling": (lambda info: info.get("altSpellings", []), normalize_key),
+    "native_name": (lambda info: [info.get("nativeName")], normalize_key),
+}
+
+
+def build_lookups(countries):
+    """Reverse indexes of every LOOKUPS field: normalized key -> sorted
+    tuple of country names, several when the key is shared"""
+    lookups = {field: {} for field in LOOKUPS}
+    for name, country_info in countries.items():
+        for field, (values, normalize) in LOOKUPS.items():
+            for value in values(country_info):
+                key = normalize(value) if value else ""
+                if key:
+                    lookups[field].setdefault(key, set()).add(name)
+    return {
+        field: {key: tuple(sorted(names)) for key, names in index.items()}
+        for field, index in lookups.items()
+    }
+
+
+def source_files(data_dir=DATA_DIR):
+    return sorted(glob(join(data_dir, "*.json")))
+
+
+def fingerprint(data_dir=DATA_DIR):
+    """Identifies the JSON sources, and the interpreter marshal format, from
+    file names, sizes and modification times without reading the files"""
+    digest = hashlib.sha1(
+        f"{ARTIFACT_VERSION}:{marshal.version}:{sys.version_info[:2]}".encode()
+    )
+    for path in source_files(data_dir):
+        stat = os.stat(path)
+        digest.update(
+            f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode()
+        )
+    return digest.hexdigest()
+
+
+def load_sources(data_dir=DATA_DIR):
+    """Parses the JSON sources, keyed by lowercase English name; files
+    without a name are skipped"""
+    countries = {}
+    for path in source_files(data_dir):
+        with open(path, encoding="utf-8") as source:
+            country_info = json.load(source)
+        if country_info.get("name", None):
+            countries[country_info["name"].lower()] = country_info
+    return countries
+
+
+def write_atomically(path, chunks):
+    """Writes ``chunks`` (bytes) to ``path`` through a temporary file in the
+    same directory, so readers never see a partial file"""
+    descriptor, temporary = tempfile.mkstemp(dir=dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as output:
+            output.writelines(chunks)
+        # mkstemp creates the file private to its owner
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def compile_artifact(data_dir=DATA_DIR, path=ARTIFACT_PATH):
+    """Writes the artifact for ``data_dir`` to ``path``, atomically.
+
+    :return: str
+        fingerprint of the compiled sources
+    """
+    source_fingerprint = fingerprint(data_dir)
+    countries = load_sources(data_dir)
+    blobs, index, offset = [], {}, 0
+    for name, country_info in countries.items():
+        light = intern_strings(
+            {
+                field: value
+                for field, value in country_info.items()
+                if field not in HEAVY_FIELDS
+            }
+        )
+        blob = marshal.dumps(light)
+        heavy, record_offset, record_length = {}, offset, len(blob)
+        blobs.append(blob)
+        offset += len(blob)
+        for field in [field for field in country_info if field in HEAVY_FIELDS]:
+            blob = marshal.dumps(country_info[field])
+            heavy[field] = (offset, len(blob))
+            blobs.append(blob)
+            offset += len(blob)
+        index[name] = (record_offset, record_length, heavy)
+    header = marshal.dumps(
+        {
+            "version": ARTIFACT_VERSION,
+            "fingerprint": source_fingerprint,
+            "index": index,
+            "lookups": build_lookups(countries),
+        }
+    )
+    write_atomically(path, [PREAMBLE.pack(ARTIFACT_MAGIC, len(header)), header, *blobs])
+    return source_fingerprint
+
+
+def read_artifact(path, expected_fingerprint):
+    """Maps the artifact at ``path``.
+
+    :return: (index, lookups, buffer, base offset), or None when the artifact is
+        missing, corrupt or built from other sources
+    """
+    try:
+        with open(path, "rb") as artifact:
+            buffer = mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, header_length = PREAMBLE.unpack_from(buffer)
+        if magic != ARTIFACT_MAGIC:
+            raise ValueError("not a country artifact")
+        start = PREAMBLE.size
+        header = marshal.loads(buffer[start : start + header_length])
+        if (
+            header.get("version") != ARTIFACT_VERSION
+            or header.get("fingerprint") != expected_fingerprint
+        ):
+            raise ValueError("stale country artifact")
+    except (struct.error, ValueError, EOFError, TypeError, AttributeError):
+        buffer.close()
+        return None
+    return header["index"], header["lookups"], buffer, start + header_length
+
+
+class CountryRegistry(Mapping):
+    """Read-only mapping of lowercase country name to CountryRecord.
+
+    Records are decoded from the artifact on first access and shared by
+    every Countries instance.
+    """
+
+    def __init__(self, index, lookups, buffer=None, base=0, records=None):
+        self._index = index
+        self._lookups = lookups
+        self._buffer = buffer
+        self._base = base
+        self._records = dict(records or {})
+        self._snapshot = None
+
+    @classmethod
+    def from_sources(cls, countries):
+        records = {
+            name: CountryRecord(intern_strings(country_info))
+            for name, country_info in countries.items()
+        }
+        return cls(dict.fromkeys(countries), build_lookups(countries), records=records)
+
+    def __getitem__(self, name):
+        try:
+            return self._records[name]
+        except KeyError:
+            offset, length, heavy = self._index[name]
+        start = self._base + offset
+        record = self._records[name] = CountryRecord(
+            marshal.loads(self._buffer[start : start + length]),
+            heavy,
+            self._buffer,
+            self._base,
+        )
+        return record
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def lookup(self, field, value):
+        """Names of the countries whose ``field`` (a LOOKUPS key) matches
+        ``value``, an empty tuple when none does"""
+        _, normalize = LOOKUPS[field]
+        return self._lookups[field].get(normalize(value), ())
+
+    def lookups(self, field):
+        """The whole reverse index of ``field``: key -> country names"""
+        return MappingProxyType(self._lookups[field])
+
+    def find(self, field, value):
+        """The country infos matching ``value``, sorted by name"""
+        return [self[name] for name in self.lookup(field, value)]
+
+    def as_dict(self):
+        """Every country as a new plain dict of to_dict() copies, for
+        callers that change or serialize them"""
+        if self._snapshot is None:
+            # the copies are taken once and kept marshalled: decoding that
+            # is cheaper than copying the records again, and leaves their
+            # heavy fields undecoded
+            self._snapshot = marshal.dumps(
+                {name: self[name].to_dict() for name in self._index}
+            )
+        return marshal.loads(self._snapshot)
+
+
+def build_registry(data_dir=DATA_DIR, path=ARTIFACT_PATH):
+    """Loads the registry from the artifact, rebuilding it when the sources
+    changed; falls back to the JSON sources when it cannot be written"""
+    expected = fingerprint(data_dir)
+    mapped = read_artifact(path, expected)
+    if mapped is None:
+        try:
+            compile_artifact(data_dir, path)
+        except OSError:
+            return CountryRegistry.from_sources(load_sources(data_dir))
+        mapped = read_artifact(path, expected)
+        if mapped is None:
+            # the sources changed while compiling
+            return CountryRegistry.from_sources(load_sources(data_dir))
+    return CountryRegistry(*mapped)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide registry, built on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = build_registry()
+    return _registry
+
+
+if __name__ == "__main__":
+    print(f"compiled {ARTIFACT_PATH} ({compile_artifact()})")
@@ -0,0 +1,164 @@
+# coding=utf-8
+"""Typo-tolerant country name search.
+
+Every English name, alternate spelling, native name and translation is
+folded (accents stripped, casefolded, punctuation dropped) and split into
+trigrams the way PostgreSQL's pg_trgm does: each word padded with two
+spaces in front and one behind. A query is scored against the names
+sharing at least one of its trigrams with the trigram Jaccard similarity,
+
+    shared / (query trigrams + name trigrams - shared)
+
+and each country ranks by its best scoring name.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import Counter, namedtuple
+
+from .registry import get_registry
+
+# pg_trgm's default similarity threshold
+MIN_SCORE = 0.3
+
+# country is a registry key, name the text that matched best
+CountryMatch = namedtuple("CountryMatch", "country score name")
+
+
+def fold(text):
+    """'Côte d'Ivoire' -> 'cote d ivoire'"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(
+        character for character in text if not unicodedata.combining(character)
+    )
+    return " ".join(re.sub(r"[\W_]+", " ", text.casefold()).split())
+
+
+def trigrams(folded):
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def country_names(country_info):
+    """Every name a country is known by"""
+    yield country_info.get("name")
+    yield from country_info.get("altSpellings") or ()
+    yield country_info.get("nativeName")
+    yield from (country_info.get("translations") or {}).values()
+
+
+class CountryNameIndex:
+    def __init__(self, names):
+        """
+        :param names: dict
+            name -> countries (registry keys) known by it
+        """
+        # one term per distinct folded name
+        terms = {}
+        for name, countries in names.items():
+            folded = fold(name)
+            if folded:
+                term = terms.setdefault(folded, [name, set()])
+                term[1].update(countries)
+        self.names = []
+        self.countries = []
+        self.sizes = []
+        postings = {}
+        for position, (folded, (name, countries)) in enumerate(terms.items()):
+            grams = trigrams(folded)
+            self.names.append(name)
+            self.countries.append(tuple(sorted(countries)))
+            self.sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: tuple(terms) for gram, terms in postings.items()}
+
+    @classmethod
+    def from_countries(cls, countries):
+        names = {}
+        for key in countries:
+            for name in country_names(countries[key]):
+                if name:
+                    names.setdefault(name, set()).add(key)
+        return cls(names)
+
+    def _search(self, folded, limit, min_score):
+        grams = trigrams(folded)
+        if not grams:
+            return []
+        shared_counts = Counter()
+        for gram in grams:
+            shared_counts.update(self.postings.get(gram, ()))
+        size, sizes, countries = len(grams), self.sizes, self.countries
+        best = {}
+        for term, shared in shared_counts.items():
+            score = shared / (size + sizes[term] - shared)
+            if score < min_score:
+                continue
+            for country in countries[term]:
+                if score > best.get(country, (0.0,))[0]:
+                    best[country] = (score, term)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))
+        return [
+            CountryMatch(country, score, self.names[term])
+            for country, (score, term) in ranked[:limit]
+        ]
+
+    def search(self, query, limit=5, min_score=MIN_SCORE):
+        """
+        :param query: str
+            free text, any case, accents optional, typos tolerated
+        :param limit: int
+            number of countries
+        :param min_score: float
+            similarity below which a name does not match, 0 to 1
+
+        :return: list
+            CountryMatch(country, score, name), best first; an exact
+            name scores 1.0
+        """
+        return self._search(fold(query), limit, min_score)
+
+    def search_many(self, queries, limit=1, min_score=MIN_SCORE):
+        """search() over an iterable of queries. Results are memoized on
+        the folded query for the batch, so repeated values, the norm when
+        cleaning a column of a dataset, are searched once.
+
+        :return: list
+            a list of matches per query, each its own list
+        """
+        memo, search = {}, self._search
+        results = []
+        for query in queries:
+            folded = fold(query)
+            matches = memo.get(folded)
+            if matches is None:
+                matches = memo[folded] = tuple(search(folded, limit, min_score))
+            results.append(list(matches))
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_name_index():
+    """The process-wide index, built from the registry on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CountryNameIndex.from_countries(get_registry())
+    return _index
+
+
+def search_countries(query, limit=5, min_score=MIN_SCORE):
+    return get_name_index().search(query, limit, min_score)
+
+
+def search_countries_many(queries, limit=1, min_score=MIN_SCORE):
+    return get_name_index().search_many(queries, limit, min_score)
@@ -0,0 +1,247 @@
+# coding=utf-8
+"""Point in country lookup over the geoJSON of the dataset.
+
+The world is cut into a uniform grid of CELL_SIZE degrees. At build time
+every cell a polygon's edges pass through is a boundary cell of that
+polygon; every other cell of its bounding box lies wholly inside or
+outside it, which one test of the cell centre decides. A point is then:
+
+- in no cell of the grid: in no country,
+- in a cell no edge crosses: in the countries known to cover the cell,
+- in a boundary cell: ray cast against the edges of the polygon that
+  cross its grid row only, even-odd, so holes such as Lesotho in South
+  Africa need no special case.
+
+Building takes a while, so the index is cached in ``spatial.bin``, keyed
+by the fingerprint of the JSON sources like ``countries.bin``.
+"""
+
+import marshal
+import math
+import threading
+from os.path import join
+
+from .registry import (
+    COUNTRY_DIR,
+    DATA_DIR,
+    fingerprint,
+    get_registry,
+    load_sources,
+    write_atomically,
+)
+
+INDEX_VERSION = 1
+INDEX_PATH = join(COUNTRY_DIR, "spatial.bin")
+# degrees, must divide 180
+CELL_SIZE = 1.0
+
+
+def country_polygons(country_info):
+    """Polygons of a country's geoJSON, each a list of [lng, lat] rings,
+    the outer ring first"""
+    for feature in (country_info.get("geoJSON") or {}).get("features", []):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            yield geometry["coordinates"]
+        elif geometry.get("type") == "MultiPolygon":
+            yield from geometry["coordinates"]
+
+
+def crosses_odd(edges, x, y):
+    """Whether a ray from (x, y) towards +x crosses ``edges`` an odd number
+    of times; edges are (y1, y2, x1, dx/dy)"""
+    inside = False
+    for y1, y2, x1, slope in edges:
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * slope:
+            inside = not inside
+    return inside
+
+
+class SpatialIndex:
+    def __init__(self, polygons, cells, cell_size=CELL_SIZE):
+        """
+        :param polygons: list
+            (country, {grid row: edges crossing the row}) per polygon
+        :param cells: dict
+            cell -> (sorted countries covering it, polygons crossing it)
+        :param cell_size: float
+            degrees
+        """
+        self.polygons = polygons
+        self.cells = cells
+        self.cell_size = cell_size
+        self.columns = math.ceil(360 / cell_size)
+        self.rows = math.ceil(180 / cell_size)
+
+    @classmethod
+    def from_countries(cls, countries, cell_size=CELL_SIZE):
+        """Indexes the geoJSON of a mapping of country name -> info"""
+        columns, rows = math.ceil(360 / cell_size), math.ceil(180 / cell_size)
+
+        def column(lng):
+            return min(max(int((lng + 180) / cell_size), 0), columns - 1)
+
+        def row(lat):
+            return min(max(int((lat + 90) / cell_size), 0), rows - 1)
+
+        polygons, covering, crossing = [], {}, {}
+        for name in sorted(countries):
+            for rings in country_polygons(countries[name]):
+                position = len(polygons)
+                bands, boundary = {}, set()
+                for ring in rings:
+                    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                        top, bottom = row(min(y1, y2)), row(max(y1, y2))
+                        for band in range(top, bottom + 1):
+                            for cell in range(
+                                column(min(x1, x2)), column(max(x1, x2)) + 1
+                            ):
+                                boundary.add(band * columns + cell)
+                            # horizontal edges are never crossed by the ray
+                            if y1 != y2:
+                                bands.setdefault(band, []).append(
+                                    (y1, y2, x1, (x2 - x1) / (y2 - y1))
+                                )
+                xs = [x for ring in rings for x, _ in ring]
+                ys = [y for ring in rings for _, y in ring]
+                for band in range(row(min(ys)), row(max(ys)) + 1):
+                    edges = bands.get(band, ())
+                    centre_y = (band + 0.5) * cell_size - 90
+                    for cell in range(column(min(xs)), column(max(xs)) + 1):
+                        key = band * columns + cell
+                        if key in boundary:
+                            crossing.setdefault(key, []).append(position)
+                        elif crosses_odd(
+                            edges, (cell + 0.5) * cell_size - 180, centre_y
+                        ):
+                            covering.setdefault(key, set()).add(name)
+                polygons.append(
+                    (name, {band: tuple(edges) for band, edges in bands.items()})
+                )
+        cells = {
+            key: (
+                tuple(sorted(covering.get(key, ()))),
+                tuple(crossing.get(key, ())),
+            )
+            for key in covering.keys() | crossing.keys()
+        }
+        return cls(polygons, cells, cell_size)
+
+    def dumps(self, source_fingerprint):
+        return marshal.dumps(
+            {
+                "version": INDEX_VERSION,
+                "fingerprint": source_fingerprint,
+                "cell_size": self.cell_size,
+                "polygons": self.polygons,
+                "cells": self.cells,
+            }
+        )
+
+    def _locate(self, lat, lng):
+        # NaN marks a missing coordinate in most datasets
+        if not (math.isfinite(lat) and math.isfinite(lng)) or not -90 <= lat <= 90:
+            return ()
+        # wrap longitudes outside [-180, 180)
+        lng = (lng + 180) % 360 - 180
+        band = min(int((lat + 90) / self.cell_size), self.rows - 1)
+        entry = self.cells.get(band * self.columns + int((lng + 180) / self.cell_size))
+        if entry is None:
+            return ()
+        covered, candidates = entry
+        if not candidates:
+            return covered
+        polygons = self.polygons
+        found = set(covered)
+        for position in candidates:
+            name, bands = polygons[position]
+            if name not in found and crosses_odd(bands.get(band, ()), lng, lat):
+                found.add(name)
+        return covered if len(found) == len(covered) else tuple(sorted(found))
+
+    def locate(self, lat, lng):
+        """
+        :param lat: float
+        :param lng: float
+
+        :return: tuple
+            names of the countries containing the point, sorted; empty at
+            sea and several where geometries overlap
+        """
+        return self._locate(float(lat), float(lng))
+
+    def locate_many(self, points):
+        """locate() over an iterable of (lat, lng) pairs, e.g.
+        ``zip(lats, lngs)`` over two coordinate arrays.
+
+        :return: list
+            a tuple of countries per point
+        """
+        locate = self._locate
+        return [locate(float(lat), float(lng)) for lat, lng in points]
+
+
+def read_index(path, expected_fingerprint, cell_size=CELL_SIZE):
+    """Loads a cached index, None when it is missing, corrupt or stale"""
+    try:
+        with open(path, "rb") as cached:
+            header = marshal.loads(cached.read())
+        if (
+            header.get("version") != INDEX_VERSION
+            or header.get("fingerprint") != expected_fingerprint
+            or header.get("cell_size") != cell_size
+        ):
+            return None
+        return SpatialIndex(header["polygons"], header["cells"], cell_size)
+    except (OSError, ValueError, EOFError, TypeError, AttributeError, KeyError):
+        return None
+
+
+def build_spatial_index(
+    data_dir=DATA_DIR, path=INDEX_PATH, countries=None, cell_size=CELL_SIZE
+):
+    """Loads the index cached at ``path``, rebuilding and caching it when
+    the sources changed; served from memory when it cannot be written.
+
+    :param countries: Mapping
+        the records of ``data_dir``, loaded from it when not given
+    """
+    expected = fingerprint(data_dir)
+    index = read_index(path, expected, cell_size)
+    if index is None:
+        if countries is None:
+            countries = load_sources(data_dir)
+        index = SpatialIndex.from_countries(countries, cell_size)
+        try:
+            write_atomically(path, [index.dumps(expected)])
+        except OSError:
+            pass
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_spatial_index():
+    """The process-wide index, loaded on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_spatial_index(countries=get_registry())
+    return _index
+
+
+def locate_point(lat, lng):
+    return get_spatial_index().locate(lat, lng)
+
+
+def locate_points(points):
+    return get_spatial_index().locate_many(points)
+
+
+if __name__ == "__main__":
+    index = SpatialIndex.from_countries(get_registry())
+    write_atomically(INDEX_PATH, [index.dumps(fingerprint())])
+    print(f"compiled {INDEX_PATH} ({len(index.cells)} cells)")
@@ -0,0 +1,802 @@
+import json
+import marshal
+import os
+import random
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import records, registry, spatial, views
+from .countries import Countries, country_name
+from .columns import CountryTable, get_country_table
+from .nearby import CentroidIndex, get_centroid_index, haversine
+from .phone import PhonePrefixResolver, get_phone_resolver, normalize_number
+from .search import CountryNameIndex, fold, get_name_index
+from .spatial import SpatialIndex, build_spatial_index, crosses_odd, get_spatial_index
+
+
+class CountryRegistryTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = os.path.join(directory.name, "data")
+        os.mkdir(self.data_dir)
+        for name in ("nigeria", "ghana", "antarctica"):
+            shutil.copy(os.path.join(registry.DATA_DIR, f"{name}.json"), self.data_dir)
+        self.path = os.path.join(directory.name, "countries.bin")
+
+    def build(self):
+        return registry.build_registry(self.data_dir, self.path)
+
+    def test_registry_matches_json_sources(self):
+        countries = self.build()
+        # antarctica.json has no name and is skipped, as before
+        self.assertEqual(sorted(countries), ["ghana", "nigeria"])
+        self.assertEqual(
+            dict(countries.as_dict()), registry.load_sources(self.data_dir)
+        )
+        self.assertTrue(os.path.isfile(self.path))
+
+    def test_artifact_is_reused(self):
+        self.build()
+        with mock.patch.object(registry, "compile_artifact") as compile_artifact:
+            self.assertEqual(self.build()["ghana"]["capital"], "Accra")
+        compile_artifact.assert_not_called()
+
+    def test_changed_sources_rebuild_the_artifact(self):
+        self.build()
+        path = os.path.join(self.data_dir, "ghana.json")
+        with open(path, encoding="utf-8") as source:
+            ghana = json.load(source)
+        ghana["capital"] = "Kumasi"
+        with open(path, "w", encoding="utf-8") as source:
+            json.dump(ghana, source)
+        self.assertEqual(self.build()["ghana"]["capital"], "Kumasi")
+
+    def test_corrupt_artifact_is_rebuilt(self):
+        with open(self.path, "wb") as artifact:
+            artifact.write(b"CTRY\xff\xff\xff\xff")
+        self.assertEqual(self.build()["nigeria"]["capital"], "Abuja")
+
+    def test_falls_back_to_sources_when_artifact_cannot_be_written(self):
+        with mock.patch.object(registry, "compile_artifact", side_effect=OSError):
+            countries = self.build()
+        self.assertEqual(countries["nigeria"]["capital"], "Abuja")
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_registry_is_read_only(self):
+        countries = self.build()
+        with self.assertRaises(TypeError):
+            countries["atlantis"] = {}
+        with self.assertRaises(TypeError):
+            countries["ghana"]["capital"] = "Kumasi"
+
+    def test_heavy_fields_are_decoded_on_first_access(self):
+        countries = self.build()
+        with mock.patch.object(records.marshal, "loads", wraps=marshal.loads) as loads:
+            nigeria = countries["nigeria"]
+            self.assertEqual(nigeria["capital"], "Abuja")
+            self.assertEqual(loads.call_count, 1)
+            self.assertIn("geoJSON", nigeria)
+            self.assertEqual(loads.call_count, 1)
+            self.assertIs(nigeria["geoJSON"], nigeria["geoJSON"])
+            self.assertEqual(loads.call_count, 2)
+
+    def test_records_equal_their_sources(self):
+        countries, sources = self.build(), registry.load_sources(self.data_dir)
+        for name, source in sources.items():
+            record = countries[name]
+            self.assertEqual(record, source)
+            self.assertEqual(list(record), list(source))
+            self.assertEqual(len(record), len(source))
+        self.assertIsNone(countries["ghana"].get("motto"))
+        with self.assertRaises(KeyError):
+            countries["ghana"]["motto"]
+
+    def test_to_dict_is_a_deep_copy(self):
+        countries, sources = self.build(), registry.load_sources(self.data_dir)
+        nigeria = countries["nigeria"]
+        info = nigeria.to_dict()
+        self.assertIs(type(info), dict)
+        self.assertEqual(info, sources["nigeria"])
+        self.assertEqual(list(info), list(sources["nigeria"]))
+        self.assertIsNot(info["ISO"], nigeria["ISO"])
+        # heavy fields are decoded for the copy only
+        self.assertFalse(hasattr(nigeria, "geoJSON"))
+
+    def test_as_dict_copies_a_snapshot(self):
+        countries, sources = self.build(), registry.load_sources(self.data_dir)
+        with mock.patch.object(
+            records.CountryRecord,
+            "to_dict",
+            autospec=True,
+            side_effect=records.CountryRecord.to_dict,
+        ) as to_dict:
+            first, second = countries.as_dict(), countries.as_dict()
+        # the records are copied once, each call decodes the snapshot
+        self.assertEqual(to_dict.call_count, 2)
+        self.assertEqual(first, sources)
+        self.assertIsNot(first["ghana"]["ISO"], second["ghana"]["ISO"])
+        self.assertFalse(hasattr(countries["nigeria"], "geoJSON"))
+
+    def test_strings_are_interned(self):
+        countries = self.build()
+        nigeria, ghana = countries["nigeria"], countries["ghana"]
+        self.assertIs(nigeria["region"], ghana["region"])
+        self.assertIs(next(iter(nigeria["ISO"])), next(iter(ghana["ISO"])))
+
+    def test_fields_outside_the_schema_are_kept(self):
+        record = records.CountryRecord({"name": "Atlantis", "motto": "Glub"})
+        self.assertEqual(record, {"name": "Atlantis", "motto": "Glub"})
+        self.assertEqual(list(record), ["name", "motto"])
+
+
+class CountriesTest(SimpleTestCase):
+    def test_instances_share_one_registry(self):
+        with mock.patch.object(registry, "build_registry") as build_registry:
+            Countries("nigeria").info()
+            Countries("ghana").info()
+        build_registry.assert_not_called()
+        country = Countries()
+        self.assertIs(country.all(), country.all())
+        self.assertIsNot(country.all(), Countries().all())
+
+    def test_all_returns_plain_dicts(self):
+        everything = Countries().all()
+        self.assertIs(type(everything), dict)
+        self.assertIs(type(everything["nigeria"]), dict)
+        self.assertEqual(json.loads(json.dumps(everything)), everything)
+        # neither the dict nor its nested values are shared with other callers
+        everything.pop("ghana")
+        everything["nigeria"]["ISO"]["alpha2"] = "XX"
+        everything["nigeria"]["provinces"].clear()
+        everything = Countries().all()
+        self.assertIn("ghana", everything)
+        self.assertEqual(everything["nigeria"]["ISO"]["alpha2"], "NG")
+        self.assertTrue(everything["nigeria"]["provinces"])
+        self.assertEqual(Countries("nigeria").iso(2), "NG")
+
+    def test_accessors(self):
+        country = Countries("Nigeria")
+        self.assertEqual(country.capital(), "Abuja")
+        self.assertEqual(country.iso(2), "NG")
+        self.assertEqual(country.iso(3), "NGA")
+        self.assertEqual(country.calling_codes(), ["234"])
+        self.assertEqual(len(Countries().all()), 233)
+
+    def test_accessors_return_the_source_data(self):
+        accessors = {
+            "info": None,
+            "provinces": "provinces",
+            "iso": "ISO",
+            "alt_spellings": "altSpellings",
+            "area": "area",
+            "borders": "borders",
+            "calling_codes": "callingCodes",
+            "capital": "capital",
+            "currencies": "currencies",
+            "demonym": "demonym",
+            "flag": "flag",
+            "geo_json": "geoJSON",
+            "languages": "languages",
+            "latlng": "latlng",
+            "native_name": "nativeName",
+            "population": "population",
+            "region": "region",
+            "subregion": "subregion",
+            "timezones": "timezones",
+            "tld": "tld",
+            "translations": "translations",
+            "wiki": "wiki",
+        }
+        for name, source in registry.load_sources().items():
+            country = Countries(name)
+            for accessor, field in accessors.items():
+                if field is None:
+                    self.assertEqual(country.info(), source)
+                elif field in source:
+                    self.assertEqual(getattr(country, accessor)(), source[field])
+                else:
+                    with self.assertRaises(KeyError):
+                        getattr(country, accessor)()
+
+    def test_unknown_country(self):
+        with self.assertRaises(KeyError):
+            Countries("atlantis").info()
+
+    def test_accessors_return_plain_dicts(self):
+        country = Countries("nigeria")
+        infos = [
+            country.info(),
+            *country.by_alpha2("NG"),
+            *country.by_location(6.45, 3.39),
+            country.nearest(10, 8.5)[0][0],
+            country.search("Nigeria", limit=1)[0][0],
+        ]
+        for info in infos:
+            self.assertIs(type(info), dict)
+            self.assertEqual(json.loads(json.dumps(info)), info)
+        self.assertIs(country.info(), country.info())
+        # changing a copy, nested values included, leaves the registry as is
+        info = country.info()
+        info["capital"] = "Lagos"
+        info["geoJSON"]["features"].clear()
+        info["ISO"]["alpha2"] = "XX"
+        self.assertEqual(country.info()["capital"], "Lagos")
+        fresh = Countries("nigeria").info()
+        self.assertEqual(fresh["capital"], "Abuja")
+        self.assertTrue(fresh["geoJSON"]["features"])
+        self.assertEqual(country.by_alpha2("NG")[0]["ISO"]["alpha2"], "NG")
+        # info() and the field accessors share the instance's copies
+        self.assertEqual(country.iso(2), "XX")
+
+    def test_field_accessors_return_copies(self):
+        country = Countries("nigeria")
+        country.calling_codes().append("999")
+        country.iso()["alpha2"] = "ZZ"
+        country.provinces().clear()
+        country.geo_json()["features"].clear()
+        # the instance keeps its changes, as with its own parsed JSON
+        self.assertEqual(country.calling_codes(), ["234", "999"])
+        self.assertEqual(country.info()["ISO"]["alpha2"], "ZZ")
+        fresh = Countries("nigeria")
+        self.assertEqual(fresh.calling_codes(), ["234"])
+        self.assertEqual(fresh.iso(2), "NG")
+        self.assertEqual(fresh.info()["ISO"]["alpha2"], "NG")
+        self.assertTrue(fresh.provinces())
+        self.assertTrue(fresh.geo_json()["features"])
+        self.assertEqual(Countries().by_alpha2("NG")[0]["callingCodes"], ["234"])
+
+
+class CountryLookupTest(SimpleTestCase):
+    def setUp(self):
+        self.countries = Countries()
+
+    @staticmethod
+    def names(records):
+        return [record["name"] for record in records]
+
+    def test_iso_codes(self):
+        self.assertEqual(self.names(self.countries.by_alpha2("ng")), ["Nigeria"])
+        self.assertEqual(self.names(self.countries.by_alpha3("NGA")), ["Nigeria"])
+        # Wales carries the United Kingdom's codes
+        self.assertEqual(
+            self.names(self.countries.by_alpha2("GB")), ["United Kingdom", "Wales"]
+        )
+        self.assertEqual(self.countries.by_alpha3("XXX"), [])
+
+    def test_shared_calling_codes(self):
+        self.assertEqual(
+            self.names(self.countries.by_calling_code("+44")),
+            ["Guernsey", "Isle of Man", "Jersey", "United Kingdom"],
+        )
+        self.assertEqual(
+            self.names(self.countries.by_calling_code("1")),
+            ["Canada", "United States"],
+        )
+        self.assertEqual(
+            self.names(self.countries.by_calling_code("1-684")), ["American Samoa"]
+        )
+
+    def test_shared_currencies(self):
+        euro = self.names(self.countries.by_currency("eur"))
+        self.assertEqual(len(euro), 28)
+        self.assertIn("Germany", euro)
+        self.assertEqual(euro, sorted(euro))
+
+    def test_tld_alt_spelling_and_native_name(self):
+        self.assertEqual(self.names(self.countries.by_tld("ng")), ["Nigeria"])
+        self.assertEqual(self.names(self.countries.by_tld(".NG")), ["Nigeria"])
+        self.assertEqual(
+            self.names(self.countries.by_alt_spelling("nijeriya")), ["Nigeria"]
+        )
+        self.assertEqual(
+            self.names(self.countries.by_native_name("Deutschland")), ["Germany"]
+        )
+
+    def test_lookups_return_the_info_records(self):
+        (record,) = self.countries.by_alpha2("NG")
+        self.assertEqual(record, Countries("nigeria").info())
+
+    def test_lookups_match_a_scan(self):
+        everything = self.countries.all().values()
+        for currency in ("USD", "XOF", "AUD"):
+            expected = sorted(
+                info["name"]
+                for info in everything
+                if currency in info.get("currencies", [])
+            )
+            self.assertEqual(self.names(self.countries.by_currency(currency)), expected)
+
+    def test_fallback_registry_has_the_same_lookups(self):
+        countries = registry.CountryRegistry.from_sources(registry.load_sources())
+        self.assertEqual(
+            countries.lookup("calling_code", "44"),
+            registry.get_registry().lookup("calling_code", "44"),
+        )
+
+
+class PhonePrefixResolverTest(SimpleTestCase):
+    def setUp(self):
+        self.resolver = get_phone_resolver()
+
+    def resolve(self, number):
+        match = self.resolver.resolve(number)
+        return match and (match.prefix, match.countries)
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self.resolve("+1 684 633 1234"), ("1684", ("american samoa",)))
+        self.assertEqual(
+            self.resolve("+1 212 555 0100"), ("1", ("canada", "united states"))
+        )
+        self.assertEqual(self.resolve("00441481 123456"), ("441481", ("guernsey",)))
+        self.assertEqual(
+            self.resolve("+44 20 7946 0958"),
+            ("44", ("guernsey", "isle of man", "jersey", "united kingdom")),
+        )
+
+    def test_formats(self):
+        for number in (
+            "+2348031234567",
+            "2348031234567",
+            "002348031234567",
+            "+234 (803) 123-4567",
+            2348031234567,
+        ):
+            self.assertEqual(self.resolve(number), ("234", ("nigeria",)), number)
+
+    def test_unresolvable_numbers(self):
+        for number in ("08031234567", "+999 1234", "", "+", "call me", "+２３４"):
+            self.assertIsNone(self.resolver.resolve(number), number)
+        self.assertIsNone(normalize_number("0803 123 4567"))
+
+    def test_country_codes_labels_map_to_registry_countries(self):
+        self.assertEqual(self.resolve("+1 869 465 1234")[1], ("saint kitts and nevis",))
+        # not among the named registry countries, kept as labelled
+        self.assertEqual(self.resolve("+381 11 123 4567")[1], ("serbia",))
+
+    def test_batch_matches_single_resolution(self):
+        numbers = [
+            "+2348031234567",
+            "0803",
+            "+1 684 633 1234",
+            "+12125550100",
+            "+2348039999999",
+            None,
+            4420794609,
+        ]
+        expected = [self.resolver.resolve(number) for number in numbers]
+        self.assertEqual(self.resolver.resolve_many(numbers), expected)
+        self.assertEqual(self.resolver.resolve_many(iter(numbers)), expected)
+
+    def test_custom_prefixes(self):
+        resolver = PhonePrefixResolver({"1": ("a",), "12": ("b",), "123": ("c",)})
+        self.assertEqual(resolver.resolve("+1299").countries, ("b",))
+        self.assertEqual(resolver.resolve("+1239").countries, ("c",))
+        self.assertIsNone(resolver.resolve("+29"))
+
+    def test_country_name(self):
+        self.assertEqual(country_name("234"), "Nigeria (234)")
+        self.assertEqual(country_name("1"), "United States (1)")
+        self.assertIsNone(country_name("+234"))
+
+
+class SpatialIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = get_spatial_index()
+
+    def test_locate(self):
+        self.assertEqual(self.index.locate(6.45, 3.39), ("nigeria",))
+        self.assertEqual(self.index.locate("5.6", "-0.19"), ("ghana",))
+        self.assertEqual(self.index.locate(55.75, 37.6), ("russia",))
+        # east of the antimeridian, and the same point wrapped around
+        self.assertEqual(self.index.locate(-17.8, 178.0), ("fiji",))
+        self.assertEqual(self.index.locate(-17.8, -182.0), ("fiji",))
+        self.assertEqual(self.index.locate(0, -30), ())
+        self.assertEqual(self.index.locate(91, 0), ())
+
+    def test_non_finite_coordinates(self):
+        nan, inf = float("nan"), float("inf")
+        for lat, lng in ((10, nan), (nan, 10), (nan, nan), (10, inf), (-inf, 10)):
+            self.assertEqual(self.index.locate(lat, lng), ())
+        self.assertEqual(
+            self.index.locate_many([(6.45, 3.39), (6.45, nan), (nan, 3.39)]),
+            [("nigeria",), (), ()],
+        )
+
+    def test_holes(self):
+        # Lesotho is a hole in South Africa's polygon
+        self.assertEqual(self.index.locate(-29.31, 27.48), ("lesotho",))
+        self.assertEqual(self.index.locate(-33.9, 18.4), ("south africa",))
+
+    def test_matches_testing_every_polygon(self):
+        countries = registry.get_registry()
+        polygons = [
+            (name, [edge for ring in rings for edge in self.edges(ring)])
+            for name in countries
+            for rings in spatial.country_polygons(countries[name])
+        ]
+        rng = random.Random(0)
+        points = [(rng.uniform(-60, 85), rng.uniform(-180, 180)) for _ in range(500)]
+        # and the grid lines themselves
+        points += [
+            (float(lat), float(lng))
+            for lat in range(-50, 80, 7)
+            for lng in range(-180, 180, 9)
+        ]
+        for lat, lng in points:
+            expected = tuple(
+                sorted(
+                    {name for name, edges in polygons if crosses_odd(edges, lng, lat)}
+                )
+            )
+            self.assertEqual(self.index.locate(lat, lng), expected, (lat, lng))
+
+    @staticmethod
+    def edges(ring):
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+            if y1 != y2:
+                yield y1, y2, x1, (x2 - x1) / (y2 - y1)
+
+    def test_batch_matches_single_lookups(self):
+        lats = [6.45, 0, -29.31, 48.85, 95]
+        lngs = [3.39, -30, 27.48, 2.35, 0]
+        expected = [self.index.locate(lat, lng) for lat, lng in zip(lats, lngs)]
+        self.assertEqual(self.index.locate_many(zip(lats, lngs)), expected)
+
+    def test_countries_by_location(self):
+        (record,) = Countries().by_location(6.45, 3.39)
+        self.assertEqual(record, Countries("nigeria").info())
+        self.assertEqual(Countries().by_location(0, -30), [])
+
+
+class SpatialIndexCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = os.path.join(directory.name, "data")
+        os.mkdir(self.data_dir)
+        for name in ("nigeria", "ghana"):
+            shutil.copy(os.path.join(registry.DATA_DIR, f"{name}.json"), self.data_dir)
+        self.path = os.path.join(directory.name, "spatial.bin")
+
+    def build(self):
+        return build_spatial_index(self.data_dir, self.path)
+
+    def test_index_is_cached(self):
+        self.assertEqual(self.build().locate(6.45, 3.39), ("nigeria",))
+        self.assertTrue(os.path.isfile(self.path))
+        with mock.patch.object(SpatialIndex, "from_countries") as from_countries:
+            index = self.build()
+        from_countries.assert_not_called()
+        self.assertEqual(index.locate(5.6, -0.19), ("ghana",))
+        self.assertEqual(index.locate(48.85, 2.35), ())
+
+    def test_changed_sources_rebuild_the_index(self):
+        self.build()
+        os.remove(os.path.join(self.data_dir, "ghana.json"))
+        self.assertEqual(self.build().locate(5.6, -0.19), ())
+
+    def test_corrupt_cache_is_rebuilt(self):
+        with open(self.path, "wb") as cached:
+            cached.write(b"\xff\x00")
+        self.assertEqual(self.build().locate(6.45, 3.39), ("nigeria",))
+
+    def test_served_from_memory_when_cache_cannot_be_written(self):
+        with mock.patch.object(spatial, "write_atomically", side_effect=OSError):
+            index = self.build()
+        self.assertEqual(index.locate(6.45, 3.39), ("nigeria",))
+        self.assertFalse(os.path.exists(self.path))
+
+
+class CentroidIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = get_centroid_index()
+
+    def scan(self, lat, lng):
+        return sorted(
+            (haversine(lat, lng, *centroid), name)
+            for name, centroid in self.index.centroids.items()
+        )
+
+    def test_nearest(self):
+        self.assertEqual(
+            [match.country for match in self.index.nearest(6.45, 3.39, 3)],
+            ["togo", "benin", "ghana"],
+        )
+        self.assertEqual(self.index.nearest(6.45, 3.39, 0), [])
+        self.assertEqual(len(self.index.nearest(0, 0, 1000)), len(self.index.centroids))
+
+    def test_within(self):
+        self.assertEqual(
+            [match.country for match in self.index.within(6.45, 3.39, 600)],
+            ["togo", "benin"],
+        )
+        self.assertEqual(self.index.within(6.45, 3.39, 10), [])
+        # half the circumference reaches every centroid
+        self.assertEqual(len(self.index.within(0, 0, 20040)), len(self.index.centroids))
+
+    def test_matches_a_haversine_scan(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            lat, lng = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            expected = self.scan(lat, lng)
+            nearest = self.index.nearest(lat, lng, 5)
+            self.assertEqual(
+                [match.country for match in nearest],
+                [name for _, name in expected[:5]],
+            )
+            for match, (distance, _) in zip(nearest, expected):
+                self.assertAlmostEqual(match.distance_km, distance, places=6)
+            self.assertEqual(
+                [match.country for match in self.index.within(lat, lng, 1500)],
+                [name for distance, name in expected if distance <= 1500],
+            )
+
+    def test_equidistant_countries_are_ordered_by_name(self):
+        index = CentroidIndex({"b": (0, 10), "a": (0, -10), "c": (10, 0)})
+        self.assertEqual(
+            [match.country for match in index.nearest(0, 0, 2)], ["a", "b"]
+        )
+        self.assertEqual(
+            [match.country for match in index.within(0, 0, 1200)], ["a", "b", "c"]
+        )
+
+    def test_batches_match_single_queries(self):
+        points = [(6.45, 3.39), (-33.9, 18.4), (64.8, 177.5)]
+        self.assertEqual(
+            self.index.nearest_many(iter(points), 4),
+            [self.index.nearest(lat, lng, 4) for lat, lng in points],
+        )
+        self.assertEqual(
+            self.index.within_many(points, 800),
+            [self.index.within(lat, lng, 800) for lat, lng in points],
+        )
+
+    def test_countries_accessors(self):
+        ((record, distance),) = Countries().nearest(10, 8.5)
+        self.assertEqual(record, Countries("nigeria").info())
+        self.assertLess(distance, 60)
+        self.assertEqual(
+            [record["name"] for record, _ in Countries().within(10, 8.5, 500)],
+            ["Nigeria"],
+        )
+
+
+class CountryTableTest(SimpleTestCase):
+    def setUp(self):
+        self.table = get_country_table()
+        self.countries = registry.get_registry().as_dict()
+
+    def scan(self, predicate):
+        return [key for key, info in self.countries.items() if predicate(info)]
+
+    def test_filters_match_a_scan_of_the_dicts(self):
+        cases = [
+            ({"region": "Africa"}, lambda info: info.get("region") == "Africa"),
+            (
+                {"region": "Africa", "population__gt": 50000000},
+                lambda info: info.get("region") == "Africa"
+                and info["population"] > 50000000,
+            ),
+            (
+                {"area__lte": 1000, "region__in": ["Europe", "Oceania"]},
+                lambda info: info.get("area") is not None
+                and info["area"] <= 1000
+                and info.get("region") in ("Europe", "Oceania"),
+            ),
+            ({"alpha2": "NG"}, lambda info: info["ISO"]["alpha2"] == "NG"),
+            ({"subregion__gte": "W"}, lambda info: info.get("subregion", "") >= "W"),
+            ({"area__isnull": True}, lambda info: info.get("area") is None),
+            ({"population": None}, lambda info: info.get("population") is None),
+            ({"region": "Atlantis"}, lambda info: False),
+        ]
+        for lookups, predicate in cases:
+            self.assertEqual(
+                self.table.filter(**lookups).keys(), self.scan(predicate), lookups
+            )
+            # the same lookups scanned over a narrowed selection
+            narrowed = self.table.filter(name__isnull=False)[::-1]
+            self.assertEqual(
+                narrowed.filter(**lookups).keys(),
+                self.scan(predicate)[::-1],
+                lookups,
+            )
+
+    def test_order_by(self):
+        query = self.table.filter(region="Africa").order_by("-area")
+        expected = sorted(
+            self.scan(lambda info: info.get("region") == "Africa"),
+            key=lambda key: self.countries[key]["area"] or 0,
+            reverse=True,
+        )
+        self.assertEqual(query.keys(), expected)
+        # missing values last, ties kept in the previous order
+        regions = self.table.order_by("region", "-population").values(
+            "region", "population"
+        )
+        self.assertEqual(
+            list(regions),
+            sorted(
+                regions,
+                key=lambda record: (
+                    record.region is None,
+                    record.region or "",
+                    -(record.population or 0),
+                ),
+            ),
+        )
+        self.assertEqual(self.table.order_by("area").column("area")[-1], None)
+
+    def test_records(self):
+        (nigeria,) = self.table.filter(alpha3="NGA").values(
+            "name", "population", "area", "lat", "lng"
+        )
+        info = self.countries["nigeria"]
+        self.assertEqual(
+            nigeria,
+            (info["name"], info["population"], info["area"], *info["latlng"]),
+        )
+        self.assertIsInstance(nigeria.population, int)
+        self.assertEqual(nigeria._fields, ("name", "population", "area", "lat", "lng"))
+        record = self.table.filter(name="Wales")[0]
+        self.assertEqual((record.key, record.lat, record.area), ("wales", None, None))
+
+    def test_slicing_and_counting(self):
+        query = self.table.filter(region="Asia").order_by("-population")
+        self.assertEqual(
+            query.count(), len(self.scan(lambda i: i.get("region") == "Asia"))
+        )
+        self.assertEqual(query[:2].column("name"), ["China", "India"])
+        self.assertEqual(query[0].name, "China")
+
+    def test_invalid_queries(self):
+        with self.assertRaises(ValueError):
+            self.table.filter(capital="Abuja")
+        with self.assertRaises(ValueError):
+            self.table.filter(name__contains="Nig")
+        with self.assertRaises(ValueError):
+            self.table.order_by("-capital")
+
+    def test_custom_table(self):
+        table = CountryTable.from_countries(
+            {
+                "a": {"name": "A", "population": 3, "area": 1.5},
+                "b": {"name": "B", "population": 1},
+            }
+        )
+        self.assertEqual(table.order_by("population").keys(), ["b", "a"])
+        self.assertEqual(table.filter(area__gt=1).keys(), ["a"])
+        self.assertEqual(table.filter(region__isnull=True).count(), 2)
+
+
+class CountryNameSearchTest(SimpleTestCase):
+    def setUp(self):
+        self.index = get_name_index()
+
+    def best(self, query):
+        matches = self.index.search(query, limit=1)
+        return matches[0].country if matches else None
+
+    def test_exact_names_in_any_language(self):
+        for query in ("Germany", "germany", "Deutschland", "Allemagne", "ドイツ", "DE"):
+            self.assertEqual(self.index.search(query)[0][:2], ("germany", 1.0), query)
+
+    def test_typos_and_accents(self):
+        self.assertEqual(self.best("Germny"), "germany")
+        self.assertEqual(self.best("cote divoire"), "ivory coast")
+        self.assertEqual(self.best("Untied Kingdom"), "united kingdom")
+        self.assertEqual(self.best("Nigerai"), "niger")
+        self.assertIn(
+            "nigeria", [match.country for match in self.index.search("Nigerai")]
+        )
+
+    def test_ranking(self):
+        matches = self.index.search("south korea", limit=3)
+        self.assertEqual(matches[0].country, "south korea")
+        self.assertEqual(
+            [match.score for match in matches],
+            sorted((match.score for match in matches), reverse=True),
+        )
+        # countries rank by their best name, each listed once
+        countries = [match.country for match in self.index.search("korea", limit=10)]
+        self.assertEqual(len(countries), len(set(countries)))
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("qqqq xzxz"), [])
+        self.assertEqual(self.index.search("  --  "), [])
+        self.assertEqual(self.index.search("Germany", limit=0), [])
+
+    def test_batch(self):
+        queries = ["Germny", "germny", "GERMNY", "zzz", "Nijeriya"]
+        expected = [self.index.search(query, limit=1) for query in queries]
+        with mock.patch.object(
+            self.index, "_search", wraps=self.index._search
+        ) as search:
+            results = self.index.search_many(iter(queries))
+        # memoized on the folded query: germny, zzz and nijeriya
+        self.assertEqual(search.call_count, 3)
+        self.assertEqual(results, expected)
+        # no list is shared between the queries
+        self.assertIsNot(results[0], results[2])
+        results[0].clear()
+        self.assertEqual(results[2], expected[2])
+
+    def test_fold(self):
+        self.assertEqual(fold("  Côte d'Ivoire "), "cote d ivoire")
+        self.assertEqual(fold("São_Tomé"), "sao tome")
+
+    def test_custom_index_and_countries_search(self):
+        index = CountryNameIndex({"Atlantis": {"atlantis"}, "Atlantida": {"atlantis"}})
+        self.assertEqual(index.search("atlantos")[0].country, "atlantis")
+        ((record, score),) = Countries().search("Nigeria", limit=1)
+        self.assertEqual(record, Countries("nigeria").info())
+        self.assertEqual(score, 1.0)
+
+
+class CountryEndpointsTest(SimpleTestCase):
+    def get(self, path, **headers):
+        response = self.client.get(f"/api/v1/countries/{path}", **headers)
+        return response, json.loads(response.content or "null")
+
+    def test_detail_by_name_or_code(self):
+        response, body = self.get("nigeria/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body["data"]["name"], "Nigeria")
+        self.assertNotIn("geoJSON", body["data"])
+        self.assertIn("public, max-age=", response["Cache-Control"])
+        for code in ("NG", "nga", "Nigeria"):
+            self.assertEqual(self.get(f"{code}/")[0]["ETag"], response["ETag"])
+        response, body = self.get("atlantis/")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(body["status"], 404)
+
+    def test_list_projection(self):
+        response, body = self.get("")
+        self.assertEqual(body["count"], len(registry.get_registry()))
+        self.assertTrue(all("geoJSON" not in record for record in body["data"]))
+        response, body = self.get("?fields=capital,name")
+        self.assertEqual(body["data"][0], {"name": "Afghanistan", "capital": "Kabul"})
+        # the same projection, whatever the order of the fields
+        self.assertEqual(self.get("?fields=name,,capital")[0]["ETag"], response["ETag"])
+        _, body = self.get("nigeria/?fields=geo_json")
+        self.assertEqual(list(body["data"]), ["geoJSON"])
+        response, body = self.get("?fields=name,bogus")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("bogus", body["message"])
+
+    def test_phone(self):
+        _, body = self.get("phone/+234 801 234 5678/")
+        self.assertEqual(body["data"]["prefix"], "234")
+        self.assertEqual([c["name"] for c in body["data"]["countries"]], ["Nigeria"])
+        # calling codes of countries missing from the dataset name them only
+        _, body = self.get("phone/381/")
+        self.assertEqual(body["data"]["countries"], [{"name": "Serbia"}])
+        self.assertEqual(self.get("phone/999999/")[0].status_code, 404)
+
+    def test_not_modified_without_encoding(self):
+        response, _ = self.get("nigeria/?fields=name")
+        with mock.patch.object(views, "encode") as encode, mock.patch.object(
+            views, "EncodedResponse"
+        ) as encoded:
+            for path in ("nigeria/", "nigeria/?fields=name", "phone/234/", ""):
+                etag = self.get(path)[0]["ETag"]
+                cached, _ = self.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached.content, b"")
+                self.assertEqual(cached["ETag"], etag)
+                self.assertIn("max-age", cached["Cache-Control"])
+        encode.assert_not_called()
+        encoded.assert_not_called()
+        self.assertEqual(
+            self.get("nigeria/?fields=name", HTTP_IF_NONE_MATCH='"stale"')[
+                0
+            ].status_code,
+            200,
+        )
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post("/api/v1/countries/").status_code, 405)
+        self.assertEqual(self.client.head("/api/v1/countries/ng/").status_code, 200)
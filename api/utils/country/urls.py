@@ -0,0 +1,17 @@
+from django.urls import path
+
+from .views import (
+    country_detail,
+    country_list,
+    country_phone,
+    get_country_responses,
+)
+
+# encoded when the URLconf is loaded, not by the first request
+get_country_responses()
+
+urlpatterns = [
+    path(r"", country_list, name="countries-list"),
+    path(r"phone/<str:number>/", country_phone, name="countries-phone"),
+    path(r"<str:code>/", country_detail, name="countries-detail"),
+]
@@ -0,0 +1,215 @@
+# coding=utf-8
+"""Read-only country endpoints under /api/v1/countries/.
+
+The dataset only changes with a deploy, so responses are JSON encoded
+once and served as bytes: the default projection of the list, of every
+country and of every calling code prefix when the URLconf is loaded, any
+other ``fields`` projection on first request (least recently used ones
+are dropped). Each body carries a strong ETag, the hash of its bytes, and
+a long max-age; a matching If-None-Match is answered 304 without touching
+the encoder.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+from rest_framework import status
+
+from .countries import country_codes
+from .phone import get_phone_resolver
+from .records import FIELDS
+from .registry import get_registry, normalize_key
+
+CONTENT_TYPE = "application/json"
+FIELDS_PARAM = "fields"
+# snake_case names of the Countries accessors, accepted in ``fields``
+FIELD_ALIASES = {
+    "alt_spellings": "altSpellings",
+    "calling_codes": "callingCodes",
+    "geo_json": "geoJSON",
+    "iso": "ISO",
+    "native_name": "nativeName",
+}
+# geoJSON is most of the dataset: sent only when asked for
+DEFAULT_FIELDS = tuple(field for field in FIELDS if field != "geoJSON")
+# encoded projections kept besides the default ones
+MAX_PROJECTIONS = 512
+
+
+def encode(value):
+    # the output of JSONRenderer: compact and UTF-8
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class EncodedResponse:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, text):
+        self.body = text.encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+
+
+class CountryResponses:
+    """Encoded response bodies of the country endpoints"""
+
+    def __init__(self, countries=None, resolver=None):
+        self.countries = countries or get_registry()
+        self.resolver = resolver or get_phone_resolver()
+        # calling code labels of the countries missing from the dataset
+        self.labels = {}
+        for _, label in country_codes:
+            name = re.sub(r"\(.*\)", "", label).strip()
+            self.labels.setdefault(normalize_key(name), name)
+        # (country, field) -> '"field":value'
+        self._fragments = {}
+        self._fragments_lock = threading.Lock()
+        self._projections = lru_cache(maxsize=MAX_PROJECTIONS)(self._encode)
+        self._defaults = {("list", None): self._encode("list", None, DEFAULT_FIELDS)}
+        for name in self.countries:
+            self._defaults["detail", name] = self._encode(
+                "detail", name, DEFAULT_FIELDS
+            )
+        for prefix in self.resolver.prefixes:
+            self._defaults["phone", prefix] = self._encode(
+                "phone", prefix, DEFAULT_FIELDS
+            )
+
+    def get(self, kind, key, fields=DEFAULT_FIELDS):
+        """The EncodedResponse of the list (key None), of a country (its
+        registry key) or of a calling code prefix"""
+        if fields == DEFAULT_FIELDS:
+            return self._defaults[kind, key]
+        return self._projections(kind, key, fields)
+
+    def fragment(self, name, field):
+        key = (name, field)
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            fragment = f"{encode(field)}:{encode(self.countries[name][field])}"
+            with self._fragments_lock:
+                self._fragments[key] = fragment
+        return fragment
+
+    def record(self, name, fields):
+        if name not in self.countries:
+            # named by a calling code label only
+            return encode({"name": self.labels.get(name, name)})
+        record = self.countries[name]
+        fragments = [self.fragment(name, field) for field in fields if field in record]
+        return "{" + ",".join(fragments) + "}"
+
+    def _encode(self, kind, key, fields):
+        if kind == "list":
+            records = [self.record(name, fields) for name in self.countries]
+            return EncodedResponse(
+                f'{{"status":200,"count":{len(records)},"data":[{",".join(records)}]}}'
+            )
+        if kind == "detail":
+            return EncodedResponse(
+                f'{{"status":200,"data":{self.record(key, fields)}}}'
+            )
+        match = self.resolver.prefixes[key]
+        records = ",".join(self.record(name, fields) for name in match.countries)
+        return EncodedResponse(
+            f'{{"status":200,"data":{{"prefix":{encode(key)},"countries":[{records}]}}}}'
+        )
+
+
+_responses = None
+_responses_lock = threading.Lock()
+
+
+def get_country_responses():
+    """The process-wide responses, encoded on first use"""
+    global _responses
+    if _responses is None:
+        with _responses_lock:
+            if _responses is None:
+                _responses = CountryResponses()
+    return _responses
+
+
+def parse_fields(request):
+    """The ``fields`` of a request in schema order, DEFAULT_FIELDS when it
+    has none; raises ValueError on an unknown field"""
+    value = request.GET.get(FIELDS_PARAM)
+    if not value:
+        return DEFAULT_FIELDS
+    requested = set()
+    for field in filter(None, (field.strip() for field in value.split(","))):
+        field = FIELD_ALIASES.get(field, field)
+        if field not in FIELDS:
+            raise ValueError(f"unknown field {field!r}")
+        requested.add(field)
+    return tuple(field for field in FIELDS if field in requested)
+
+
+def error_response(status_code, message):
+    return HttpResponse(
+        encode({"status": status_code, "message": message}),
+        status=status_code,
+        content_type=CONTENT_TYPE,
+    )
+
+
+def encoded_response(request, kind, key):
+    try:
+        fields = parse_fields(request)
+    except ValueError as ex:
+        return error_response(status.HTTP_400_BAD_REQUEST, str(ex))
+    encoded = get_country_responses().get(kind, key, fields)
+    response = HttpResponse(encoded.body, content_type=CONTENT_TYPE)
+    response["ETag"] = encoded.etag
+    response["Cache-Control"] = (
+        f"public, max-age={getattr(settings, 'COUNTRIES_CACHE_MAX_AGE', 86400)}"
+    )
+    # a 304 carrying the ETag and Cache-Control when If-None-Match matches
+    return get_conditional_response(request, etag=encoded.etag, response=response)
+
+
+def find_country(code):
+    """Registry key of a country name, ISO alpha-2 or alpha-3 code"""
+    countries = get_registry()
+    name = normalize_key(code)
+    if name in countries:
+        return name
+    for field in ("alpha3", "alpha2"):
+        # codes shared by several countries (GB) resolve to the first by name
+        names = countries.lookup(field, name)
+        if names:
+            return names[0]
+    return None
+
+
+@require_safe
+def country_list(request):
+    """Every country; ``?fields=name,capital`` projects, geoJSON only when
+    listed"""
+    return encoded_response(request, "list", None)
+
+
+@require_safe
+def country_detail(request, code):
+    """One country by name, ISO alpha-2 or alpha-3 code"""
+    name = find_country(code)
+    if name is None:
+        return error_response(status.HTTP_404_NOT_FOUND, f"unknown country {code!r}")
+    return encoded_response(request, "detail", name)
+
+
+@require_safe
+def country_phone(request, number):
+    """The countries of a calling code or phone number, by longest prefix"""
+    match = get_phone_resolver().resolve(number)
+    if match is None:
+        return error_response(
+            status.HTTP_404_NOT_FOUND, f"no country calling code matches {number!r}"
+        )
+    return encoded_response(request, "phone", match.prefix)
@@ -0,0 +1,234 @@
+import copy
+import json
+import math
+import uuid
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import track_serialization
+from .timing import span
+
+# DRF field -> how its to_representation() output is written as JSON text
+FIELD_KINDS = {
+    serializers.IntegerField: "int",
+    serializers.CharField: "str",
+    serializers.FloatField: "float",
+    serializers.DateTimeField: "datetime",
+}
+
+
+class EncodedJSON:
+    """A list of rows already encoded as JSON text.
+
+    FastJSONRenderer splices the text into the response body verbatim.
+    """
+
+    __slots__ = ("text", "count")
+
+    def __init__(self, text, count):
+        self.text = text
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def to_python(self):
+        return json.loads(self.text)
+
+
+class RowEncoder:
+    """Precompiled JSON encoder for the rows of a flat ModelSerializer.
+
+    Reads ``values_list()`` tuples and writes each row with a fixed key
+    template and one value encoder per column, producing exactly the bytes
+    JSONRenderer would render for ``serializer_class(rows, many=True).data``
+    without building model instances or per-row dicts.
+    """
+
+    _compiled = {}
+
+    def __init__(self, serializer_class, ensure_ascii, compact, strict):
+        serializer = serializer_class()
+        encode_string = encode_basestring_ascii if ensure_ascii else encode_basestring
+        item_separator, key_separator = (",", ":") if compact else (", ", ": ")
+        self.columns = []
+        self.encoders = []
+        # DateTimeFields resolve the active timezone, bound once per page
+        self.datetime_fields = {}
+        prefixes = []
+        for index, (name, field) in enumerate(serializer.fields.items()):
+            self.columns.append(field.source)
+            self.encoders.append(self._value_encoder(field, encode_string, strict))
+            if FIELD_KINDS[type(field)] == "datetime":
+                self.datetime_fields[index] = field
+            prefix = "{" if index == 0 else item_separator
+            prefixes.append(f"{prefix}{encode_string(name)}{key_separator}")
+        self.prefixes = prefixes
+        self.item_separator = item_separator
+        self.encode_string = encode_string
+
+    @classmethod
+    def for_serializer(cls, serializer_class, renderer_class=None):
+        """Returns the cached encoder for a serializer, or None when the
+        serializer has fields the fast path cannot reproduce exactly"""
+        renderer_class = renderer_class or JSONRenderer
+        key = (
+            serializer_class,
+            renderer_class.ensure_ascii,
+            renderer_class.compact,
+            renderer_class.strict,
+        )
+        if key not in cls._compiled:
+            encoder = None
+            if cls.is_supported(serializer_class):
+                encoder = cls(serializer_class, *key[1:])
+            cls._compiled[key] = encoder
+        return cls._compiled[key]
+
+    @staticmethod
+    def is_supported(serializer_class):
+        if not issubclass(serializer_class, serializers.ModelSerializer):
+            return False
+        if (
+            serializer_class.to_representation
+            is not serializers.Serializer.to_representation
+        ):
+            return False
+        serializer = serializer_class()
+        columns = {
+            field.attname for field in serializer.Meta.model._meta.concrete_fields
+        }
+        # exact classes only, a subclass may override to_representation
+        return all(
+            type(field) in FIELD_KINDS and field.source in columns
+            for field in serializer.fields.values()
+        )
+
+    @staticmethod
+    def _value_encoder(field, encode_string, strict):
+        kind = FIELD_KINDS[type(field)]
+        if kind == "int":
+            return lambda value: int.__repr__(int(value))
+        if kind == "str":
+            return lambda value: encode_string(str(value))
+        if kind == "float":
+
+            def encode_float(value):
+                value = float(value)
+                if math.isfinite(value):
+                    return float.__repr__(value)
+                if strict:
+                    raise ValueError("Out of range float values are not JSON compliant")
+                return (
+                    "NaN"
+                    if value != value
+                    else ("Infinity" if value > 0 else "-Infinity")
+                )
+
+            return encode_float
+
+        return RowEncoder._datetime_encoder(field, encode_string)
+
+    @staticmethod
+    def _datetime_encoder(field, encode_string):
+        represent = field.to_representation
+
+        def encode_datetime(value):
+            value = represent(value)
+            return "null" if value is None else encode_string(value)
+
+        return encode_datetime
+
+    def bind_encoders(self):
+        """Returns the value encoders with the current timezone resolved.
+
+        DateTimeField looks the active timezone up on every value; a copy
+        of the field pinned to it gives the same output for the whole page.
+        """
+        encoders = list(self.encoders)
+        for index, field in self.datetime_fields.items():
+            if not hasattr(field, "timezone"):
+                field = copy.copy(field)
+                field.timezone = field.default_timezone()
+            encoders[index] = self._datetime_encoder(field, self.encode_string)
+        return encoders
+
+    def encode_row(self, row, encoders=None):
+        parts = []
+        for prefix, encode, value in zip(self.prefixes, encoders or self.encoders, row):
+            parts.append(prefix)
+            parts.append("null" if value is None else encode(value))
+        parts.append("}")
+        return "".join(parts)
+
+    def encode_rows(self, rows):
+        encode_row, encoders = self.encode_row, self.bind_encoders()
+        encoded = [encode_row(row, encoders) for row in rows]
+        return EncodedJSON(f"[{self.item_separator.join(encoded)}]", len(encoded))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that splices EncodedJSON fragments into its output.
+
+    The envelope is rendered by JSONRenderer with a placeholder per
+    fragment, so the body is byte-identical to rendering the decoded rows.
+    """
+
+    # {"data": {"results": <fragment>}} sits two levels below the envelope
+    max_fragment_depth = 2
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, "FAST_JSON_ENABLED", True)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track_serialization(), span("render"):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        fragments = {}
+        data = self._extract_fragments(data, fragments, uuid.uuid4().hex)
+        if not fragments:
+            return super().render(data, accepted_media_type, renderer_context)
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None:
+            data = self._extract_fragments(data, {}, None, decode=fragments)
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = super().render(data, accepted_media_type, renderer_context)
+        for token, fragment in fragments.items():
+            # same \u2028/\u2029 escaping JSONRenderer applies to the envelope
+            text = fragment.text.replace("\u2028", "\\u2028")
+            text = text.replace("\u2029", "\\u2029")
+            ret = ret.replace(f'"{token}"'.encode(), text.encode(), 1)
+        return ret
+
+    def _extract_fragments(self, data, fragments, prefix, decode=None, depth=0):
+        """Replaces EncodedJSON values with placeholder strings, or with the
+        decoded rows when ``decode`` maps placeholders back to fragments.
+
+        Only the response envelope is walked, never the rows themselves.
+        """
+        if depth > self.max_fragment_depth:
+            return data
+        if isinstance(data, EncodedJSON):
+            token = f"@@fastjson-{prefix}-{len(fragments)}@@"
+            fragments[token] = data
+            return token
+        if decode is not None and isinstance(data, str) and data in decode:
+            return decode[data].to_python()
+        if isinstance(data, dict):
+            return {
+                key: self._extract_fragments(
+                    value, fragments, prefix, decode, depth + 1
+                )
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [
+                self._extract_fragments(value, fragments, prefix, decode, depth + 1)
+                for value in data
+            ]
+        return data
@@ -0,0 +1,297 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from .cache import response_cache
+from .sql import add_execute_wrapper
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LABELS = ("view", "action", "method", "status")
+# dead threads' shards are folded into the totals past this many shards
+MAX_SHARDS = 64
+
+# the in-flight request's RequestState, visible to DB and serializer hooks
+_current = ContextVar("metrics_request", default=None)
+
+
+class Histogram:
+    """Layout of one histogram inside a series: a count per bucket, one for
+    +Inf, then the sum of the observed values"""
+
+    def __init__(self, name, documentation, buckets, offset):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.offset = offset
+        self.width = len(self.buckets) + 2
+
+    def observe(self, values, value):
+        values[self.offset + bisect_left(self.buckets, value)] += 1
+        values[self.offset + self.width - 1] += value
+
+    def expose(self, lines, labels, values):
+        cumulative = 0
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for index, bound in enumerate(bounds):
+            cumulative += values[self.offset + index]
+            lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        total = values[self.offset + self.width - 1]
+        lines.append(f"{self.name}_sum{{{labels}}} {total}")
+        lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+
+
+def _histograms(*definitions):
+    histograms, offset = [], 0
+    for name, documentation, buckets in definitions:
+        histograms.append(Histogram(name, documentation, buckets, offset))
+        offset += histograms[-1].width
+    return histograms, offset
+
+
+class RequestState:
+    __slots__ = ("queries", "db_time", "serializer_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+class MetricsRegistry:
+    """Request metrics sharded per thread.
+
+    Every thread writes to its own shard without taking a lock, the GIL
+    makes each increment atomic for the owning thread. A series is one
+    flat list per label set holding every histogram, so recording a
+    request allocates nothing once its label set has been seen. Scrapes
+    merge the shards; shards of finished threads are folded into
+    ``retired`` so servers spawning a thread per request stay bounded.
+    """
+
+    def __init__(self):
+        self.histograms, self.width = _histograms(
+            (
+                "http_request_duration_seconds",
+                "Request latency, rendering included",
+                LATENCY_BUCKETS,
+            ),
+            ("http_request_db_queries", "SQL queries per request", QUERY_COUNT_BUCKETS),
+            (
+                "http_request_db_duration_seconds",
+                "Time spent in SQL queries per request",
+                LATENCY_BUCKETS,
+            ),
+            (
+                "http_request_serializer_duration_seconds",
+                "Time spent serializing and rendering the response body",
+                LATENCY_BUCKETS,
+            ),
+            ("http_response_size_bytes", "Response body size", SIZE_BUCKETS),
+        )
+        (
+            self.latency,
+            self.db_queries,
+            self.db_time,
+            self.serializer,
+            self.size,
+        ) = self.histograms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self.retired = {}
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+                if len(self._shards) > MAX_SHARDS:
+                    self._retire_dead_shards()
+            return shard
+
+    def _retire_dead_shards(self):
+        alive = []
+        for thread, shard in self._shards:
+            if thread() is None or not thread().is_alive():
+                self._merge(self.retired, shard)
+            else:
+                alive.append((thread, shard))
+        self._shards = alive
+
+    def _merge(self, target, shard):
+        for key, values in list(shard.items()):
+            merged = target.get(key)
+            if merged is None:
+                merged = target[key] = [0] * self.width
+            for index, value in enumerate(values):
+                merged[index] += value
+
+    def record(self, key, duration, state, size):
+        shard = self.shard()
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * self.width
+        self.latency.observe(values, duration)
+        self.db_queries.observe(values, state.queries)
+        self.db_time.observe(values, state.db_time)
+        self.serializer.observe(values, state.serializer_time)
+        if size is not None:
+            self.size.observe(values, size)
+
+    def collect(self):
+        """Returns every series summed over the shards"""
+        with self._lock:
+            self._retire_dead_shards()
+            totals = {}
+            self._merge(totals, self.retired)
+            for _, shard in self._shards:
+                self._merge(totals, shard)
+        return totals
+
+    def expose(self):
+        """Prometheus text exposition of the registry"""
+        series = sorted(self.collect().items())
+        lines = []
+        for histogram in self.histograms:
+            lines.append(f"# HELP {histogram.name} {histogram.documentation}")
+            lines.append(f"# TYPE {histogram.name} histogram")
+            for key, values in series:
+                if (
+                    histogram is self.size
+                    and not values[histogram.offset + histogram.width - 1]
+                ):
+                    continue
+                histogram.expose(lines, format_labels(key), values)
+        stats = response_cache.stats()
+        for name in ("hits", "misses"):
+            lines.append(f"# HELP response_cache_{name}_total Response cache {name}")
+            lines.append(f"# TYPE response_cache_{name}_total counter")
+            lines.append(f"response_cache_{name}_total {stats[name]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self.retired = {}
+
+
+def format_labels(key):
+    return ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(LABELS, key)
+    )
+
+
+registry = MetricsRegistry()
+
+
+def db_wrapper(execute, sql, params, many, context):
+    state = _current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.db_time += time.perf_counter() - started
+
+
+add_execute_wrapper(db_wrapper)
+
+
+@contextmanager
+def track_serialization():
+    """Adds the block's duration to the current request's serializer time"""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.serializer_time += time.perf_counter() - started
+
+
+def resolve_labels(request, response):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return ("<unmatched>", "", request.method, response.status_code)
+    # DRF viewsets map HTTP methods to actions, other views use the method
+    actions = getattr(match.func, "actions", None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return (
+        match.view_name or match.route,
+        action,
+        request.method,
+        response.status_code,
+    )
+
+
+class MetricsMiddleware:
+    """Records latency, SQL and serializer time and response size of every
+    request, labelled by view, action, method and status"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "METRICS_ENABLED", True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        state = RequestState()
+        token = _current.set(state)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, time.perf_counter() - started, state)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        state = RequestState()
+        token = _current.set(state)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, time.perf_counter() - started, state)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, state):
+        size = None if response.streaming else len(response.content)
+        registry.record(resolve_labels(request, response), duration, state, size)
+
+
+def metrics_view(request):
+    """Text-format metrics for Prometheus to scrape"""
+    return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
@@ -1,49 +1,461 @@
+import base64
+import binascii
+import json
+import math
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
 
+from .cache import count_cache
+from .fastjson import FastJSONRenderer, RowEncoder
+from .metrics import track_serialization
+from .timing import span, timed
+
 DEFAULT_PAGE = 1
 DEFAULT_PAGE_SIZE = 50
+DEFAULT_CURSOR_ORDERING = "-pk"
+# fields a cursor can be keyed on, always paired with pk as tie-breaker
+CURSOR_ORDERING_FIELDS = ("pk", "id", "created_at", "price")
+COUNT_EXACT = "exact"
+COUNT_ESTIMATE = "estimate"
+COUNT_NONE = "none"
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
 
 
 class CustomPaginator(PageNumberPagination):
     page = DEFAULT_PAGE
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = "limit"
+    cursor_query_param = "cursor"
 
     def generate_response(self, query_set, serializer_obj, request):
+        if self.is_cursor_request(request):
+            return self.generate_cursor_response(query_set, serializer_obj, request)
+        encoder = self.get_row_encoder(serializer_obj, request)
+        if request.GET.get("is_paging") == "false":
+            results = self.serialize_rows(
+                self.fetch_rows(query_set, encoder), serializer_obj, request, encoder
+            )
+            return self.build_unpaged_response(results, request)
+
+        count_mode = request.GET.get("count", COUNT_EXACT)
+        if count_mode not in COUNT_MODES:
+            return self.invalid_count_response()
+        if count_mode != COUNT_EXACT:
+            return self.generate_uncounted_response(
+                query_set, serializer_obj, request, count_mode, encoder
+            )
+        try:
+            page = self.paginate_counted_queryset(
+                query_set, request, count_cache.count(query_set, request)
+            )
+        except Exception as ex:
+            return self.page_not_found_response()
+        results = self.serialize_rows(
+            self.fetch_rows(page.object_list, encoder), serializer_obj, request, encoder
+        )
+        return self.build_counted_response(page, results, request)
+
+    async def agenerate_response(self, query_set, serializer_obj, request):
+        """generate_response for async views: the same pages, with every
+        query issued through the async ORM API"""
+        if self.is_cursor_request(request):
+            return await self.agenerate_cursor_response(
+                query_set, serializer_obj, request
+            )
+        encoder = self.get_row_encoder(serializer_obj, request)
         if request.GET.get("is_paging") == "false":
-            page_data = query_set
-            serialized_page = serializer_obj(
-                page_data, many=True, context={"request": request}
-            )
-            response = {
-                "status": status.HTTP_200_OK,
-                "message": "ok",
-                "total": query_set.count(),
-                "total_pages": 1,
-                "page": int(request.GET.get("page", DEFAULT_PAGE)),
-                "limit": query_set.count(),
-                "results": serialized_page.data,
-            }
-        else:
-            try:
-                page_data = self.paginate_queryset(query_set, request)
-            except Exception as ex:
-                response = {
-                    "status": status.HTTP_400_BAD_REQUEST,
-                    "message": "No results found for the requested page",
-                }
-                return response
-            serialized_page = serializer_obj(
-                page_data, many=True, context={"request": request}
-            )
-            response = {
-                "status": status.HTTP_200_OK,
-                "message": "ok",
-                "total": self.page.paginator.count,
-                "total_pages": self.page.paginator.num_pages,
-                "page": int(request.GET.get("page", DEFAULT_PAGE)),
-                "limit": int(request.GET.get("page_size", self.page_size)),
-                "results": serialized_page.data,
-            }
-        return response
+            results = self.serialize_rows(
+                await self.afetch_rows(query_set, encoder),
+                serializer_obj,
+                request,
+                encoder,
+            )
+            return self.build_unpaged_response(results, request)
+
+        count_mode = request.GET.get("count", COUNT_EXACT)
+        if count_mode not in COUNT_MODES:
+            return self.invalid_count_response()
+        if count_mode != COUNT_EXACT:
+            return await self.agenerate_uncounted_response(
+                query_set, serializer_obj, request, count_mode, encoder
+            )
+        try:
+            page = self.paginate_counted_queryset(
+                query_set, request, await count_cache.acount(query_set, request)
+            )
+        except Exception as ex:
+            return self.page_not_found_response()
+        results = self.serialize_rows(
+            await self.afetch_rows(page.object_list, encoder),
+            serializer_obj,
+            request,
+            encoder,
+        )
+        return self.build_counted_response(page, results, request)
+
+    @staticmethod
+    def build_unpaged_response(results, request):
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "ok",
+            "total": len(results),
+            "total_pages": 1,
+            "page": int(request.GET.get("page", DEFAULT_PAGE)),
+            "limit": len(results),
+            "results": results,
+        }
+
+    def build_counted_response(self, page, results, request):
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "ok",
+            "total": page.paginator.count,
+            "total_pages": page.paginator.num_pages,
+            "page": int(request.GET.get("page", DEFAULT_PAGE)),
+            "limit": int(request.GET.get("page_size", self.page_size)),
+            "results": results,
+        }
+
+    @staticmethod
+    def invalid_count_response():
+        return {
+            "status": status.HTTP_400_BAD_REQUEST,
+            "message": f"count must be one of {', '.join(COUNT_MODES)}",
+        }
+
+    @staticmethod
+    def page_not_found_response():
+        return {
+            "status": status.HTTP_400_BAD_REQUEST,
+            "message": "No results found for the requested page",
+        }
+
+    def get_row_encoder(self, serializer_obj, request):
+        """Returns the precompiled RowEncoder when the page is rendered by
+        FastJSONRenderer, otherwise None and the serializer is used"""
+        renderer = getattr(request, "accepted_renderer", None)
+        if not isinstance(renderer, FastJSONRenderer) or not renderer.is_enabled():
+            return None
+        return RowEncoder.for_serializer(serializer_obj, type(renderer))
+
+    @staticmethod
+    @timed("fetch")
+    def fetch_rows(query_set, encoder=None):
+        """Model instances, or value tuples when a RowEncoder will encode them"""
+        if encoder is None:
+            return list(query_set)
+        return list(query_set.values_list(*encoder.columns))
+
+    @staticmethod
+    @timed("fetch")
+    async def afetch_rows(query_set, encoder=None):
+        if encoder is not None:
+            query_set = query_set.values_list(*encoder.columns)
+        return [row async for row in query_set]
+
+    @staticmethod
+    def serialize_rows(rows, serializer_obj, request, encoder=None):
+        with track_serialization(), span("serialize"):
+            if encoder is None:
+                return serializer_obj(
+                    rows, many=True, context={"request": request}
+                ).data
+            return encoder.encode_rows(rows)
+
+    def paginate_counted_queryset(self, query_set, request, total):
+        """Same as paginate_queryset but with the row count supplied up front"""
+        paginator = self.django_paginator_class(query_set, self.get_page_size(request))
+        # seed the cached_property so the paginator never issues its own COUNT
+        paginator.count = total
+        page = paginator.page(self.get_page_number(request, paginator))
+        self.page, self.request = page, request
+        return page
+
+    def get_uncounted_window(self, request):
+        """Returns (page number, page size, offset) of an uncounted page
+
+        :raises ValueError: when the page number is not a positive integer
+        """
+        page_size = self.get_page_size(request)
+        page_number = int(request.GET.get("page", DEFAULT_PAGE))
+        if page_number < 1:
+            raise ValueError("Invalid page")
+        return page_number, page_size, (page_number - 1) * page_size
+
+    def generate_uncounted_response(
+        self, query_set, serializer_obj, request, count_mode, encoder=None
+    ):
+        """Page-number response that skips the exact COUNT(*).
+
+        One extra row is fetched to tell whether a next page exists; ``total``
+        is an estimate for count=estimate and null for count=none.
+        """
+        try:
+            page_number, page_size, offset = self.get_uncounted_window(request)
+        except ValueError:
+            return self.page_not_found_response()
+        rows = self.fetch_rows(query_set[offset : offset + page_size + 1], encoder)
+        if not rows and page_number > 1:
+            return self.page_not_found_response()
+        total = None
+        if count_mode == COUNT_ESTIMATE:
+            total = count_cache.estimate(query_set, request)
+        return self.build_uncounted_response(
+            rows,
+            page_number,
+            page_size,
+            count_mode,
+            total,
+            serializer_obj,
+            request,
+            encoder,
+        )
+
+    async def agenerate_uncounted_response(
+        self, query_set, serializer_obj, request, count_mode, encoder=None
+    ):
+        try:
+            page_number, page_size, offset = self.get_uncounted_window(request)
+        except ValueError:
+            return self.page_not_found_response()
+        rows = await self.afetch_rows(
+            query_set[offset : offset + page_size + 1], encoder
+        )
+        if not rows and page_number > 1:
+            return self.page_not_found_response()
+        total = None
+        if count_mode == COUNT_ESTIMATE:
+            total = await count_cache.aestimate(query_set, request)
+        return self.build_uncounted_response(
+            rows,
+            page_number,
+            page_size,
+            count_mode,
+            total,
+            serializer_obj,
+            request,
+            encoder,
+        )
+
+    def build_uncounted_response(
+        self,
+        rows,
+        page_number,
+        page_size,
+        count_mode,
+        total,
+        serializer_obj,
+        request,
+        encoder=None,
+    ):
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        total_pages = None
+        if total is not None:
+            # the estimate can never be below what has already been seen
+            total = max(total, (page_number - 1) * page_size + len(rows))
+            total_pages = max(math.ceil(total / page_size), 1)
+        results = self.serialize_rows(rows, serializer_obj, request, encoder)
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "ok",
+            "count": count_mode,
+            "total": total,
+            "total_pages": total_pages,
+            "page": page_number,
+            "limit": page_size,
+            "has_next": has_next,
+            "results": results,
+        }
+
+    def is_cursor_request(self, request):
+        """Cursor mode is opt-in through ?pagination=cursor or a cursor token"""
+        return (
+            request.GET.get("pagination") == "cursor"
+            or self.cursor_query_param in request.GET
+        )
+
+    def generate_cursor_response(self, query_set, serializer_obj, request):
+        """Keyset pagination: every page is a bounded index range scan,
+        no COUNT(*) and no OFFSET, so deep pages cost the same as the first.
+        """
+        try:
+            query_set, position = self.get_cursor_queryset(query_set, request)
+        except ValueError as ex:
+            return {"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)}
+        page_size = self.get_page_size(request)
+        encoder = self.get_cursor_encoder(query_set, serializer_obj, request)
+        rows = self.fetch_rows(query_set[: page_size + 1], encoder)
+        return self.build_cursor_response(
+            rows, position, page_size, serializer_obj, request, encoder
+        )
+
+    async def agenerate_cursor_response(self, query_set, serializer_obj, request):
+        try:
+            query_set, position = self.get_cursor_queryset(query_set, request)
+        except ValueError as ex:
+            return {"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)}
+        page_size = self.get_page_size(request)
+        encoder = self.get_cursor_encoder(query_set, serializer_obj, request)
+        rows = await self.afetch_rows(query_set[: page_size + 1], encoder)
+        return self.build_cursor_response(
+            rows, position, page_size, serializer_obj, request, encoder
+        )
+
+    def get_cursor_encoder(self, query_set, serializer_obj, request):
+        """The row encoder, as long as its rows carry the cursor column"""
+        encoder = self.get_row_encoder(serializer_obj, request)
+        field, _ = self.get_cursor_ordering(request)
+        if (
+            encoder is not None
+            and self._column(query_set.model, field) not in encoder.columns
+        ):
+            return None
+        return encoder
+
+    def get_cursor_queryset(self, query_set, request):
+        """Returns the queryset positioned after the cursor and the decoded cursor
+
+        :raises ValueError: on an unsupported ordering or a malformed cursor
+        """
+        field, descending = self.get_cursor_ordering(request)
+        position = self.decode_cursor(request.GET.get(self.cursor_query_param))
+        reverse = bool(position and position["r"])
+        # walking backwards is walking forwards over the reversed ordering
+        if reverse:
+            descending = not descending
+        nullable = self._is_nullable(query_set.model, field)
+        query_set = query_set.order_by(
+            *self._cursor_order_by(field, descending, nullable)
+        )
+        if position:
+            value = self._decode_value(query_set.model, field, position["v"])
+            query_set = query_set.filter(
+                self._keyset_filter(field, descending, value, position["pk"], nullable)
+            )
+        return query_set, position
+
+    def build_cursor_response(
+        self, rows, position, page_size, serializer_obj, request, encoder=None
+    ):
+        field, _ = self.get_cursor_ordering(request)
+        reverse = bool(position and position["r"])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        next_cursor = previous_cursor = None
+        if rows:
+            model = serializer_obj.Meta.model
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(
+                    *self._row_position(model, rows[-1], field, encoder), reverse=False
+                )
+            if (has_more and reverse) or (position and not reverse):
+                previous_cursor = self.encode_cursor(
+                    *self._row_position(model, rows[0], field, encoder), reverse=True
+                )
+        results = self.serialize_rows(rows, serializer_obj, request, encoder)
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "ok",
+            "next": next_cursor,
+            "previous": previous_cursor,
+            "limit": page_size,
+            "results": results,
+        }
+
+    @staticmethod
+    def get_cursor_ordering(request):
+        """Returns (field, descending) from the first ?ordering= term"""
+        ordering = request.GET.get("ordering") or DEFAULT_CURSOR_ORDERING
+        ordering = ordering.split(",")[0].strip()
+        descending = ordering.startswith("-")
+        field = ordering.lstrip("-")
+        if field not in CURSOR_ORDERING_FIELDS:
+            raise ValueError(
+                f"Cursor pagination does not support ordering by '{field}'"
+            )
+        return ("pk" if field == "id" else field), descending
+
+    @staticmethod
+    def _column(model, field):
+        return model._meta.pk.attname if field == "pk" else field
+
+    def _row_position(self, model, row, field, encoder):
+        """Returns the (ordering value, pk) of an instance or a value tuple"""
+        if encoder is None:
+            return getattr(row, field), row.pk
+        columns = encoder.columns
+        return (
+            row[columns.index(self._column(model, field))],
+            row[columns.index(model._meta.pk.attname)],
+        )
+
+    def encode_cursor(self, value, pk, reverse):
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        payload = json.dumps(
+            {"v": value, "pk": pk, "r": int(reverse)}, separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        if not cursor:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return {"v": payload["v"], "pk": int(payload["pk"]), "r": int(payload["r"])}
+        except (binascii.Error, ValueError, TypeError, KeyError, UnicodeError):
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def _is_nullable(model, field):
+        return field != "pk" and model._meta.get_field(field).null
+
+    @staticmethod
+    def _decode_value(model, field, value):
+        if value is None or field == "pk":
+            return value
+        if model._meta.get_field(field).get_internal_type() == "DateTimeField":
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError("Invalid cursor")
+            return parsed
+        return value
+
+    @staticmethod
+    def _cursor_order_by(field, descending, nullable):
+        # NULLs sort as the smallest value in both directions so that
+        # reversing the ordering mirrors it exactly on every backend
+        if field == "pk":
+            return ["-pk" if descending else "pk"]
+        if descending:
+            expression = F(field).desc(nulls_last=True) if nullable else F(field).desc()
+            return [expression, "-pk"]
+        expression = F(field).asc(nulls_first=True) if nullable else F(field).asc()
+        return [expression, "pk"]
+
+    @staticmethod
+    def _keyset_filter(field, descending, value, pk, nullable=True):
+        """Q matching rows strictly after (value, pk) in the given ordering"""
+        pk_lookup = "pk__lt" if descending else "pk__gt"
+        if field == "pk":
+            return Q(**{pk_lookup: pk})
+        if value is None:
+            after = Q(**{f"{field}__isnull": True, pk_lookup: pk})
+            if not descending:
+                after |= Q(**{f"{field}__isnull": False})
+            return after
+        value_lookup = f"{field}__lt" if descending else f"{field}__gt"
+        after = Q(**{value_lookup: value}) | Q(**{field: value, pk_lookup: pk})
+        # the redundant inclusive bound lets the (field, id) index seek
+        # straight to the cursor instead of scanning from the first entry
+        after &= Q(**{f"{value_lookup}e": value})
+        if descending and nullable:
+            after |= Q(**{f"{field}__isnull": True})
+        return after
@@ -0,0 +1,205 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "profile"
+MODE_HEADER = "HTTP_X_PROFILE_MODE"
+MODE_PARAM = "profile_mode"
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+MODES = (MODE_CPROFILE, MODE_SAMPLE)
+# allocation sites written per profile
+TRACEMALLOC_TOP = 50
+
+# one profile at a time: cProfile and tracemalloc are process wide
+_profiling = threading.Lock()
+
+
+class StackSampler:
+    """Statistical profiler: a background thread records the stacks of the
+    target threads every ``interval`` seconds, as collapsed stacks for
+    flame graphs (``frame;frame;frame count``).
+
+    With ``thread_ids=None`` every other thread is sampled, which is how the
+    ORM calls of async views, run on executor threads, are seen.
+    """
+
+    def __init__(self, thread_ids=None, interval=0.001):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[self.collapse(frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                f"{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class RequestProfile:
+    """Profiles one request end to end and writes the results to
+    PROFILES_DIR: ``<id>.prof`` (pstats) or ``<id>.collapsed`` plus the
+    allocation deltas in ``<id>.alloc.txt``"""
+
+    def __init__(self, request, mode, thread_ids):
+        self.request = request
+        self.mode = mode
+        self.thread_ids = thread_ids
+        slug = re.sub(r"[^\w]+", "-", request.path).strip("-") or "root"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.id = f"{stamp}-{request.method}-{slug}-{uuid.uuid4().hex[:8]}"
+        self.profiler = None
+        self.sampler = None
+        self.started_tracing = False
+        self.snapshot = None
+
+    def start(self):
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(getattr(settings, "PROFILING_TRACEMALLOC_FRAMES", 1))
+        tracemalloc.reset_peak()
+        self.snapshot = tracemalloc.take_snapshot()
+        if self.mode == MODE_SAMPLE:
+            self.sampler = StackSampler(
+                self.thread_ids, getattr(settings, "PROFILING_SAMPLE_INTERVAL", 0.001)
+            )
+            self.sampler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        allocations = tracemalloc.take_snapshot().compare_to(self.snapshot, "lineno")
+        _, peak = tracemalloc.get_traced_memory()
+        if self.started_tracing:
+            tracemalloc.stop()
+        self.write(allocations, peak)
+
+    def write(self, allocations, peak):
+        directory = settings.PROFILES_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.id)
+        if self.profiler is not None:
+            self.profiler.dump_stats(f"{path}.prof")
+        else:
+            with open(f"{path}.collapsed", "w") as output:
+                output.write(self.sampler.collapsed())
+        with open(f"{path}.alloc.txt", "w") as output:
+            output.write(f"{self.request.method} {self.request.get_full_path()}\n")
+            output.write(f"peak traced memory: {peak} bytes\n\n")
+            for stat in allocations[:TRACEMALLOC_TOP]:
+                output.write(f"{stat}\n")
+
+
+def requested_mode(request):
+    """Returns the profiling mode of the request, or None when it is not
+    profiled: a trusted X-Profile header or ``profile`` query param carrying
+    PROFILING_TOKEN, or the PROFILING_SAMPLE_RATE share of requests"""
+    token = getattr(settings, "PROFILING_TOKEN", None)
+    supplied = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    trusted = bool(token and supplied) and hmac.compare_digest(
+        supplied.encode(), token.encode()
+    )
+    rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+    if not trusted and not (rate > 0 and random.random() < rate):
+        return None
+    mode = request.META.get(MODE_HEADER) or request.GET.get(MODE_PARAM)
+    return mode if mode in MODES else getattr(settings, "PROFILING_MODE", MODE_CPROFILE)
+
+
+class ProfilingMiddleware:
+    """Profiles selected requests without a redeploy, see requested_mode().
+
+    The profile id is returned in the ``X-Profile-Id`` header. Async
+    requests are always sampled, across threads, since cProfile only sees
+    the event loop thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        if mode is None or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profile = RequestProfile(request, mode, {threading.get_ident()})
+            profile.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.stop()
+        finally:
+            _profiling.release()
+        response["X-Profile-Id"] = profile.id
+        return response
+
+    async def __acall__(self, request):
+        if requested_mode(request) is None or not _profiling.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profile = RequestProfile(request, MODE_SAMPLE, None)
+            profile.start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profile.stop()
+        finally:
+            _profiling.release()
+        response["X-Profile-Id"] = profile.id
+        return response
@@ -0,0 +1,88 @@
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+# (database alias, index table) -> whether the index exists
+_index_available = {}
+
+
+def search_index_available(alias, table):
+    """Returns True when ``table`` is an FTS5 index on an SQLite database"""
+    key = (alias, table)
+    if key not in _index_available:
+        connection = connections[alias]
+        _index_available[key] = (
+            connection.vendor == "sqlite"
+            and table in connection.introspection.table_names()
+        )
+    return _index_available[key]
+
+
+def build_match_query(terms):
+    """Turns search terms into an FTS5 MATCH expression.
+
+    Every term is quoted, so user input can never be parsed as FTS5 syntax,
+    and suffixed with ``*`` for prefix matching; terms are ANDed together.
+    """
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def parse_number(term):
+    try:
+        return float(term)
+    except ValueError:
+        return None
+
+
+class FullTextSearchFilter(SearchFilter):
+    """SearchFilter backed by the view's ``search_index`` FTS5 table.
+
+    Text terms are resolved through a single indexed MATCH and results are
+    annotated with their bm25 ``search_rank``. Numeric terms also match
+    ``id`` and ``price`` exactly, like the ``search_fields`` they replace;
+    rows matched that way only have no rank and sort after the text
+    matches. Falls back to the plain SearchFilter when the index is not
+    available.
+    """
+
+    rank_annotation = "search_rank"
+
+    def filter_queryset(self, request, queryset, view):
+        table = getattr(view, "search_index", None)
+        terms = self.get_search_terms(request)
+        if not terms or not table or not search_index_available(queryset.db, table):
+            return super().filter_queryset(request, queryset, view)
+
+        match_sql = f"SELECT rowid FROM {table} WHERE {table} MATCH %s"
+        text_terms = [term for term in terms if parse_number(term) is None]
+        if text_terms:
+            queryset = queryset.filter(
+                pk__in=RawSQL(match_sql, [build_match_query(text_terms)])
+            )
+        for term in terms:
+            number = parse_number(term)
+            if number is None:
+                continue
+            condition = Q(pk__in=RawSQL(match_sql, [build_match_query([term])]))
+            condition |= Q(price=number)
+            if number.is_integer():
+                condition |= Q(pk=int(number))
+            queryset = queryset.filter(condition)
+
+        # ranked by the text terms, which every match contains; with numeric
+        # terms only, rows matched through id or price alone rank NULL
+        rank_terms = text_terms or terms
+        meta = queryset.model._meta
+        # bm25() gathers its corpus statistics once per MATCH scan, so the
+        # matches are ranked in one scan and each row looks its rank up;
+        # LIMIT -1 OFFSET 0 stops SQLite from flattening that scan back into
+        # the correlated subquery, which would rescan it for every row
+        rank_sql = (
+            f"SELECT ranked.rank FROM (SELECT rowid, bm25({table}) AS rank "
+            f"FROM {table} WHERE {table} MATCH %s LIMIT -1 OFFSET 0) AS ranked "
+            f"WHERE ranked.rowid = {meta.db_table}.{meta.pk.column}"
+        )
+        return queryset.annotate(
+            **{self.rank_annotation: RawSQL(rank_sql, [build_match_query(rank_terms)])}
+        )
@@ -0,0 +1,204 @@
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .sql import add_execute_wrapper, normalize_sql
+
+logger = logging.getLogger("items.slow_queries")
+
+# the request whose queries are being run, for the view/action of a slow query
+_request = ContextVar("slow_query_request", default=None)
+
+
+def get_threshold():
+    """Seconds above which a query is logged, None when disabled"""
+    threshold = getattr(settings, "SLOW_QUERY_THRESHOLD_MS", None)
+    return None if threshold is None else threshold / 1000
+
+
+def get_origin():
+    """(view, action) of the in-flight request"""
+    request = _request.get()
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None, None
+    actions = getattr(match.func, "actions", None) or {}
+    method = request.method.lower()
+    return match.view_name, actions.get(method, method)
+
+
+def explain(connection, sql, params):
+    """The backend's query plan of a statement, one line per plan row.
+
+    Runs on a bare backend cursor, outside the execute wrappers, so the
+    EXPLAIN is neither inspected nor counted as one of the request's queries.
+    """
+    prefix = connection.ops.explain_query_prefix()
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f"{prefix} {sql}", params)
+        rows = cursor.fetchall()
+    except Exception as ex:
+        return f"EXPLAIN failed: {ex}"
+    finally:
+        cursor.close()
+    if connection.vendor == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(row[-1] for row in rows)
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+class SlowQueryLog:
+    """Bounded table of the slowest query shapes.
+
+    Queries are grouped by their normalized SQL; when the table is full a
+    new shape replaces the entry with the lowest worst-case duration, if
+    it is slower.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}
+
+    @staticmethod
+    def get_size():
+        return getattr(settings, "SLOW_QUERY_TOP_N", 50)
+
+    def add(self, sql, params, duration, view, action, plan):
+        shape = normalize_sql(sql)
+        duration_ms = duration * 1000
+        with self._lock:
+            entry = self.entries.get(shape)
+            if entry is None:
+                if len(self.entries) >= self.get_size():
+                    fastest = min(
+                        self.entries, key=lambda key: self.entries[key]["max_ms"]
+                    )
+                    if self.entries[fastest]["max_ms"] >= duration_ms:
+                        return
+                    del self.entries[fastest]
+                entry = self.entries[shape] = {
+                    "sql": shape,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            if duration_ms >= entry["max_ms"]:
+                # keep the details of the slowest run
+                entry.update(
+                    {
+                        "max_ms": duration_ms,
+                        "example": sql,
+                        "params": [str(param) for param in params or ()],
+                        "view": view,
+                        "action": action,
+                        "plan": plan,
+                        "seen_at": time.time(),
+                    }
+                )
+
+    def top(self):
+        """Entries slowest first"""
+        with self._lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+        for entry in entries:
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+        return sorted(entries, key=lambda entry: entry["max_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+
+
+slow_query_log = SlowQueryLog()
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    threshold = get_threshold()
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration >= threshold:
+        connection = context["connection"]
+        # an executemany has no single plan
+        plan = None if many else explain(connection, sql, params)
+        view, action = get_origin()
+        slow_query_log.add(sql, params, duration, view, action, plan)
+        logger.warning(
+            json.dumps(
+                {
+                    "duration_ms": round(duration * 1000, 3),
+                    "database": connection.alias,
+                    "view": view,
+                    "action": action,
+                    "sql": sql,
+                    "params": [str(param) for param in params or ()],
+                    "plan": plan,
+                }
+            )
+        )
+    return result
+
+
+add_execute_wrapper(slow_query_wrapper)
+
+
+class SlowQueryMiddleware:
+    """Tags the queries of a request with its view and action"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
+
+
+class SlowQueryView(APIView):
+    """Slowest query shapes since start-up, admin only. DELETE clears them."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            {
+                "status": status.HTTP_200_OK,
+                "threshold_ms": getattr(settings, "SLOW_QUERY_THRESHOLD_MS", None),
+                "data": slow_query_log.top(),
+            }
+        )
+
+    def delete(self, request, *args, **kwargs):
+        slow_query_log.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,53 @@
+import re
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Reduces a statement to its shape: literals and placeholders become
+    ``?`` and IN lists of any length collapse to ``?, ...``"""
+    sql = sql.replace("%s", "?")
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("?, ...", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+# run around every query of every connection, the first outermost
+_execute_wrappers = ()
+
+
+def execute_wrappers(execute, sql, params, many, context):
+    """The one execute wrapper installed on each connection, running every
+    wrapper added with add_execute_wrapper()"""
+    for wrapper in reversed(_execute_wrappers):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_execute_wrappers(connection, **kwargs):
+    # first in the list: connection.execute_wrapper() blocks leave by
+    # popping the last one, which must stay theirs
+    if execute_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrappers)
+
+
+def add_execute_wrapper(wrapper):
+    """Runs ``wrapper`` around every query from now on, on the connections
+    already open and on the ones opened later"""
+    global _execute_wrappers
+    if wrapper not in _execute_wrappers:
+        _execute_wrappers = (*_execute_wrappers, wrapper)
+    for connection in connections.all(initialized_only=True):
+        install_execute_wrappers(connection)
+
+
+# queries of async views run on executor threads with their own connections
+connection_created.connect(install_execute_wrappers)
@@ -0,0 +1,124 @@
+import os
+import re
+import statistics
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .sql import normalize_sql
+
+# multiplies every wall-time budget, e.g. 3 on a slow CI runner
+WALL_TIME_BUDGET_SCALE = float(os.environ.get("WALL_TIME_BUDGET_SCALE", "1"))
+TRANSACTION_STATEMENT = re.compile(
+    r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE
+)
+
+RecordedQuery = namedtuple("RecordedQuery", "sql normalized duration many")
+
+
+class QueryRecorder:
+    """Records every statement a block of code runs on one database.
+
+    Statements are captured with an execute wrapper, so they carry their
+    parameter placeholders and the recorder works with DEBUG off.
+    Transaction control statements are kept apart from the queries.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = []
+        self.transaction_statements = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if TRANSACTION_STATEMENT.match(sql):
+                self.transaction_statements.append(sql)
+            else:
+                self.queries.append(
+                    RecordedQuery(sql, normalize_sql(sql), duration, many)
+                )
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def counts(self):
+        """Number of executions per normalized statement"""
+        return Counter(query.normalized for query in self.queries)
+
+    def repeated_selects(self, max_repeats=1):
+        """SELECT shapes run more than ``max_repeats`` times: the signature of
+        an N+1 pattern, one query per row of an earlier result"""
+        return {
+            sql: count
+            for sql, count in self.counts().items()
+            if count > max_repeats and sql.upper().startswith("SELECT")
+        }
+
+    def report(self):
+        lines = [f"{len(self.queries)} queries in {self.duration * 1000:.2f}ms"]
+        for sql, count in self.counts().items():
+            lines.append(f"  {count}x {sql}")
+        return "\n".join(lines)
+
+
+class QueryBudgetMixin:
+    """TestCase assertions for query counts, N+1 patterns and wall time"""
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS, max_repeats=1):
+        """Fails when the block runs more than ``budget`` queries or repeats
+        a SELECT shape more than ``max_repeats`` times"""
+        with QueryRecorder(using) as recorder:
+            yield recorder
+        self.assertLessEqual(
+            len(recorder),
+            budget,
+            f"Query budget of {budget} exceeded\n{recorder.report()}",
+        )
+        repeated = recorder.repeated_selects(max_repeats)
+        self.assertFalse(
+            repeated,
+            f"Repeated SELECT (N+1 pattern)\n{recorder.report()}",
+        )
+
+    def assertWallTimeBudget(self, func, budget_ms, repeat=5, clear_caches=True):
+        """Fails when the median wall time of ``func`` exceeds ``budget_ms``,
+        scaled by WALL_TIME_BUDGET_SCALE. Caches are cleared before every
+        run so the budget covers the uncached path. Returns the median."""
+        timings = []
+        for _ in range(repeat):
+            if clear_caches:
+                for cache in caches.all():
+                    cache.clear()
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        budget = budget_ms * WALL_TIME_BUDGET_SCALE
+        self.assertLessEqual(
+            median,
+            budget,
+            f"Wall-time budget of {budget:.0f}ms exceeded: median {median:.1f}ms "
+            f"of {repeat} runs {[round(timing, 1) for timing in timings]}",
+        )
+        return median
@@ -0,0 +1,122 @@
+"""Compares the sync and async item endpoints under concurrent load.
+
+Requests are driven in-process through the ASGI handler against a test
+database seeded with --rows items, --concurrency requests at a time:
+
+    python benchmarks/bench_async.py --rows 5000 --concurrency 1 10 50
+
+--db-latency adds a sleep to every query to stand in for a networked
+database, which is where pinned worker threads start to matter.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+)
+from items.models import Item  # noqa: E402
+
+ENDPOINTS = {
+    "sync": "/api/v1/items/",
+    "async": "/api/v1/async/items/",
+}
+QUERIES = ("?limit=50", "?limit=50&page=20&count=estimate", "?search=item&limit=20")
+
+
+def seed(rows):
+    Item.objects.bulk_create(
+        (
+            Item(name=f"item {index}", description="benchmark", price=index % 500)
+            for index in range(rows)
+        ),
+        batch_size=500,
+    )
+
+
+def add_latency(seconds):
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    # connections are per thread, and queries run in the executor threads
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+    for alias in connections:
+        connections[alias].close()
+
+
+async def run(path, total, concurrency):
+    client = AsyncClient()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path + QUERIES[index % len(QUERIES)])
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--db-latency", type=float, default=0.0, help="ms per query")
+    args = parser.parse_args()
+
+    settings.RESPONSE_CACHE_ENABLED = False
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        seed(args.rows)
+        if args.db_latency:
+            add_latency(args.db_latency / 1000)
+        print(
+            f"{'mode':>6} {'concurrency':>11} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}"
+        )
+        for concurrency in args.concurrency:
+            for mode, path in ENDPOINTS.items():
+                result = asyncio.run(run(path, args.requests, concurrency))
+                print(
+                    f"{mode:>6} {concurrency:>11} {result['rps']:>9.1f} "
+                    f"{result['p50']:>8.2f} {result['p95']:>8.2f}"
+                )
+    finally:
+        teardown_databases(databases, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Analytic queries over the country set: a walk of the Countries.all()
+dicts against the columnar table.
+
+    python benchmarks/bench_columns.py --repeat 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.utils.country.columns import get_country_table  # noqa: E402
+from api.utils.country.countries import Countries  # noqa: E402
+
+
+def queries(countries, table):
+    """(label, dict walk, columnar query) of the same question"""
+    return [
+        (
+            "region + population, by area",
+            lambda: [
+                (info["name"], info["area"])
+                for info in sorted(
+                    (
+                        info
+                        for info in countries.values()
+                        if info.get("region") == "Africa"
+                        and (info.get("population") or 0) > 50000000
+                    ),
+                    key=lambda info: info.get("area") or 0,
+                    reverse=True,
+                )
+            ],
+            lambda: list(
+                table.filter(region="Africa", population__gt=50000000)
+                .order_by("-area")
+                .values("name", "area")
+            ),
+        ),
+        (
+            "count by population and area",
+            lambda: sum(
+                1
+                for info in countries.values()
+                if (info.get("population") or 0) > 1000000
+                and info.get("area") is not None
+                and info["area"] < 100000
+            ),
+            lambda: table.filter(population__gt=1000000, area__lt=100000).count(),
+        ),
+        (
+            "top 10 by population",
+            lambda: [
+                info["name"]
+                for info in sorted(
+                    countries.values(),
+                    key=lambda info: info.get("population") or 0,
+                    reverse=True,
+                )[:10]
+            ],
+            lambda: table.order_by("-population")[:10].column("name"),
+        ),
+    ]
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    countries = Countries().all()
+    started = time.perf_counter()
+    table = get_country_table()
+    print(f"table built in {(time.perf_counter() - started) * 1000:.1f}ms")
+    print(f"{'':<32} {'dicts µs':>10} {'columns µs':>10}")
+    for label, walk, query in queries(countries, table):
+        print(
+            f"{label:<32} {timed(walk, args.repeat):>10.1f} "
+            f"{timed(query, args.repeat):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Times Countries construction and lookups: the old per-instance glob and
+json.load of every data file against the shared, compiled registry, then
+the memory held by the decoded records.
+
+    python benchmarks/bench_countries.py --repeat 20
+"""
+
+import argparse
+import gc
+import json
+import marshal
+import os
+import sys
+import timeit
+import tracemalloc
+from glob import glob
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.utils.country import registry  # noqa: E402
+from api.utils.country.countries import Countries  # noqa: E402
+
+
+def legacy_countries():
+    """What every Countries(...) construction used to do"""
+    countries = {}
+    for path in glob(os.path.join(registry.DATA_DIR, "*.json")):
+        with open(path, encoding="utf-8") as source:
+            country_info = json.load(source)
+        if country_info.get("name", None):
+            countries[country_info["name"].lower()] = country_info
+    return countries
+
+
+def measure(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<44} {seconds * 1e6:>12.1f} {peak / 1024:>10.1f}")
+
+
+def resident(label, func):
+    """Memory still allocated by what ``func`` returns"""
+    gc.collect()
+    tracemalloc.start()
+    kept = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<44} {current / 1024:>10.1f}")
+    return kept
+
+
+def read_every_field():
+    countries = registry.build_registry()
+    for record in countries.values():
+        for field in record:
+            record[field]
+    return countries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    registry.compile_artifact()
+    assert dict(Countries().all()) == legacy_countries()
+    print(f"{'':<44} {'us per call':>12} {'peak KiB':>10}")
+    measure("before: construct (glob + 251 json.load)", legacy_countries, args.repeat)
+    measure(
+        "before: construct + info('nigeria')",
+        lambda: legacy_countries()["nigeria"],
+        args.repeat,
+    )
+    measure("after: compile artifact", registry.compile_artifact, args.repeat)
+    measure("after: load registry (new process)", registry.build_registry, 200)
+    measure(
+        "after: load registry + first info('nigeria')",
+        lambda: registry.build_registry()["nigeria"],
+        200,
+    )
+    measure("after: construct Countries('nigeria')", lambda: Countries("nigeria"), 1000)
+    measure(
+        "after: construct + info('nigeria')",
+        lambda: Countries("nigeria").info(),
+        100000,
+    )
+
+    # the registry used to decode whole country dicts
+    blobs = {name: marshal.dumps(info) for name, info in legacy_countries().items()}
+    loaded = registry.build_registry()
+    print(f"\n{'every record decoded':<44} {'KiB':>10}")
+    resident(
+        "before: full dicts",
+        lambda: {name: marshal.loads(blob) for name, blob in blobs.items()},
+    )
+    resident(
+        "after: records, heavy fields left mapped",
+        lambda: [loaded[name] for name in loaded],
+    )
+    resident("after: records, every field read", read_every_field)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""Load test driver for the /api/v1/items/ endpoints.
+
+Seed a database, then point the driver at it:
+
+    export DATABASE_NAME=/tmp/items-1m.sqlite3
+    python manage.py migrate
+    python manage.py seed_items --rows 1M
+    python benchmarks/bench_load.py --target wsgi --concurrency 16
+
+--target wsgi serves config.wsgi over HTTP from a threaded server in this
+process, --target asgi calls config.asgi from an event loop in this process
+and an http:// URL drives an already running server, e.g. gunicorn or
+uvicorn started with the same DATABASE_NAME. In-process targets share the
+GIL with the driver, so compare their numbers with each other only.
+
+Every scenario reports p50/p95/p99 latency and requests per second to a
+JSON file (--output) that can be diffed between commits.
+"""
+
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+ENDPOINTS = {"sync": "/api/v1/items/", "async": "/api/v1/async/items/"}
+WORDS = ("laptop", "phone", "chair", "lamp", "camera", "wireless", "vintage")
+ORDERINGS = ("price", "-price", "created_at", "-created_at", "name", "-id")
+
+# build(rng, context) -> (method, path, body); handle(context, body) is
+# called with the decoded response, e.g. to follow a cursor
+Scenario = namedtuple("Scenario", "name build handle", defaults=(None,))
+
+
+def list_path(context, query):
+    return f"{context['prefix']}?{query}"
+
+
+def item_path(context, pk):
+    return f"{context['prefix']}{pk}/"
+
+
+def random_pk(rng, context):
+    return rng.randint(context["low"], context["high"])
+
+
+def follow_cursor(context, body):
+    context["cursor"] = (body.get("data") or {}).get("next")
+
+
+def remember_created(context, body):
+    with context["lock"]:
+        context["created"].append(body["data"]["id"])
+
+
+def pop_created(rng, context):
+    with context["lock"]:
+        pk = context["created"].pop() if context["created"] else random_pk(rng, context)
+    return "DELETE", item_path(context, pk), None
+
+
+SCENARIOS = [
+    Scenario("list_first_page", lambda rng, c: ("GET", list_path(c, "limit=50"), None)),
+    Scenario(
+        "list_deep_page",
+        lambda rng, c: (
+            "GET",
+            list_path(c, f"limit=50&page={rng.randint(c['pages'] // 2, c['pages'])}"),
+            None,
+        ),
+    ),
+    Scenario(
+        "list_deep_page_estimate",
+        lambda rng, c: (
+            "GET",
+            list_path(
+                c,
+                f"limit=50&count=estimate&page={rng.randint(c['pages'] // 2, c['pages'])}",
+            ),
+            None,
+        ),
+    ),
+    Scenario(
+        "list_cursor",
+        lambda rng, c: (
+            "GET",
+            list_path(
+                c,
+                (
+                    f"limit=50&cursor={c['cursor']}"
+                    if c.get("cursor")
+                    else "limit=50&pagination=cursor"
+                ),
+            ),
+            None,
+        ),
+        follow_cursor,
+    ),
+    Scenario(
+        "search",
+        lambda rng, c: (
+            "GET",
+            list_path(c, f"search={rng.choice(WORDS)}&limit=20"),
+            None,
+        ),
+    ),
+    Scenario(
+        "price_range",
+        lambda rng, c: (
+            "GET",
+            list_path(
+                c, "price_from={0}&price_to={1}&limit=50".format(*price_bounds(rng))
+            ),
+            None,
+        ),
+    ),
+    Scenario(
+        "ordering",
+        lambda rng, c: ("GET", list_path(c, f"ordering={rng.choice(ORDERINGS)}"), None),
+    ),
+    Scenario("retrieve", lambda rng, c: ("GET", item_path(c, random_pk(rng, c)), None)),
+    Scenario(
+        "create",
+        lambda rng, c: (
+            "POST",
+            c["prefix"],
+            {"name": f"load {rng.choice(WORDS)}", "price": rng.randint(1, 5000)},
+        ),
+        remember_created,
+    ),
+    Scenario(
+        "update",
+        lambda rng, c: (
+            "PUT",
+            item_path(c, random_pk(rng, c)),
+            {"price": round(rng.uniform(1, 5000), 2)},
+        ),
+    ),
+    # deletes the items the create scenario added, keeping the dataset stable
+    Scenario("delete", pop_created),
+]
+
+
+def price_bounds(rng):
+    low = rng.randint(0, 4900)
+    return low, low + rng.choice((5, 50, 500))
+
+
+class HttpTransport:
+    """Keep-alive HTTP/1.1 client, one connection per worker thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=60
+            )
+        headers = {"Accept": "application/json"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (ConnectionError, http.client.HTTPException):
+            connection.close()
+            raise
+        if response.status == 204:
+            # the API sends a body with 204 that HTTP clients never read,
+            # it would be parsed as the start of the next response
+            connection.close()
+        return response.status, content
+
+    def run(self, jobs, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [
+                executor.submit(jobs.worker, self) for _ in range(concurrency)
+            ]:
+                future.result()
+
+
+class AsgiTransport:
+    """Calls the ASGI application directly, one task per concurrent client"""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def arequest(self, method, path, body=None):
+        path, _, query = path.partition("?")
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"accept", b"application/json"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        messages = [{"type": "http.request", "body": payload, "more_body": False}]
+        response = {"status": None, "body": []}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # nothing more to send, wait until the handler gives up listening
+            await asyncio.Future()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.application(scope, receive, send)
+        return response["status"], b"".join(response["body"])
+
+    def request(self, method, path, body=None):
+        return asyncio.run(self.arequest(method, path, body))
+
+    def run(self, jobs, concurrency):
+        async def main():
+            await asyncio.gather(*(jobs.aworker(self) for _ in range(concurrency)))
+
+        asyncio.run(main())
+
+
+class Jobs:
+    """Issues the requests of one scenario and records their latencies"""
+
+    def __init__(self, scenario, context, total, seed):
+        self.scenario, self.context = scenario, context
+        self.remaining = itertools.count()
+        self.total = total
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.latencies, self.errors, self.last_error = [], 0, None
+
+    def next_request(self):
+        with self.lock:
+            if next(self.remaining) >= self.total:
+                return None
+            return self.scenario.build(self.rng, self.context)
+
+    def record(self, started, status, content):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies.append(elapsed)
+            if status >= 400:
+                self.errors += 1
+                self.last_error = f"{status} {content[:200].decode(errors='replace')}"
+                return
+        if self.scenario.handle:
+            self.scenario.handle(self.context, json.loads(content))
+
+    def worker(self, transport):
+        while (request := self.next_request()) is not None:
+            started = time.perf_counter()
+            self.record(started, *transport.request(*request))
+
+    async def aworker(self, transport):
+        while (request := self.next_request()) is not None:
+            started = time.perf_counter()
+            self.record(started, *await transport.arequest(*request))
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(jobs, elapsed):
+    ordered = sorted(jobs.latencies)
+    return {
+        "requests": len(ordered),
+        "errors": jobs.errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "last_error": jobs.last_error,
+    }
+
+
+def discover(transport, prefix, page_size=50):
+    """Reads the id range and row count of the dataset through the API"""
+
+    def first(ordering):
+        status, content = transport.request(
+            "GET", f"{prefix}?limit=1&count=none&ordering={ordering}"
+        )
+        results = json.loads(content)["data"]["results"]
+        if status != 200 or not results:
+            raise SystemExit(f"{prefix} returned no items, seed the database first")
+        return results[0]["id"]
+
+    status, content = transport.request("GET", f"{prefix}?limit={page_size}")
+    total = json.loads(content)["data"]["total"]
+    return {
+        "prefix": prefix,
+        "low": first("id"),
+        "high": first("-id"),
+        "total": total,
+        "pages": max(math.ceil(total / page_size), 1),
+        "created": [],
+        "lock": threading.Lock(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_wsgi_server():
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    from config.wsgi import application
+
+    class QuietHandler(WSGIRequestHandler):
+        # headers and body are separate writes, Nagle would hold the body
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+    # clients hang up on 204 responses, see HttpTransport.request
+    logging.getLogger("django.server").setLevel(logging.ERROR)
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+    server.set_app(application)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def get_transport(target, response_cache=False):
+    if target.startswith("http://"):
+        return HttpTransport(target), None
+    from django.conf import settings
+
+    settings.DEBUG = False  # DEBUG keeps every executed query in memory
+    # repeated list pages would be served from memory without hitting the ORM
+    settings.RESPONSE_CACHE_ENABLED = response_cache
+    if target == "wsgi":
+        server, url = start_wsgi_server()
+        return HttpTransport(url), server
+    from config.asgi import application
+
+    return AsgiTransport(application), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--target", default="wsgi", help="wsgi, asgi or the http:// URL of a server"
+    )
+    parser.add_argument("--endpoints", choices=ENDPOINTS, default="sync")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="per scenario")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=[scenario.name for scenario in SCENARIOS],
+        help="defaults to all of them",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help="keep the response cache on for in-process targets",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(BASE_DIR, "benchmarks", "results", "load.json"),
+    )
+    args = parser.parse_args()
+
+    transport, server = get_transport(args.target, args.response_cache)
+    context = discover(transport, ENDPOINTS[args.endpoints])
+    selected = [
+        scenario
+        for scenario in SCENARIOS
+        if not args.scenarios or scenario.name in args.scenarios
+    ]
+    results = {}
+    print(
+        f"{context['total']} items, {args.target} target, "
+        f"concurrency {args.concurrency}"
+    )
+    print(f"{'scenario':<24} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    try:
+        for index, scenario in enumerate(selected):
+            if args.warmup:
+                Jobs(scenario, context, args.warmup, args.seed - index).worker(
+                    transport
+                )
+            jobs = Jobs(scenario, context, args.requests, args.seed + index)
+            started = time.perf_counter()
+            transport.run(jobs, args.concurrency)
+            results[scenario.name] = summary = summarize(
+                jobs, time.perf_counter() - started
+            )
+            print(
+                f"{scenario.name:<24} {summary['rps']:>9.1f} {summary['p50_ms']:>9.2f} "
+                f"{summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f}"
+                + (f"  {summary['errors']} errors" if summary["errors"] else "")
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.target,
+            "endpoints": args.endpoints,
+            "concurrency": args.concurrency,
+            "response_cache": args.response_cache,
+            "requests_per_scenario": args.requests,
+            "items": context["total"],
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Nearest-country and radius query throughput: a haversine scan of every
+centroid against the k-d tree, one query at a time and batched.
+
+    python benchmarks/bench_nearby.py --points 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.utils.country.nearby import get_centroid_index, haversine  # noqa: E402
+
+
+def build_points(size, seed):
+    rng = random.Random(seed)
+    return [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(size)]
+
+
+def throughput(label, func, points):
+    started = time.perf_counter()
+    func(points)
+    seconds = time.perf_counter() - started
+    print(f"{label:<28} {len(points) / seconds:>14,.0f} {seconds:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--nearest", type=int, default=5)
+    parser.add_argument("--radius", type=float, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = get_centroid_index()
+    print(f"index built in {(time.perf_counter() - started) * 1000:.1f}ms")
+    centroids = list(index.centroids.items())
+
+    def scan(lat, lng):
+        return sorted(
+            (haversine(lat, lng, *centroid), name) for name, centroid in centroids
+        )
+
+    points = build_points(args.points, args.seed)
+    sample = points[: max(1, len(points) // 20)]
+    print(f"{'':<28} {'queries/s':>14} {'seconds':>10}")
+    throughput(
+        f"scan ({len(sample):,} points)",
+        lambda batch: [scan(lat, lng)[: args.nearest] for lat, lng in batch],
+        sample,
+    )
+    throughput(
+        "nearest() per point",
+        lambda batch: [index.nearest(lat, lng, args.nearest) for lat, lng in batch],
+        points,
+    )
+    throughput(
+        "nearest_many()", lambda batch: index.nearest_many(batch, args.nearest), points
+    )
+    throughput(
+        "within_many()", lambda batch: index.within_many(batch, args.radius), points
+    )
+
+
+if __name__ == "__main__":
+    main()
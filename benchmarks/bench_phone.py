@@ -0,0 +1,79 @@
+"""Throughput of phone number to country resolution: a per-number scan of
+country_codes against the prefix resolver, one by one and batched.
+
+    python benchmarks/bench_phone.py --numbers 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.utils.country.countries import country_codes  # noqa: E402
+from api.utils.country.phone import get_phone_resolver  # noqa: E402
+
+FORMATS = ("+{} {}", "00{}{}", "{}{}", "+{}-{}")
+
+
+def build_numbers(resolver, size, seed):
+    rng = random.Random(seed)
+    prefixes = list(resolver.prefixes)
+    numbers = []
+    for _ in range(size):
+        prefix = rng.choice(prefixes)
+        subscriber = str(rng.randrange(10**6, 10 ** (13 - len(prefix))))
+        numbers.append(rng.choice(FORMATS).format(prefix, subscriber))
+    return numbers
+
+
+def scan(number):
+    """Longest matching code found by walking country_codes"""
+    digits = number.replace(" ", "").replace("-", "").lstrip("+")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    best = None
+    for code, label in dict(country_codes).items():
+        code = code.replace("-", "")
+        if digits.startswith(code) and (best is None or len(code) > len(best[0])):
+            best = (code, label)
+    return best
+
+
+def throughput(label, func, numbers):
+    started = time.perf_counter()
+    func(numbers)
+    seconds = time.perf_counter() - started
+    print(f"{label:<28} {len(numbers) / seconds:>14,.0f} {seconds:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--numbers", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    resolver = get_phone_resolver()
+    print(f"resolver built in {(time.perf_counter() - started) * 1000:.1f}ms")
+    numbers = build_numbers(resolver, args.numbers, args.seed)
+    print(f"{'':<28} {'numbers/s':>14} {'seconds':>10}")
+    sample = numbers[: max(1, len(numbers) // 100)]
+    throughput(
+        f"scan ({len(sample):,} numbers)",
+        lambda batch: [scan(n) for n in batch],
+        sample,
+    )
+    throughput(
+        "resolve() per number",
+        lambda batch: [resolver.resolve(n) for n in batch],
+        numbers,
+    )
+    throughput("resolve_many()", resolver.resolve_many, numbers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Fuzzy country name search: difflib over every name against the trigram
+index, per query and batched over a column of noisy values.
+
+    python benchmarks/bench_search.py --queries 100000
+"""
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.utils.country.registry import get_registry  # noqa: E402
+from api.utils.country.search import get_name_index  # noqa: E402
+
+
+def misspell(name, rng):
+    """One deleted, doubled or swapped letter"""
+    i = rng.randrange(len(name) - 1)
+    edit = rng.choice(("delete", "double", "swap"))
+    if edit == "delete":
+        return name[:i] + name[i + 1 :]
+    if edit == "double":
+        return name[:i] + name[i] + name[i:]
+    return name[:i] + name[i + 1] + name[i] + name[i + 2 :]
+
+
+def build_queries(index, size, seed, distinct):
+    """``size`` values drawn from ``distinct`` misspelled names"""
+    rng = random.Random(seed)
+    names = [name for name in index.names if len(name) > 3]
+    pool = [misspell(rng.choice(names), rng) for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(size)]
+
+
+def throughput(label, func, queries):
+    started = time.perf_counter()
+    func(queries)
+    seconds = time.perf_counter() - started
+    print(
+        f"{label:<28} {len(queries) / seconds:>12,.0f} "
+        f"{seconds / len(queries) * 1e6:>10.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--distinct", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    list(get_registry().values())
+    started = time.perf_counter()
+    index = get_name_index()
+    print(
+        f"index of {len(index.names):,} names built in "
+        f"{(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    queries = build_queries(index, args.queries, args.seed, args.distinct)
+    names = index.names
+    print(f"{'':<28} {'queries/s':>12} {'µs/query':>10}")
+    sample = queries[: max(1, len(queries) // 1000)]
+    throughput(
+        f"difflib ({len(sample):,} queries)",
+        lambda batch: [difflib.get_close_matches(q, names, n=1) for q in batch],
+        sample,
+    )
+    sample = queries[: max(1, len(queries) // 10)]
+    throughput(
+        f"search() ({len(sample):,} queries)",
+        lambda batch: [index.search(query, limit=1) for query in batch],
+        sample,
+    )
+    throughput("search_many()", index.search_many, queries)
+
+
+if __name__ == "__main__":
+    main()
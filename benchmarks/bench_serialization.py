@@ -0,0 +1,78 @@
+"""Times rendering a page of items through ItemSerializer + JSONRenderer
+against RowEncoder + FastJSONRenderer.
+
+Rows are built in memory so only serialization and rendering are measured:
+
+    python benchmarks/bench_serialization.py --sizes 50 200 1000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from items.models import Item  # noqa: E402
+from items.serializers import ItemSerializer  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.utils.fastjson import FastJSONRenderer, RowEncoder  # noqa: E402
+
+
+def build_rows(size):
+    now = timezone.now()
+    return [
+        (pk, f"item {pk}", f"description of item {pk}", pk * 1.25, now, now)
+        for pk in range(1, size + 1)
+    ]
+
+
+def serializer_path(columns, rows):
+    instances = [Item(**dict(zip(columns, row))) for row in rows]
+    data = ItemSerializer(instances, many=True).data
+    return JSONRenderer().render({"data": {"results": data}})
+
+
+def encoder_path(encoder, rows):
+    results = encoder.encode_rows(rows)
+    return FastJSONRenderer().render({"data": {"results": results}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = RowEncoder.for_serializer(ItemSerializer, FastJSONRenderer)
+    print(f"{'page size':>10} {'serializer ms':>14} {'encoder ms':>11} {'speed-up':>9}")
+    for size in args.sizes:
+        rows = build_rows(size)
+        assert serializer_path(encoder.columns, rows) == encoder_path(encoder, rows)
+        number = max(1, 20000 // size)
+        slow = min(
+            timeit.repeat(
+                lambda: serializer_path(encoder.columns, rows),
+                number=number,
+                repeat=args.repeat,
+            )
+        )
+        fast = min(
+            timeit.repeat(
+                lambda: encoder_path(encoder, rows), number=number, repeat=args.repeat
+            )
+        )
+        slow_ms, fast_ms = slow / number * 1000, fast / number * 1000
+        print(f"{size:>10} {slow_ms:>14.3f} {fast_ms:>11.3f} {slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
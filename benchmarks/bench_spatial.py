@@ -0,0 +1,90 @@
+"""Point in country throughput: testing every polygon against the grid
+index, one point at a time and batched, plus index build and load times.
+
+    python benchmarks/bench_spatial.py --points 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.utils.country import spatial  # noqa: E402
+from api.utils.country.registry import fingerprint, get_registry  # noqa: E402
+
+
+def build_points(size, seed):
+    rng = random.Random(seed)
+    return [(rng.uniform(-60, 85), rng.uniform(-180, 180)) for _ in range(size)]
+
+
+def scanner(countries):
+    """Point in polygon against every polygon of the dataset"""
+    polygons = [
+        (name, rings)
+        for name in countries
+        for rings in spatial.country_polygons(countries[name])
+    ]
+
+    def scan(lat, lng):
+        found = set()
+        for name, rings in polygons:
+            inside = False
+            for ring in rings:
+                for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                    if (y1 > lat) != (y2 > lat) and lng < x1 + (lat - y1) * (
+                        x2 - x1
+                    ) / (y2 - y1):
+                        inside = not inside
+            if inside:
+                found.add(name)
+        return tuple(sorted(found))
+
+    return scan
+
+
+def throughput(label, func, points):
+    started = time.perf_counter()
+    func(points)
+    seconds = time.perf_counter() - started
+    print(f"{label:<28} {len(points) / seconds:>14,.0f} {seconds:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    countries = get_registry()
+    started = time.perf_counter()
+    index = spatial.SpatialIndex.from_countries(countries)
+    print(f"index built in {(time.perf_counter() - started) * 1000:.1f}ms")
+    blob = index.dumps(fingerprint())
+    started = time.perf_counter()
+    spatial.marshal.loads(blob)
+    print(f"cached index loaded in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    points = build_points(args.points, args.seed)
+    print(f"{'':<28} {'points/s':>14} {'seconds':>10}")
+    scan = scanner(countries)
+    sample = points[: max(1, len(points) // 100)]
+    throughput(
+        f"scan ({len(sample):,} points)",
+        lambda batch: [scan(lat, lng) for lat, lng in batch],
+        sample,
+    )
+    throughput(
+        "locate() per point",
+        lambda batch: [index.locate(lat, lng) for lat, lng in batch],
+        points,
+    )
+    throughput("locate_many()", index.locate_many, points)
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,10 @@ INSTALLED_APPS = (
 
 
 MIDDLEWARE = [
+    "api.utils.metrics.MetricsMiddleware",
+    "api.utils.timing.ServerTimingMiddleware",
+    "api.utils.profiling.ProfilingMiddleware",
+    "api.utils.slow_queries.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -82,11 +86,63 @@ WSGI_APPLICATION = "config.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # point at a separately seeded database, e.g. for benchmarks/
+        "NAME": os.environ.get("DATABASE_NAME", os.path.join(BASE_DIR, "db.sqlite3")),
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "press-one-default",
+    },
+    # rendered item responses, evicted least recently used once full
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "press-one-responses",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+# share cached responses between worker processes on the same host
+if os.environ.get("RESPONSE_CACHE_BACKEND") == "file":
+    CACHES["responses"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "../cache/responses"),
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    }
+
+# seconds an exact list total is reused before it is counted again
+COUNT_CACHE_TIMEOUT = 300
+
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = "responses"
+RESPONSE_CACHE_TIMEOUT = 60
+
+# max-age of the country endpoints, whose bodies only change with a deploy
+COUNTRIES_CACHE_MAX_AGE = 86400
+
+# encode flat list pages straight from values_list() rows, see api/utils/fastjson.py
+FAST_JSON_ENABLED = True
+
+# per-view latency, SQL and payload histograms, scraped from /metrics
+METRICS_ENABLED = True
+
+# share of requests answered with a Server-Timing header of their phases:
+# get_queryset, filter, count, fetch, serialize, view, render, cache, total
+SERVER_TIMING_SAMPLE_RATE = 1.0 if DEBUG else 0.0
+# also log the phases of sampled requests as one JSON line
+SERVER_TIMING_LOG = False
+
+# queries slower than this are logged with their plan and kept in a top-N table
+# served to admins at /api/v1/slow-queries/; None turns the check off
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_TOP_N = 50
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -145,6 +201,17 @@ REST_FRAMEWORK = {
 LOGS_DIR = os.path.join(BASE_DIR, "../logs")
 if not os.path.isdir(LOGS_DIR):
     os.mkdir(LOGS_DIR)
+
+# single-request profiles, see api/utils/profiling.py. A request is profiled
+# when its X-Profile header or ?profile= param carries PROFILING_TOKEN, or for
+# the PROFILING_SAMPLE_RATE share of requests
+PROFILES_DIR = os.path.join(BASE_DIR, "../profiles")
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = 0.0
+# "cprofile" (pstats files) or "sample" (collapsed stacks for flame graphs)
+PROFILING_MODE = "cprofile"
+PROFILING_SAMPLE_INTERVAL = 0.001
+PROFILING_TRACEMALLOC_FRAMES = 1
 LOG_FORMAT = "[%(levelname)s][%(asctime)s]%(message)s - %(pathname)s#lines-%(lineno)s[%(funcName)s]"
 LOG_DATE_FORMAT = "%d/%b/%Y %H:%M:%S"
 LOGGING = {
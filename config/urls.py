@@ -4,6 +4,9 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from api.utils.metrics import metrics_view
+from api.utils.slow_queries import SlowQueryView
+
 ...
 
 schema_view = get_schema_view(
@@ -32,4 +35,7 @@ urlpatterns = [
         name="schema-redoc",
     ),
     path(r"api/v1/", include("items.urls"), name="items-api"),
+    path(r"api/v1/countries/", include("api.utils.country.urls")),
+    path(r"metrics", metrics_view, name="metrics"),
+    path(r"api/v1/slow-queries/", SlowQueryView.as_view(), name="slow-queries"),
 ]